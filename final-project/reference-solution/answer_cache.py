@@ -0,0 +1,199 @@
+"""
+Semantic cache of final answers for repeated shopper questions.
+
+A question whose embedding is close enough to one answered before (cosine
+similarity above the threshold) gets the stored answer, skipping the
+manager -> specialist -> rag -> LLM chain. Only questions that do not depend
+on the conversation are cached: the first turn of a thread, or with
+scope="context_free" also later turns without follow-up words ("nó",
+"máy này", "còn ... thì sao", ...).
+
+Numbers must match exactly, so "Nokia 3210" never answers "Nokia 3220" and
+"8GB" never answers "12GB" however similar the embeddings are.
+
+Every entry records the agent that answered and the version of the data
+that agent reads (see rag.data_version: the product index files for the
+product agent, the shop information snapshot for shop_information, both
+otherwise). An entry whose data version has changed, e.g. after setup.py
+re-indexes the products, is dropped when a lookup reaches it.
+"""
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Optional
+
+import numpy as np
+
+import metrics
+from text_utils import normalize_text
+
+FOLLOW_UP_PATTERNS = [
+    r"\bnó\b", r"\bnày\b", r"\bđó\b", r"\bkia\b", r"\bấy\b", r"\bvậy\b", r"\bthế còn\b",
+    r"\bcòn\b.*\bthì sao\b", r"\bthì sao\b", r"\bso với\b", r"\bcái trên\b", r"\bmáy trên\b",
+]
+_follow_up = re.compile("|".join(FOLLOW_UP_PATTERNS), re.IGNORECASE)
+_numbers = re.compile(r"\d+")
+
+
+def is_context_free(query: str) -> bool:
+    """True when the question does not refer back to earlier turns."""
+    return not _follow_up.search(query)
+
+
+class SemanticAnswerCache:
+    def __init__(self, embed: Callable[[str], list], version: Callable[[Optional[str]], object],
+                 threshold: float = 0.95, max_entries: int = 1000, ttl: float = 3600,
+                 scope: str = "first_turn"):
+        """
+        Args:
+            embed: Returns the embedding of a question
+            version: Returns the current data version of an agent's answers (given its name),
+                entries from another version are dropped
+            threshold: Minimum cosine similarity for a hit
+            max_entries: Least recently used entries are evicted above this count
+            ttl: Seconds an answer is served
+            scope: "first_turn" or "context_free" (see module docstring)
+        """
+        self.embed = embed
+        self.version = version
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.scope = scope
+        self._entries = OrderedDict()
+        # Unit vectors by slot, allocated on the first put; a freed slot has a zero row and no key
+        self._matrix = None
+        self._keys = []
+        self._free = []
+        self._lock = threading.Lock()
+
+    def cacheable(self, query: str, history: list) -> bool:
+        if not history:
+            return True
+        return self.scope == "context_free" and is_context_free(query)
+
+    def get(self, query: str) -> Optional[str]:
+        """Return a stored answer for a question similar to `query`, or None."""
+        vector = self._unit(self.embed(query))
+        numbers = _numbers.findall(query)
+        with self._lock:
+            best_key, best_similarity = None, self.threshold
+            stale = []
+            if self._keys:
+                similarities = self._matrix[:len(self._keys)] @ vector
+                versions = {}
+                for i in np.argsort(-similarities):
+                    if similarities[i] < best_similarity:
+                        break
+                    if self._keys[i] is None:
+                        continue
+                    entry = self._entries[self._keys[i]]
+                    if entry["source"] not in versions:
+                        versions[entry["source"]] = self.version(entry["source"])
+                    if entry["version"] != versions[entry["source"]]:
+                        stale.append(self._keys[i])
+                    elif entry["numbers"] == numbers and time.time() - entry["created"] <= self.ttl:
+                        best_key, best_similarity = self._keys[i], float(similarities[i])
+                        break
+
+            if stale:
+                print(f"[answer cache] data changed, dropping {len(stale)} answers")
+                for key in stale:
+                    self._remove(key)
+
+            if best_key is None:
+                metrics.increment("answer_cache_lookups_total", result="miss")
+                return None
+
+            entry = self._entries[best_key]
+            self._entries.move_to_end(best_key)
+        metrics.increment("answer_cache_lookups_total", result="hit")
+        metrics.increment("answer_cache_saved_seconds_total", entry["seconds"])
+        metrics.increment("answer_cache_saved_tokens_total", entry["tokens"])
+        print(f"[answer cache] hit ({best_similarity:.3f}) for {query!r}")
+        return entry["answer"]
+
+    def put(self, query: str, answer: str, seconds: float = 0.0, tokens: int = 0, source: str = None,
+            version=None) -> None:
+        """
+        Store the answer to `query`
+
+        Args:
+            seconds: How long the full run took (reported as saved on each hit)
+            tokens: Model tokens the full run used (reported as saved on each hit)
+            source: Name of the agent that answered, selects the data version the answer depends on
+            version: Data version of `source` when the run started (default: the current one); an
+                answer built while the data changed is then dropped on its first lookup
+        """
+        vector = self._unit(self.embed(query))
+        key = normalize_text(query)
+        if version is None:
+            version = self.version(source)
+        with self._lock:
+            if key in self._entries:
+                slot = self._entries[key]["slot"]
+            else:
+                if len(self._entries) >= self.max_entries:
+                    self._remove(next(iter(self._entries)))
+                slot = self._allocate(vector.shape[0])
+            self._matrix[slot] = vector
+            self._keys[slot] = key
+            self._entries[key] = {
+                "slot": slot,
+                "answer": answer,
+                "source": source,
+                "version": version,
+                "numbers": _numbers.findall(query),
+                "created": time.time(),
+                "seconds": seconds,
+                "tokens": tokens,
+            }
+            self._entries.move_to_end(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._matrix = None
+            self._keys = []
+            self._free = []
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _allocate(self, dimensions: int) -> int:
+        """Index of a free row of the matrix"""
+        if self._matrix is None:
+            self._matrix = np.zeros((self.max_entries, dimensions), dtype=np.float32)
+        if self._free:
+            return self._free.pop()
+        self._keys.append(None)
+        return len(self._keys) - 1
+
+    def _remove(self, key: str) -> None:
+        slot = self._entries.pop(key)["slot"]
+        self._matrix[slot] = 0
+        self._keys[slot] = None
+        self._free.append(slot)
+
+    @staticmethod
+    def _unit(embedding) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+
+def create_answer_cache(embed: Callable[[str], list],
+                        version: Callable[[Optional[str]], object]) -> Optional[SemanticAnswerCache]:
+    """Build the cache configured by the ANSWER_CACHE_* environment variables, or None if disabled."""
+    if os.getenv("ANSWER_CACHE_ENABLED", "1") == "0":
+        return None
+    return SemanticAnswerCache(
+        embed,
+        version,
+        threshold=float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95")),
+        max_entries=int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "1000")),
+        ttl=float(os.getenv("ANSWER_CACHE_TTL", "3600")),
+        scope=os.getenv("ANSWER_CACHE_SCOPE", "first_turn"),
+    )
@@ -1,7 +1,7 @@
 import requests
 import json
 import uuid
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Iterator
 import time
 
 class ChatAPIClient:
@@ -14,6 +14,7 @@ class ChatAPIClient:
         """
         self.base_url = base_url.rstrip('/')
         self.chat_endpoint = f"{self.base_url}/chat"
+        self.stream_endpoint = f"{self.base_url}/chat/stream"
         self.session = requests.Session()
         
     def send_message(self, message: str, thread_id: Optional[str] = None) -> Dict[str, Any]:
@@ -75,6 +76,50 @@ class ChatAPIClient:
                 "thread_id": thread_id
             }
     
+    def stream_message(self, message: str, thread_id: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Send a message to the streaming chat API
+        
+        Args:
+            message: The message to send
+            thread_id: Optional thread ID for conversation continuity
+            
+        Yields:
+            Event dictionaries as they arrive: "agent", "tool_call", "delta",
+            then a final "done" (full answer) or "error"
+        """
+        if thread_id is None:
+            thread_id = str(uuid.uuid4())
+            
+        payload = {
+            "message": message,
+            "thread_id": thread_id
+        }
+        
+        try:
+            with self.session.post(
+                self.stream_endpoint,
+                json=payload,
+                headers={"Content-Type": "application/json", "Accept": "text/event-stream"},
+                stream=True,
+                timeout=60  # 60 seconds without any event
+            ) as response:
+                if response.status_code != 200:
+                    yield {"type": "error", "error": f"HTTP {response.status_code}: {response.text}"}
+                    return
+                
+                response.encoding = "utf-8"
+                for line in response.iter_lines(decode_unicode=True):
+                    if line and line.startswith("data: "):
+                        yield json.loads(line[len("data: "):])
+                        
+        except requests.exceptions.Timeout:
+            yield {"type": "error", "error": "Request timed out"}
+        except requests.exceptions.ConnectionError:
+            yield {"type": "error", "error": f"Could not connect to server at {self.base_url}"}
+        except Exception as e:
+            yield {"type": "error", "error": f"Unexpected error: {str(e)}"}
+    
     def test_connection(self) -> bool:
         """
         Test if the API server is reachable
@@ -137,6 +182,25 @@ class ConversationManager:
         
         return result
     
+    def stream_message(self, message: str) -> Iterator[Dict[str, Any]]:
+        """
+        Send a message in the current conversation and stream the response
+        
+        Args:
+            message: Message to send
+            
+        Yields:
+            Streaming events from the API
+        """
+        if self.current_thread_id is None:
+            self.start_new_conversation()
+        
+        for event in self.client.stream_message(message, self.current_thread_id):
+            if event["type"] == "done":
+                self.conversation_history.append({"role": "user", "content": message})
+                self.conversation_history.append({"role": "assistant", "content": event["content"]})
+            yield event
+    
     def get_conversation_history(self) -> list:
         """
         Get the local conversation history
@@ -207,17 +271,30 @@ def interactive_chat():
             
             print("⏳ Thinking...")
             start_time = time.time()
+            first_token_time = None
             
-            result = conversation.send_message(user_input)
-            
-            elapsed_time = time.time() - start_time
-            
-            if result["success"]:
-                response_content = result["response"].get("content", "No response content")
-                print(f"🤖 Assistant: {response_content}")
-                print(f"⏱️  Response time: {elapsed_time:.2f}s")
-            else:
-                print(f"❌ Error: {result['error']}")
+            # Print the answer as it streams in
+            for event in conversation.stream_message(user_input):
+                if event["type"] == "agent":
+                    print(f"   ↪ {event['name']} agent")
+                elif event["type"] == "tool_call":
+                    print(f"   🔧 {event['name']}")
+                elif event["type"] == "delta":
+                    if first_token_time is None:
+                        first_token_time = time.time() - start_time
+                        print("🤖 Assistant: ", end="", flush=True)
+                    print(event["content"], end="", flush=True)
+                elif event["type"] == "done":
+                    if first_token_time is None:
+                        print(f"🤖 Assistant: {event['content']}", end="")
+                    print()
+                    elapsed_time = time.time() - start_time
+                    if first_token_time is not None:
+                        print(f"⏱️  First token: {first_token_time:.2f}s, response time: {elapsed_time:.2f}s")
+                    else:
+                        print(f"⏱️  Response time: {elapsed_time:.2f}s")
+                elif event["type"] == "error":
+                    print(f"\n❌ Error: {event['error']}")
                 
         except KeyboardInterrupt:
             print("\n👋 Goodbye!")
@@ -0,0 +1,114 @@
+"""
+ASGI server exposing the same /chat contract as serve.py and oss_serve.py.
+
+Requests are handled as coroutines on the server's event loop, so a single
+process can keep many conversations open while they wait on model I/O.
+
+Usage:
+    hypercorn asgi_serve:app --bind 0.0.0.0:5001
+    AGENT_BACKEND=oss hypercorn asgi_serve:app --bind 0.0.0.0:5001
+"""
+import asyncio
+import os
+
+import httpx
+from dotenv import load_dotenv
+from openai import AsyncOpenAI
+from quart import Quart, request, jsonify
+from quart_cors import cors
+from agents import set_default_openai_api, set_default_openai_client
+
+load_dotenv()
+
+import metrics
+from resources import resources
+from chat_service import run_chat_turn, stream_chat_turn, sse_event
+
+# openai: agents from serve.py, oss: LiteLLM agents from oss_serve.py
+AGENT_BACKEND = os.getenv("AGENT_BACKEND", "openai")
+# "chat_completions" is needed for fake_openai_server.py
+AGENTS_API = os.getenv("AGENTS_API", "responses")
+MAX_CONNECTIONS = int(os.getenv("MAX_CONNECTIONS", "200"))
+
+if AGENT_BACKEND == "oss":
+    from oss_serve import manager_agent, specialists
+else:
+    from serve import manager_agent, specialists
+
+app = cors(Quart(__name__), allow_origin="*")
+
+
+@app.before_serving
+async def startup():
+    # One pooled HTTP client for every agent run on this loop
+    http_client = httpx.AsyncClient(
+        limits=httpx.Limits(max_connections=MAX_CONNECTIONS, max_keepalive_connections=MAX_CONNECTIONS),
+        timeout=httpx.Timeout(60.0, connect=5.0)
+    )
+    app.config["HTTP_CLIENT"] = http_client
+    set_default_openai_client(AsyncOpenAI(http_client=http_client), use_for_tracing=False)
+    set_default_openai_api(AGENTS_API)
+
+
+@app.after_serving
+async def shutdown():
+    await app.config["HTTP_CLIENT"].aclose()
+    resources.close()
+
+
+@app.route("/chat", methods=["POST"])
+async def chat():
+    data = await request.get_json()
+    query = data.get("message", "")
+    thread_id = data.get("thread_id", "1")
+
+    if not query:
+        return jsonify({"error": "Missing query parameter"}), 400
+
+    try:
+        content = await run_chat_turn(manager_agent, thread_id, query, specialists)
+
+        return jsonify({
+            "role": "assistant",
+            "content": content
+        })
+
+    except Exception as e:
+        print(f"Error in chat endpoint: {e}")
+        return jsonify({
+            "error": f"Error processing request: {str(e)}"
+        }), 500
+
+
+@app.route("/chat/stream", methods=["POST"])
+async def chat_stream():
+    data = await request.get_json()
+    query = data.get("message", "")
+    thread_id = data.get("thread_id", "1")
+
+    if not query:
+        return jsonify({"error": "Missing query parameter"}), 400
+
+    async def events():
+        async for event in stream_chat_turn(manager_agent, thread_id, query, specialists):
+            yield sse_event(event)
+
+    return events(), 200, {"Content-Type": "text/event-stream", "Cache-Control": "no-cache"}
+
+
+@app.route("/health", methods=["GET"])
+async def health():
+    # Checks of the shared clients built so far, see resources.py (they block, keep them off the loop)
+    status = await asyncio.to_thread(resources.health)
+    healthy = all(not value.startswith("error") for value in status.values())
+    return jsonify(status), 200 if healthy else 503
+
+
+@app.route("/metrics", methods=["GET"])
+async def metrics_endpoint():
+    # Stage latency histograms, see metrics.py (empty unless METRICS_ENABLED=1)
+    return metrics.render(), 200, {"Content-Type": metrics.CONTENT_TYPE}
+
+
+if __name__ == "__main__":
+    app.run(host="0.0.0.0", port=5001)
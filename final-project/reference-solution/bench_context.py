@@ -0,0 +1,87 @@
+"""
+Size of the product context handed to the agent: full text vs context_builder.
+
+Retrieves the top products for every question of eval_queries.json with a
+BM25 index over hoanghamobile.csv (offline, no embeddings), then formats
+them both ways and reports tokens, build time, the estimated prefill time
+saved and how many of the facts the question asks about (the asked fields
+of the relevant products) the compact context still contains.
+
+    python bench_context.py
+    python bench_context.py --max-tokens 300 --n-results 5
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+
+from bm25 import BM25Index
+from catalog import load_products
+from context_builder import PROMOTION, asked_fields, build_context, split_fields
+from embeddings import count_tokens
+
+
+def full_context(documents: list[str]) -> str:
+    # rag.format_products with RAG_CONTEXT_FORMAT=full
+    return "".join(f"{i}). \n{document.strip()}\n\n" for i, document in enumerate(documents))
+
+
+def asked_facts(query: str, document: str) -> list[str]:
+    """Lines of `document` answering `query`, as build_context writes them."""
+    asked = asked_fields(query)
+    _, promotions, fields = split_fields(document)
+    facts = [f"{label}: {value}" for label, value in fields if label in asked]
+    if PROMOTION in asked:
+        facts += promotions
+    return facts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Full vs compact product context")
+    parser.add_argument("--csv", default="hoanghamobile.csv")
+    parser.add_argument("--queries", default="eval_queries.json")
+    parser.add_argument("--n-results", type=int, default=3)
+    parser.add_argument("--max-tokens", type=int, default=500)
+    parser.add_argument("--prefill-tps", type=float, default=3000, help="Input tokens per second used for the estimate")
+    args = parser.parse_args()
+
+    df = load_products(args.csv)
+    documents = df["information"].tolist()
+    ids = df["_id"].astype(str).tolist()
+    index = BM25Index.build(documents)
+    with open(args.queries, encoding="utf-8") as f:
+        queries = json.load(f)
+
+    full_tokens, compact_tokens, build_ms = [], [], []
+    facts_total = facts_kept = 0
+    for item in queries:
+        hits = [doc_id for doc_id, _ in index.search(item["query"], args.n_results)]
+        hit_documents = [documents[doc_id] for doc_id in hits]
+
+        start = time.perf_counter()
+        compact = build_context(item["query"], hit_documents, args.max_tokens)
+        build_ms.append((time.perf_counter() - start) * 1000)
+
+        full_tokens.append(count_tokens(full_context(hit_documents)))
+        compact_tokens.append(count_tokens(compact))
+        for doc_id in hits:
+            if ids[doc_id] in item["relevant"]:
+                facts = asked_facts(item["query"], documents[doc_id])
+                facts_total += len(facts)
+                facts_kept += sum(fact in compact for fact in facts)
+
+    full_mean, compact_mean = np.mean(full_tokens), np.mean(compact_tokens)
+    print(f"{len(queries)} questions, top {args.n_results}, budget {args.max_tokens} tokens")
+    print(f"{'':<10}{'mean tok':>10}{'p95 tok':>10}{'prefill ms':>12}")
+    for name, tokens in (("full", full_tokens), ("compact", compact_tokens)):
+        print(f"{name:<10}{np.mean(tokens):>10.0f}{np.percentile(tokens, 95):>10.0f}"
+              f"{np.mean(tokens) / args.prefill_tps * 1000:>12.1f}")
+    print(f"\n{1 - compact_mean / full_mean:.0%} fewer tokens per rag() call, "
+          f"build {np.mean(build_ms):.2f} ms on average")
+    if facts_total:
+        print(f"asked facts of the relevant products kept: {facts_kept}/{facts_total} ({facts_kept / facts_total:.0%})")
+
+
+if __name__ == "__main__":
+    main()
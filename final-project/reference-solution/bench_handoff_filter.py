@@ -0,0 +1,112 @@
+"""
+Tokens and latency a specialist agent gets per turn, with and without the handoff input filter.
+
+Replays a scripted multi-turn shopping session. Every earlier turn is
+stored the way a run produces it: the user message, the manager's
+transfer_to_product call, the rag call with its search_result (real
+catalog rows) and the answer. The filter from input_filters.py (HANDOFF_*
+settings) is applied to the HandoffInputData of each new turn.
+
+    python bench_handoff_filter.py --turns 10
+    python bench_handoff_filter.py --turns 10 --live   # also time a real model call per turn
+
+Without --live the latency column is the prefill time estimated from
+--prefill-tps (input tokens per second of the model).
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from agents import Agent, ModelSettings, Runner
+from agents.handoffs import HandoffInputData
+
+from catalog import load_products
+from input_filters import create_input_filter, input_tokens, pass_through
+from prompt import PRODUCT_INSTRUCTION
+
+QUESTIONS = [
+    "Samsung Galaxy A05s có những màu nào?",
+    "Giá bao nhiêu?",
+    "Có ưu đãi gì khi mua trả góp không?",
+    "Tôi muốn tìm điện thoại dưới 5 triệu pin trâu",
+    "Nokia 3210 4G có giá bao nhiêu?",
+    "Dùng hệ điều hành gì?",
+    "iPhone 15 Pro 512GB giá bao nhiêu?",
+    "Có những màu nào?",
+    "So sánh với Samsung Galaxy S23",
+    "Máy nào chụp ảnh đẹp hơn?",
+]
+
+
+def past_turn(i: int, question: str, documents: list[str]) -> list[dict]:
+    handoff_id, rag_id = f"call_handoff_{i}", f"call_rag_{i}"
+    search_result = "".join(f"{j}). \n{doc}\n\n" for j, doc in enumerate(documents))
+    return [
+        {"role": "user", "content": question},
+        {"type": "function_call", "call_id": handoff_id, "name": "transfer_to_product", "arguments": "{}"},
+        {"type": "function_call_output", "call_id": handoff_id, "output": json.dumps({"assistant": "product"})},
+        {"type": "function_call", "call_id": rag_id, "name": "rag", "arguments": json.dumps({"query": question}, ensure_ascii=False)},
+        {"type": "function_call_output", "call_id": rag_id, "output": search_result},
+        {"role": "assistant", "content": f"Dựa trên thông tin tìm được: {documents[0][:300]}"},
+    ]
+
+
+async def live_seconds(agent: Agent, data: HandoffInputData) -> float:
+    # Only the user/assistant messages: the agent below has no tools to match the calls
+    items = [item for item in data.input_history if isinstance(item, dict) and "role" in item]
+    start = time.perf_counter()
+    await Runner.run(agent, items)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Handoff input filter: tokens and latency per turn")
+    parser.add_argument("--csv", default="hoanghamobile.csv")
+    parser.add_argument("--turns", type=int, default=len(QUESTIONS))
+    parser.add_argument("--results-per-search", type=int, default=3)
+    parser.add_argument("--prefill-tps", type=float, default=3000, help="Input tokens per second used for the estimate")
+    parser.add_argument("--live", action="store_true", help="Time a short model call per turn instead of estimating")
+    args = parser.parse_args()
+
+    documents = load_products(args.csv)["information"].tolist()
+    input_filter = create_input_filter()
+    agent = Agent(name="product", instructions=PRODUCT_INSTRUCTION, model_settings=ModelSettings(max_tokens=16))
+
+    history = []
+    totals = {"raw": 0, "filtered": 0}
+    print(f"{'turn':>4}{'raw tok':>9}{'filtered':>10}{'saved':>8}{'filter ms':>11}"
+          f"{'raw s':>8}{'filtered s':>12}")
+    for turn in range(args.turns):
+        question = QUESTIONS[turn % len(QUESTIONS)]
+        data = HandoffInputData(
+            input_history=tuple(history + [{"role": "user", "content": question}]),
+            pre_handoff_items=(),
+            new_items=(),
+        )
+
+        start = time.perf_counter()
+        filtered = input_filter(data)
+        filter_ms = (time.perf_counter() - start) * 1000
+
+        raw_tokens, filtered_tokens = input_tokens(pass_through(data)), input_tokens(filtered)
+        totals["raw"] += raw_tokens
+        totals["filtered"] += filtered_tokens
+        if args.live:
+            raw_s = asyncio.run(live_seconds(agent, data))
+            filtered_s = asyncio.run(live_seconds(agent, filtered))
+        else:
+            raw_s, filtered_s = raw_tokens / args.prefill_tps, filtered_tokens / args.prefill_tps
+        print(f"{turn + 1:>4}{raw_tokens:>9}{filtered_tokens:>10}{1 - filtered_tokens / raw_tokens:>8.0%}"
+              f"{filter_ms:>11.3f}{raw_s:>8.2f}{filtered_s:>12.2f}")
+
+        start_doc = (turn * args.results_per_search) % max(1, len(documents) - args.results_per_search)
+        history += past_turn(turn, question, documents[start_doc:start_doc + args.results_per_search])
+
+    print(f"\nsession: {totals['raw']} -> {totals['filtered']} input tokens "
+          f"({1 - totals['filtered'] / totals['raw']:.0%} fewer)"
+          + ("" if args.live else f", ~{(totals['raw'] - totals['filtered']) / args.prefill_tps:.1f}s prefill saved"))
+
+
+if __name__ == "__main__":
+    main()
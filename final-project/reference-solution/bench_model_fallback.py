@@ -0,0 +1,132 @@
+"""
+Tail latency of one provider vs model_fallback.FallbackModel with deadlines and hedging.
+
+By default the providers are simulated in-process: lognormal latency around
+a median, plus a fraction of stalled calls and of failed calls. The same
+requests are sent to the primary alone, to a fallback chain with a
+deadline, and to the chain with hedging, and the latency percentiles,
+errors and extra provider calls are reported.
+
+    python bench_model_fallback.py --requests 300 --concurrency 20
+    python bench_model_fallback.py --primary 0.4 0.1 0.05 --deadline 3
+
+Or against two fake_openai_server.py instances (through LiteLLM and the
+agents Runner, like oss_serve.py):
+
+    python fake_openai_server.py --port 8001 --chat-latency 0.2 --stall-rate 0.05 --stall-latency 20 &
+    python fake_openai_server.py --port 8002 --chat-latency 0.3 --fail-rate 0.02 &
+    python bench_model_fallback.py --fake-urls http://localhost:8001/v1 http://localhost:8002/v1
+"""
+import argparse
+import asyncio
+import random
+import time
+
+import numpy as np
+
+from model_fallback import FallbackModel
+
+
+class SimulatedProvider:
+    def __init__(self, name: str, median: float, stall_rate: float, fail_rate: float, stall_latency: float, seed: int):
+        self.model = name
+        self.median = median
+        self.stall_rate = stall_rate
+        self.fail_rate = fail_rate
+        self.stall_latency = stall_latency
+        self.calls = 0
+        self.rng = random.Random(seed)
+
+    async def get_response(self, *args, **kwargs):
+        self.calls += 1
+        if self.rng.random() < self.stall_rate:
+            delay = self.stall_latency
+        else:
+            delay = self.median * self.rng.lognormvariate(0, 0.4)
+        await asyncio.sleep(delay)
+        if self.rng.random() < self.fail_rate:
+            raise RuntimeError(f"{self.model}: injected failure")
+        return self.model
+
+    async def stream_response(self, *args, **kwargs):
+        yield await self.get_response(*args, **kwargs)
+
+
+async def run_requests(call, requests: int, concurrency: int) -> tuple[list[float], int]:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, errors = [], 0
+
+    async def one():
+        nonlocal errors
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                await call()
+                latencies.append(time.perf_counter() - start)
+            except Exception:
+                errors += 1
+
+    await asyncio.gather(*(one() for _ in range(requests)))
+    return latencies, errors
+
+
+def simulated_setups(args):
+    def providers():
+        return (SimulatedProvider("primary", *args.primary, args.stall_latency, seed=1),
+                SimulatedProvider("secondary", *args.secondary, args.stall_latency, seed=2))
+
+    primary, secondary = providers()
+    yield "primary only", primary.get_response, (primary, secondary)
+    primary, secondary = providers()
+    model = FallbackModel([primary, secondary], deadline=args.deadline, hedging=False)
+    yield f"fallback {args.deadline:g}s", model.get_response, (primary, secondary)
+    primary, secondary = providers()
+    model = FallbackModel([primary, secondary], deadline=args.deadline, hedging=True, hedge_delay=args.hedge_delay)
+    yield "fallback + hedge", model.get_response, (primary, secondary)
+
+
+def fake_server_setups(args):
+    from agents import Agent, Runner
+    from agents.extensions.models.litellm_model import LitellmModel
+
+    def run(model):
+        agent = Agent(name="bench", instructions="Trả lời ngắn gọn.", model=model)
+        return lambda: Runner.run(agent, "Nokia 3210 4G có giá bao nhiêu?")
+
+    primary, secondary = (LitellmModel(model="openai/fake", api_key="fake", base_url=url) for url in args.fake_urls)
+    names = ["primary", "secondary"]
+    yield "primary only", run(FallbackModel([primary], deadline=3600, names=names[:1])), ()
+    yield f"fallback {args.deadline:g}s", run(FallbackModel([primary, secondary], deadline=args.deadline,
+                                                            hedging=False, names=names)), ()
+    yield "fallback + hedge", run(FallbackModel([primary, secondary], deadline=args.deadline, hedging=True,
+                                                hedge_delay=args.hedge_delay, names=names)), ()
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Tail latency with model fallbacks and hedging")
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--primary", type=float, nargs=3, default=[0.2, 0.05, 0.02],
+                        metavar=("MEDIAN", "STALL_RATE", "FAIL_RATE"))
+    parser.add_argument("--secondary", type=float, nargs=3, default=[0.3, 0.01, 0.01],
+                        metavar=("MEDIAN", "STALL_RATE", "FAIL_RATE"))
+    parser.add_argument("--stall-latency", type=float, default=10.0, help="Seconds a stalled simulated call takes")
+    parser.add_argument("--deadline", type=float, default=2.0)
+    parser.add_argument("--hedge-delay", type=float, default=0.5, help="Hedge delay until the p95 is known")
+    parser.add_argument("--fake-urls", nargs=2, metavar=("PRIMARY", "SECONDARY"),
+                        help="Base URLs of two fake_openai_server.py instances instead of simulated providers")
+    args = parser.parse_args()
+
+    setups = fake_server_setups(args) if args.fake_urls else simulated_setups(args)
+    print(f"{args.requests} requests, {args.concurrency} at a time")
+    print(f"{'setup':<20}{'p50 s':>8}{'p95 s':>8}{'p99 s':>8}{'max s':>8}{'errors':>8}{'extra calls':>13}")
+    for name, call, providers in setups:
+        latencies, errors = await run_requests(call, args.requests, args.concurrency)
+        extra = sum(p.calls for p in providers[1:]) / args.requests if providers else float("nan")
+        p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) if latencies else (float("nan"),) * 3
+        print(f"{name:<20}{p50:>8.2f}{p95:>8.2f}{p99:>8.2f}{max(latencies, default=float('nan')):>8.2f}"
+              f"{errors / args.requests:>8.1%}{extra:>13.2f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,94 @@
+"""
+Memory per item and recall@k of quantized vector indexes.
+
+Compares the full-precision NumPy index with int8 codes, with and without
+the 1-bit Hamming pre-filter, and with and without float re-ranking. Run
+after setup.py, from the directory holding the db folder:
+    python bench_quantization.py --k 3
+    python bench_quantization.py --k 10 --prefilter 32 100 300
+
+binary/N keeps the N rows closest in Hamming distance before scoring the
+int8 codes, so its recall is capped by what the pre-filter keeps.
+"""
+import argparse
+import json
+import os
+import random
+import time
+
+import chromadb
+import numpy as np
+import pandas as pd
+
+from embeddings import embed_texts
+from vector_index import NumpyVectorIndex, QuantizedVectorIndex
+
+
+def main():
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    parser = argparse.ArgumentParser(description="Quantized index memory and recall")
+    parser.add_argument("--csv", default="hoanghamobile.csv")
+    parser.add_argument("--labeled", default=os.path.join(base_dir, "eval_queries.json"))
+    parser.add_argument("--queries", type=int, default=300, help="Product titles sampled as extra queries")
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--rerank", type=int, default=10)
+    parser.add_argument("--prefilter", type=int, nargs="+", default=[64, 128, 256],
+                        help="Hamming pre-filter sizes to compare (recall is capped by what it keeps)")
+    args = parser.parse_args()
+
+    collection = chromadb.PersistentClient("db").get_collection("products")
+    with open(args.labeled, encoding="utf-8") as f:
+        labeled = json.load(f)
+    titles = pd.read_csv(args.csv)["title"].dropna().astype(str).tolist()
+    random.seed(0)
+    texts = [item["query"] for item in labeled] + random.sample(titles, min(args.queries, len(titles)))
+    query_vectors = np.asarray(embed_texts(texts), dtype=np.float32)
+
+    baseline = NumpyVectorIndex.from_collection(collection)
+    exact = baseline.search_batch(query_vectors, args.k)
+
+    def variant(binary, rerank, prefilter=0):
+        index = QuantizedVectorIndex.from_index(baseline, binary=binary, rerank=args.rerank, prefilter=prefilter)
+        if not rerank:
+            index.vectors = None
+        return index
+
+    variants = {
+        "float32": baseline,
+        "int8": variant(False, False),
+        "int8+rerank": variant(False, True),
+    }
+    for prefilter in args.prefilter:
+        variants[f"binary/{prefilter}+int8"] = variant(True, False, prefilter)
+        variants[f"binary/{prefilter}+int8+rerank"] = variant(True, True, prefilter)
+
+    print(f"{len(baseline)} products, dim {baseline.dim}, {len(texts)} queries, k={args.k}")
+    print(f"{'index':<26}{'resident B/item':>16}{'on disk B/item':>16}{'recall@k':>10}{'labeled':>9}{'p50 ms':>9}")
+    for name, index in variants.items():
+        results, latencies = [], []
+        for vector in query_vectors:
+            start = time.perf_counter()
+            results.append(index.search(vector, args.k))
+            latencies.append(time.perf_counter() - start)
+
+        if isinstance(index, QuantizedVectorIndex):
+            memory = index.memory_per_item()
+            resident = memory["int8"] + memory["binary"] + index.scales.nbytes / len(index)
+            on_disk = memory["float32"]
+        else:
+            resident, on_disk = index.vectors.nbytes / len(index), 0
+
+        recall = np.mean([
+            len({i for i, _ in found} & {i for i, _ in truth}) / max(len(truth), 1)
+            for found, truth in zip(results, exact)
+        ])
+        labeled_hits = np.mean([
+            any(index.ids[i] in item["relevant"] for i, _ in found)
+            for found, item in zip(results, labeled)
+        ])
+        print(f"{name:<26}{resident:>16.0f}{on_disk:>16.0f}{recall:>10.3f}{labeled_hits:>9.3f}"
+              f"{np.percentile(latencies, 50) * 1000:>9.3f}")
+
+
+if __name__ == "__main__":
+    main()
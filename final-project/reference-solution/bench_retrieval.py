@@ -0,0 +1,173 @@
+"""
+Retrieval quality and latency benchmark for the product rag tool.
+
+Indexes hoanghamobile.csv (through catalog.join_string, like setup.py) into
+a separate benchmark db, then runs the labeled questions of
+eval_queries.json through rag.retrieve_products and reports recall@k, MRR,
+p50/p95/p99 retrieval latency and embedding calls for each search mode.
+
+Embeddings come from EMBEDDING_BACKEND (see embeddings.py):
+    python bench_retrieval.py                      # offline, deterministic local vectors
+    python bench_retrieval.py --backend recorded   # offline, real vectors saved earlier
+    python bench_retrieval.py --backend openai     # live API
+
+--backend recorded replays the embedding cache written by setup.py and by a
+previous --backend openai run (which records the question embeddings).
+Every mode is timed with the questions already in the embedding cache, or
+with --cold without the cache, so the modes compare on equal terms.
+Use --output to save the numbers and compare them across changes.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import time
+
+import numpy as np
+
+MODES = ["hybrid", "dense", "keyword"]
+
+
+def percentile(values: list[float], q: float) -> float:
+    return float(np.percentile(values, q)) * 1000 if values else 0.0
+
+
+def first_hit_rank(ids: list, relevant: list) -> int:
+    """1-based rank of the first relevant id, 0 when none was retrieved."""
+    for rank, id_ in enumerate(ids, 1):
+        if id_ in relevant:
+            return rank
+    return 0
+
+
+def build_index(csv_path: str, db_path: str):
+    """Sync the catalog into the benchmark db and write its BM25 and NumPy indexes."""
+    import chromadb
+
+    from bm25 import BM25Index
+    from catalog import load_products, product_metadatas
+    from embeddings import embedding_space
+    from indexer import open_collection, sync_collection
+    from vector_index import NumpyVectorIndex, QuantizedVectorIndex
+
+    df = load_products(csv_path)
+    ids = df["_id"].astype(str).tolist()
+    client = chromadb.PersistentClient(db_path)
+    collection = open_collection(client, "products", embedding_space())
+    summary = sync_collection(collection, ids=ids, documents=df["information"].tolist(),
+                              metadatas=product_metadatas(df))
+
+    BM25Index.build(df["information"].tolist()).save(os.environ["BM25_INDEX_PATH"], ids=ids)
+    vector_index = NumpyVectorIndex.from_collection(collection)
+    vector_index.save(os.environ["VECTOR_INDEX_PATH"])
+    QuantizedVectorIndex.from_index(vector_index).save(os.environ["QUANTIZED_INDEX_PATH"])
+    return summary
+
+
+def run_mode(labeled: list[dict], mode: str, ks: list[int], repeat: int) -> dict:
+    import embeddings
+    from rag import retrieve_products
+
+    n_results = max(ks)
+    ranks, latencies = [], []
+    requests_before = embeddings.embedding_stats["requests"]
+    for item in labeled:
+        for _ in range(repeat):
+            # rag.py logs every query and filter, keep the report readable
+            with contextlib.redirect_stdout(io.StringIO()):
+                start = time.perf_counter()
+                ids, _ = retrieve_products(item["query"], n_results=n_results, mode=mode)
+                latencies.append(time.perf_counter() - start)
+        ranks.append(first_hit_rank(ids, item["relevant"]))
+
+    return {
+        "recall": {k: float(np.mean([0 < rank <= k for rank in ranks])) for k in ks},
+        "mrr": float(np.mean([1 / rank if rank else 0.0 for rank in ranks])),
+        "p50_ms": percentile(latencies, 50),
+        "p95_ms": percentile(latencies, 95),
+        "p99_ms": percentile(latencies, 99),
+        "embed_calls": (embeddings.embedding_stats["requests"] - requests_before) / (len(labeled) * repeat),
+    }
+
+
+def warm_query_cache(labeled: list[dict], n_results: int) -> None:
+    """Embed every question once (untimed), so each mode starts with the same warm embedding cache."""
+    from rag import retrieve_products
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        for item in labeled:
+            retrieve_products(item["query"], n_results=n_results, mode="dense")
+
+
+def main():
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    parser = argparse.ArgumentParser(description="Recall, MRR and latency of the product rag tool")
+    parser.add_argument("--backend", choices=["local", "recorded", "openai"], default="local")
+    parser.add_argument("--db", help="Benchmark db folder (default db/bench_<backend>)")
+    parser.add_argument("--csv", default="hoanghamobile.csv")
+    parser.add_argument("--labeled", default=os.path.join(base_dir, "eval_queries.json"))
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=MODES)
+    parser.add_argument("--k", type=int, nargs="+", default=[1, 3, 5])
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per question")
+    parser.add_argument("--cold", action="store_true", help="Bypass the embedding cache for questions")
+    parser.add_argument("--vector-backend", choices=["chroma", "numpy", "quantized"], default="chroma")
+    parser.add_argument("--output", help="Write the results to this JSON file")
+    args = parser.parse_args()
+
+    # embeddings.py and rag.py read their settings at import time
+    db_path = args.db or os.path.join("db", f"bench_{args.backend}")
+    os.environ["EMBEDDING_BACKEND"] = args.backend
+    os.environ["VECTOR_BACKEND"] = args.vector_backend
+    os.environ["BM25_INDEX_PATH"] = os.path.join(db_path, "bm25_products")
+    os.environ["VECTOR_INDEX_PATH"] = os.path.join(db_path, "vectors_products")
+    os.environ["QUANTIZED_INDEX_PATH"] = os.path.join(db_path, "vectors_products_q")
+    os.environ["CHROMA_PATH"] = db_path
+    if args.backend == "local":
+        # Keep stand-in vectors out of the real embedding cache
+        os.environ["EMBEDDING_CACHE_PATH"] = os.path.join(db_path, "embedding_cache.sqlite")
+
+    import embeddings
+
+    start = time.perf_counter()
+    requests_before = embeddings.embedding_stats["requests"]
+    summary = build_index(args.csv, db_path)
+    index_seconds = time.perf_counter() - start
+    index_requests = embeddings.embedding_stats["requests"] - requests_before
+
+    with open(args.labeled, encoding="utf-8") as f:
+        labeled = json.load(f)
+    # Otherwise the first mode measured would pay for embedding the questions and the later ones not
+    if args.cold:
+        embeddings.embedding_cache = None
+    else:
+        warm_query_cache(labeled, max(args.k))
+
+    results = {mode: run_mode(labeled, mode, args.k, args.repeat) for mode in args.modes}
+
+    print(f"backend={args.backend} vector_backend={args.vector_backend} db={db_path}")
+    print(f"indexing: {summary}, {index_requests} embedding requests, {index_seconds:.2f}s")
+    print(f"{len(labeled)} labeled queries x {args.repeat}, n_results={max(args.k)}, "
+          f"{'cold' if args.cold else 'warm'} query cache")
+    print(f"{'mode':<10}" + "".join(f"{f'recall@{k}':>11}" for k in args.k)
+          + f"{'MRR':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'embed/q':>9}")
+    for mode, row in results.items():
+        recall = "".join(f"{row['recall'][k]:>11.3f}" for k in args.k)
+        print(f"{mode:<10}{recall}{row['mrr']:>8.3f}{row['p50_ms']:>9.2f}{row['p95_ms']:>9.2f}"
+              f"{row['p99_ms']:>9.2f}{row['embed_calls']:>9.2f}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({
+                "backend": args.backend,
+                "vector_backend": args.vector_backend,
+                "queries": len(labeled),
+                "cold": args.cold,
+                "indexing": {**summary, "embedding_requests": index_requests, "seconds": index_seconds},
+                "modes": results,
+            }, f, indent=2)
+        print(f"Saved results to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
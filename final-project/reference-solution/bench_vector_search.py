@@ -0,0 +1,99 @@
+"""
+Latency and recall of the NumPy exact-search backend against Chroma.
+
+Run after setup.py, from the directory holding the db folder:
+    python bench_vector_search.py --k 3 10 --queries 500
+
+Queries are the labeled questions from eval_queries.json plus product titles
+sampled from hoanghamobile.csv. Recall is reported twice: overlap with the
+exact top k (how much Chroma's approximate HNSW search loses) and hit rate
+on the labeled questions.
+"""
+import argparse
+import json
+import os
+import random
+import time
+
+import chromadb
+import numpy as np
+import pandas as pd
+
+from embeddings import embed_texts
+from vector_index import NumpyVectorIndex
+
+
+def percentile(values: list[float], q: float) -> float:
+    return float(np.percentile(values, q)) * 1000 if values else 0.0
+
+
+def timed(fn, queries) -> tuple[list, list[float]]:
+    results, latencies = [], []
+    for query in queries:
+        start = time.perf_counter()
+        results.append(fn(query))
+        latencies.append(time.perf_counter() - start)
+    return results, latencies
+
+
+def main():
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    parser = argparse.ArgumentParser(description="NumPy exact search vs Chroma")
+    parser.add_argument("--csv", default="hoanghamobile.csv")
+    parser.add_argument("--labeled", default=os.path.join(base_dir, "eval_queries.json"))
+    parser.add_argument("--queries", type=int, default=300, help="Product titles sampled as extra queries")
+    parser.add_argument("--k", type=int, nargs="+", default=[3, 10])
+    parser.add_argument("--index", default=os.getenv("VECTOR_INDEX_PATH", "db/vectors_products"))
+    args = parser.parse_args()
+
+    collection = chromadb.PersistentClient("db").get_collection("products")
+    with open(args.labeled, encoding="utf-8") as f:
+        labeled = json.load(f)
+
+    titles = pd.read_csv(args.csv)["title"].dropna().astype(str).tolist()
+    random.seed(0)
+    texts = [item["query"] for item in labeled] + random.sample(titles, min(args.queries, len(titles)))
+    query_vectors = np.asarray(embed_texts(texts), dtype=np.float32)
+    query_vectors /= np.linalg.norm(query_vectors, axis=1, keepdims=True)
+
+    indexes = {
+        "numpy": NumpyVectorIndex.from_collection(collection),
+    }
+    if os.path.exists(os.path.join(args.index, "meta.json")):
+        indexes["numpy-mmap"] = NumpyVectorIndex.load(args.index, mmap=True)
+
+    n, dim = len(indexes["numpy"]), indexes["numpy"].dim
+    print(f"{n} products, dim {dim}, {len(texts)} queries")
+    print(f"matrix: {indexes['numpy'].vectors.nbytes / 1024:.0f} KiB float32")
+
+    for k in args.k:
+        print(f"\n== k={k}")
+        print(f"{'backend':<14}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'recall':>9}{'labeled':>9}")
+
+        exact = indexes["numpy"].query(query_vectors, n_results=k)["ids"]
+
+        chroma_ids, latencies = timed(
+            lambda v: collection.query(query_embeddings=[v.tolist()], n_results=k)["ids"][0], query_vectors)
+        rows = [("chroma", chroma_ids, latencies)]
+        for name, index in indexes.items():
+            ids, latencies = timed(lambda v: index.query(v, n_results=k)["ids"][0], query_vectors)
+            rows.append((name, ids, latencies))
+
+        for name, ids, latencies in rows:
+            overlap = np.mean([len(set(a) & set(b)) / max(len(b), 1) for a, b in zip(ids, exact)])
+            hits = np.mean([any(id_ in item["relevant"] for id_ in found) for found, item in zip(ids, labeled)])
+            print(f"{name:<14}{percentile(latencies, 50):>9.3f}{percentile(latencies, 95):>9.3f}"
+                  f"{percentile(latencies, 99):>9.3f}{overlap:>9.3f}{hits:>9.3f}")
+
+        # Whole query set in one matrix product
+        start = time.perf_counter()
+        indexes["numpy"].search_batch(query_vectors, k)
+        batch_time = time.perf_counter() - start
+        start = time.perf_counter()
+        collection.query(query_embeddings=query_vectors.tolist(), n_results=k)
+        chroma_batch_time = time.perf_counter() - start
+        print(f"batch of {len(texts)}: numpy {batch_time * 1000:.2f} ms, chroma {chroma_batch_time * 1000:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
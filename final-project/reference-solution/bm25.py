@@ -0,0 +1,147 @@
+"""
+BM25 keyword index over tokenized documents.
+
+Postings are stored as flat NumPy arrays (CSR layout): for term t, the
+documents containing it are doc_ids[offsets[t]:offsets[t + 1]] with matching
+term frequencies in tfs. save() writes these arrays as .npy files so that
+load() can memory-map them instead of rebuilding the index.
+"""
+import json
+import os
+import shutil
+from collections import Counter
+
+import numpy as np
+
+from text_utils import tokenize
+
+
+def swap_directory(tmp_dir: str, directory: str) -> None:
+    """
+    Move the freshly written `tmp_dir` to `directory`
+
+    The previous version is renamed aside rather than deleted first, so
+    the path is only missing between two renames and readers that still
+    hold files of the old version keep working.
+    """
+    old_dir = directory.rstrip("/") + ".old"
+    shutil.rmtree(old_dir, ignore_errors=True)
+    if os.path.exists(directory):
+        os.replace(directory, old_dir)
+    os.replace(tmp_dir, directory)
+    shutil.rmtree(old_dir, ignore_errors=True)
+
+
+class BM25Index:
+    def __init__(self, vocab: dict, offsets: np.ndarray, doc_ids: np.ndarray, tfs: np.ndarray,
+                 doc_lengths: np.ndarray, k1: float = 1.5, b: float = 0.75):
+        self.vocab = vocab
+        self.offsets = offsets
+        self.doc_ids = doc_ids
+        self.tfs = tfs
+        self.doc_lengths = doc_lengths
+        self.k1 = k1
+        self.b = b
+        self.avg_length = float(doc_lengths.mean()) if len(doc_lengths) else 0.0
+
+    @classmethod
+    def build(cls, documents: list[str], **kwargs) -> "BM25Index":
+        """Tokenize `documents` and build the index (document i gets id i)."""
+        postings = {}
+        doc_lengths = np.zeros(len(documents), dtype=np.int32)
+
+        for doc_id, text in enumerate(documents):
+            tokens = tokenize(text)
+            doc_lengths[doc_id] = len(tokens)
+            for token, tf in Counter(tokens).items():
+                postings.setdefault(token, []).append((doc_id, tf))
+
+        vocab = {token: i for i, token in enumerate(sorted(postings))}
+        offsets = np.zeros(len(vocab) + 1, dtype=np.int64)
+        doc_ids, tfs = [], []
+        for token, term_id in vocab.items():
+            entries = postings[token]
+            offsets[term_id + 1] = offsets[term_id] + len(entries)
+            doc_ids.extend(d for d, _ in entries)
+            tfs.extend(tf for _, tf in entries)
+
+        return cls(vocab, offsets, np.asarray(doc_ids, dtype=np.int32),
+                   np.asarray(tfs, dtype=np.float32), doc_lengths, **kwargs)
+
+    def __len__(self) -> int:
+        return len(self.doc_lengths)
+
+    def save(self, directory: str, ids: list[str] = None) -> None:
+        """
+        Write the index to `directory`, replacing any previous version
+
+        Args:
+            directory: Target directory
+            ids: External id of each document, stored alongside the index
+        """
+        tmp_dir = directory.rstrip("/") + ".tmp"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+
+        for name in ("offsets", "doc_ids", "tfs", "doc_lengths"):
+            np.save(os.path.join(tmp_dir, f"{name}.npy"), getattr(self, name))
+        with open(os.path.join(tmp_dir, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump({"vocab": self.vocab, "ids": ids, "k1": self.k1, "b": self.b}, f, ensure_ascii=False)
+
+        swap_directory(tmp_dir, directory)
+
+    @classmethod
+    def load(cls, directory: str, mmap: bool = True) -> tuple["BM25Index", list]:
+        """Load an index written by save(). Returns the index and the stored ids."""
+        mmap_mode = "r" if mmap else None
+        arrays = {
+            name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode=mmap_mode)
+            for name in ("offsets", "doc_ids", "tfs", "doc_lengths")
+        }
+        with open(os.path.join(directory, "meta.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+        index = cls(meta["vocab"], k1=meta["k1"], b=meta["b"], **arrays)
+        return index, meta["ids"]
+
+    def scores(self, query: str) -> np.ndarray:
+        """BM25 score of every document for `query`."""
+        scores = np.zeros(len(self.doc_lengths), dtype=np.float32)
+        if not len(self.doc_lengths):
+            return scores
+
+        for token in set(tokenize(query)):
+            term_id = self.vocab.get(token)
+            if term_id is None:
+                continue
+            start, end = self.offsets[term_id], self.offsets[term_id + 1]
+            docs = self.doc_ids[start:end]
+            tf = self.tfs[start:end]
+
+            idf = np.log(1 + (len(self.doc_lengths) - len(docs) + 0.5) / (len(docs) + 0.5))
+            norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[docs] / self.avg_length)
+            scores[docs] += idf * tf * (self.k1 + 1) / (tf + norm)
+
+        return scores
+
+    def search(self, query: str, k: int = 10) -> list[tuple[int, float]]:
+        """Return up to k (doc_id, score) pairs with a positive score, best first."""
+        scores = self.scores(query)
+        k = min(k, len(scores))
+        if k == 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(i), float(scores[i])) for i in top if scores[i] > 0]
+
+
+def reciprocal_rank_fusion(rankings: list[list], k: int = 60) -> list:
+    """
+    Merge several ranked lists of ids into one.
+
+    Each id scores sum(1 / (k + rank)) over the lists it appears in.
+    """
+    scores = {}
+    for ranking in rankings:
+        for rank, item in enumerate(ranking):
+            scores[item] = scores.get(item, 0.0) + 1.0 / (k + rank + 1)
+    return sorted(scores, key=scores.get, reverse=True)
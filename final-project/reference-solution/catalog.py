@@ -0,0 +1,62 @@
+"""
+Product catalog loading shared by setup.py and the benchmarks.
+
+Each CSV row is flattened into one "information" text (what gets embedded
+and shown to the agent) and parsed into typed metadata fields.
+"""
+import ast
+
+import pandas as pd
+
+from product_specs import parse_product
+
+
+def join_string(item):
+    for i in range(len(item)):
+        title, product_promotion, product_specs, current_price, color_options = item
+
+        final_string = ""
+        if title:
+            final_string += f"{title}"
+
+        if product_promotion:
+            product_promotion = product_promotion.replace("<br>", " ").replace("\n", " ")
+            final_string += f" {product_promotion}"
+
+        if product_specs:
+            product_specs = product_specs.replace("<br>", " ").replace("\n", " ")
+            final_string += f" {product_specs}"
+
+        if current_price:
+            final_string += f" có giá: {current_price}"
+
+        if color_options:
+            final_string += " có màu sắc: "
+            colors = ast.literal_eval(color_options)
+
+            final_string += ", ".join(colors)
+
+
+    return final_string
+
+
+def load_products(path: str = "./hoanghamobile.csv") -> pd.DataFrame:
+    """Read the catalog CSV and add the "information" column."""
+    df = pd.read_csv(path)
+    df['information'] = df[
+        [
+         'title',
+         'product_promotion',
+         'product_specs',
+         'current_price',
+         'color_options']
+        ].astype(str).apply(join_string, axis=1)
+    return df[df['information'].notna()]
+
+
+def product_metadatas(df: pd.DataFrame) -> list[dict]:
+    """Typed fields (RAM, storage, price, brand, ...) used by rag.py for `where` filters."""
+    return [
+        parse_product(row.title, row.product_specs, row.current_price, row.color_options)
+        for row in df.itertuples()
+    ]
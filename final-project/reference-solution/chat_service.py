@@ -0,0 +1,266 @@
+"""
+Conversation turn handling shared by serve.py, oss_serve.py and asgi_serve.py.
+
+All agent runs execute on one long-lived event loop, so the model HTTP
+clients and their connection pools are reused across requests instead of
+being rebuilt by asyncio.run() every time.
+"""
+import asyncio
+import json
+import threading
+import time
+
+from agents import RunConfig, RunHooks, Runner, trace
+from openai.types.responses import ResponseTextDeltaEvent
+
+import metrics
+import prompt_cache
+from answer_cache import create_answer_cache
+from compaction import create_compactor
+from conversation_store import create_conversation_store
+from model_fallback import TimedModelProvider
+from embeddings import get_embedding
+from rag import data_version
+from router import create_router
+
+# Bounded per-thread history, see conversation_store.py for the backends
+conversation_store = create_conversation_store()
+
+# Folds older turns into a rolling summary after replying (COMPACTION_ENABLED=0 disables it)
+compactor = create_compactor(conversation_store)
+
+# Local intent router that can skip the manager hop (ROUTER_ENABLED=0 disables it)
+router = create_router()
+
+# Semantic cache of answers to context-free questions (ANSWER_CACHE_ENABLED=0 disables it)
+answer_cache = create_answer_cache(get_embedding, data_version)
+
+# Times the models looked up by name (serve.py's agents) with METRICS_ENABLED
+run_config = RunConfig(model_provider=TimedModelProvider()) if metrics.METRICS_ENABLED else None
+
+_loop = None
+_loop_lock = threading.Lock()
+
+
+def get_background_loop() -> asyncio.AbstractEventLoop:
+    """Return the event loop used by the sync Flask servers, starting it on first use."""
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="agents-loop", daemon=True).start()
+    return _loop
+
+
+def run_sync(coro):
+    """Run a coroutine on the shared background loop and wait for its result."""
+    return asyncio.run_coroutine_threadsafe(coro, get_background_loop()).result()
+
+
+def iterate_sync(async_iterator):
+    """Consume an async iterator on the shared background loop from sync code."""
+    loop = get_background_loop()
+    while True:
+        try:
+            yield asyncio.run_coroutine_threadsafe(async_iterator.__anext__(), loop).result()
+        except StopAsyncIteration:
+            return
+
+
+def sse_event(event: dict) -> str:
+    """Format an event as a Server-Sent Events message."""
+    return f"data: {json.dumps(event, ensure_ascii=False)}\n\n"
+
+
+class TurnHooks(RunHooks):
+    """
+    Times the stages of an agent run
+
+    Keeps the router's estimate of the manager hop current and, with
+    METRICS_ENABLED, records handoffs and tool calls. Model calls are timed
+    by the model wrappers of model_fallback.py, the pinned SDK has no hooks
+    around them.
+    """
+
+    def __init__(self, time_manager_hop: bool):
+        self.start = time.perf_counter()
+        self.time_manager_hop = time_manager_hop
+        self._tool_started = {}
+
+    async def on_handoff(self, context, from_agent, to_agent):
+        elapsed = time.perf_counter() - self.start
+        if self.time_manager_hop and from_agent.name == "manager":
+            router.observe_manager_hop(elapsed)
+        metrics.observe("handoff", elapsed, source=from_agent.name, target=to_agent.name)
+
+    async def on_tool_start(self, context, agent, tool):
+        self._tool_started[tool.name] = time.perf_counter()
+
+    async def on_tool_end(self, context, agent, tool, result):
+        started = self._tool_started.pop(tool.name, None)
+        if started is not None:
+            metrics.observe("tool", time.perf_counter() - started, tool=tool.name)
+
+
+async def select_agent(manager_agent, specialists: dict, query: str):
+    """
+    Pick the agent a turn starts with
+
+    Returns the specialist chosen by the local router when it is confident,
+    otherwise the manager, along with the run hooks to use.
+    """
+    if router is None or not specialists:
+        return manager_agent, TurnHooks(False) if metrics.METRICS_ENABLED else None
+
+    with metrics.span("route"):
+        decision = await asyncio.to_thread(router.route, query)
+    if decision.route in specialists:
+        return specialists[decision.route], TurnHooks(False) if metrics.METRICS_ENABLED else None
+    return manager_agent, TurnHooks(True)
+
+
+async def save_turn(thread_id: str, messages: list) -> None:
+    """Store the thread history and compact it in the background once it has grown."""
+    await asyncio.to_thread(conversation_store.set, thread_id, messages)
+    if compactor is not None:
+        compactor.schedule(thread_id, messages)
+
+
+async def cached_answer(query: str, history: list):
+    """Answer from the answer cache when the question allows it, otherwise None."""
+    if answer_cache is None or not answer_cache.cacheable(query, history):
+        return None
+    try:
+        return await asyncio.to_thread(answer_cache.get, query)
+    except Exception as e:
+        print(f"[answer cache] lookup failed: {e}")
+        return None
+
+
+def agent_names(manager_agent, specialists: dict = None) -> list[str]:
+    """The manager, the agents it hands off to and the router's specialists."""
+    names = [manager_agent.name, *(specialists or {})]
+    for target in manager_agent.handoffs:
+        # handoff() objects carry the agent's name, agents listed directly their own
+        names.append(getattr(target, "agent_name", None) or target.name)
+    return list(dict.fromkeys(names))
+
+
+async def answer_versions(query: str, history: list, names: list) -> dict:
+    """
+    Data versions the agents' answers depend on, read before a run
+
+    The agent that answers is only known afterwards, so the version of every
+    agent is kept: data that changes during the run must not be taken as the
+    source of the answer.
+    """
+    if answer_cache is None or not answer_cache.cacheable(query, history):
+        return {}
+    return await asyncio.to_thread(lambda: {name: answer_cache.version(name) for name in names})
+
+
+async def store_answer(query: str, history: list, answer: str, result, seconds: float, versions: dict) -> None:
+    if answer_cache is None or not answer_cache.cacheable(query, history):
+        return
+    source = getattr(getattr(result, "last_agent", None), "name", None)
+    if source not in versions:
+        return
+    usage = getattr(getattr(result, "context_wrapper", None), "usage", None)
+    try:
+        await asyncio.to_thread(answer_cache.put, query, answer, seconds, getattr(usage, "total_tokens", 0),
+                                source, versions[source])
+    except Exception as e:
+        print(f"[answer cache] store failed: {e}")
+
+
+async def run_chat_turn(manager_agent, thread_id: str, query: str, specialists: dict = None) -> str:
+    """
+    Run one user turn through the agents and record it in the thread history
+
+    Args:
+        manager_agent: Entry agent of the conversation
+        thread_id: Conversation thread identifier
+        query: The user's message
+        specialists: Agents the router may dispatch to directly, by name
+
+    Returns:
+        The assistant's reply
+    """
+    history = await asyncio.to_thread(conversation_store.get, thread_id)
+    new_input = history + [{"role": "user", "content": query}]
+
+    answer = await cached_answer(query, history)
+    if answer is not None:
+        await save_turn(thread_id, new_input + [{"role": "assistant", "content": answer}])
+        return answer
+
+    start = time.perf_counter()
+    versions = await answer_versions(query, history, agent_names(manager_agent, specialists))
+    agent, hooks = await select_agent(manager_agent, specialists, query)
+
+    with metrics.span("turn", mode="chat"), trace(workflow_name="Conversation", group_id=thread_id):
+        result = await Runner.run(agent, new_input, hooks=hooks, run_config=run_config)
+        prompt_cache.record_run(result)
+        await save_turn(thread_id, new_input + [{"role": "assistant", "content": str(result.final_output)}])
+
+    await store_answer(query, history, str(result.final_output), result, time.perf_counter() - start, versions)
+    return str(result.final_output)
+
+
+async def stream_chat_turn(manager_agent, thread_id: str, query: str, specialists: dict = None):
+    """
+    Run one user turn and yield events while the agents work
+
+    Yields dicts with a "type" of:
+        agent: the active agent changed ("name")
+        tool_call: a tool was called ("name")
+        delta: a chunk of the answer text ("content")
+        done: the run finished ("content" holds the full answer)
+        error: the run failed ("error")
+    """
+    # The run lives in its own task so the trace context is entered and exited
+    # in one place, whichever task ends up consuming this generator
+    queue = asyncio.Queue()
+
+    async def produce():
+        history = await asyncio.to_thread(conversation_store.get, thread_id)
+        new_input = history + [{"role": "user", "content": query}]
+        try:
+            answer = await cached_answer(query, history)
+            if answer is not None:
+                await save_turn(thread_id, new_input + [{"role": "assistant", "content": answer}])
+                queue.put_nowait({"type": "delta", "content": answer})
+                queue.put_nowait({"type": "done", "content": answer})
+                return
+
+            start = time.perf_counter()
+            versions = await answer_versions(query, history, agent_names(manager_agent, specialists))
+            agent, hooks = await select_agent(manager_agent, specialists, query)
+            with metrics.span("turn", mode="stream"), trace(workflow_name="Conversation", group_id=thread_id):
+                result = Runner.run_streamed(agent, new_input, hooks=hooks, run_config=run_config)
+
+                async for event in result.stream_events():
+                    if event.type == "raw_response_event":
+                        if isinstance(event.data, ResponseTextDeltaEvent) and event.data.delta:
+                            queue.put_nowait({"type": "delta", "content": event.data.delta})
+                    elif event.type == "agent_updated_stream_event":
+                        queue.put_nowait({"type": "agent", "name": event.new_agent.name})
+                    elif event.type == "run_item_stream_event" and event.item.type == "tool_call_item":
+                        queue.put_nowait({"type": "tool_call", "name": getattr(event.item.raw_item, "name", "")})
+
+                prompt_cache.record_run(result)
+                await save_turn(thread_id, new_input + [{"role": "assistant", "content": str(result.final_output)}])
+
+            queue.put_nowait({"type": "done", "content": str(result.final_output)})
+            await store_answer(query, history, str(result.final_output), result, time.perf_counter() - start, versions)
+
+        except Exception as e:
+            print(f"Error in streamed run: {e}")
+            queue.put_nowait({"type": "error", "error": f"Error processing request: {str(e)}"})
+        finally:
+            queue.put_nowait(None)
+
+    task = asyncio.create_task(produce())
+    while (event := await queue.get()) is not None:
+        yield event
+    await task
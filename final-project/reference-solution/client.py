@@ -50,6 +50,7 @@ st.markdown("""
 
 # Set API endpoint
 API_ENDPOINT = "http://localhost:5001/chat"
+STREAM_ENDPOINT = "http://localhost:5001/chat/stream"
 
 # Add headers for CORS if needed
 HEADERS = {
@@ -64,64 +65,91 @@ if "messages" not in st.session_state:
     st.session_state.messages = []
 if "user_input" not in st.session_state:
     st.session_state.user_input = ""
+if "pending_message" not in st.session_state:
+    st.session_state.pending_message = None
 
 # Title for the app
 st.title("💬 Agentic RAG Application")
 
-# Function to display chat messages
-def display_messages():
-    for message in st.session_state.messages:
-        role = message["role"]
-        content = message["content"]
-        
-        avatar_url = "https://api.dicebear.com/7.x/bottts/svg?seed=assistant" if role == "assistant" else "https://api.dicebear.com/7.x/personas/svg?seed=user"
-        
-        with st.container():
-            st.markdown(f"""
+# Render one chat message as HTML
+def render_message(role, content):
+    avatar_url = "https://api.dicebear.com/7.x/bottts/svg?seed=assistant" if role == "assistant" else "https://api.dicebear.com/7.x/personas/svg?seed=user"
+    
+    return f"""
             <div class="chat-message {role}">
                 <div class="message-content">
                     <img class="avatar" src="{avatar_url}">
                     <div>{content}</div>
                 </div>
             </div>
-            """, unsafe_allow_html=True)
+            """
+
+# Function to display chat messages
+def display_messages():
+    for message in st.session_state.messages:
+        with st.container():
+            st.markdown(render_message(message["role"], message["content"]), unsafe_allow_html=True)
 
 # Display existing chat messages
 display_messages()
 
-# Function to send message and get response
+# Stream the assistant's answer into a placeholder as tokens arrive
+def stream_response(user_message):
+    data = {
+        "message": user_message,
+        "thread_id": st.session_state.thread_id
+    }
+    placeholder = st.empty()
+    placeholder.markdown(render_message("assistant", "<i>Thinking...</i>"), unsafe_allow_html=True)
+    content = ""
+    
+    try:
+        with requests.post(STREAM_ENDPOINT, json=data, headers=HEADERS, stream=True, timeout=60) as response:
+            if response.status_code != 200:
+                st.error(f"Error: {response.status_code} - {response.text}")
+                return
+            
+            response.encoding = "utf-8"
+            for line in response.iter_lines(decode_unicode=True):
+                if not line or not line.startswith("data: "):
+                    continue
+                event = json.loads(line[len("data: "):])
+                
+                if event["type"] == "delta":
+                    content += event["content"]
+                elif event["type"] == "tool_call" and not content:
+                    placeholder.markdown(render_message("assistant", f"<i>Searching ({event['name']})...</i>"), unsafe_allow_html=True)
+                    continue
+                elif event["type"] == "done":
+                    content = event["content"]
+                elif event["type"] == "error":
+                    st.error(event["error"])
+                    return
+                else:
+                    continue
+                placeholder.markdown(render_message("assistant", content), unsafe_allow_html=True)
+        
+        # Add assistant response to chat
+        st.session_state.messages.append({"role": "assistant", "content": content})
+    except Exception as e:
+        st.error(f"Failed to communicate with the server: {str(e)}")
+
+if st.session_state.pending_message:
+    user_message = st.session_state.pending_message
+    st.session_state.pending_message = None
+    stream_response(user_message)
+
+# Function to queue the message, the response is streamed on the next run
 def send_message():
     if st.session_state.user_input:
         user_message = st.session_state.user_input
         
         # Add user message to chat
         st.session_state.messages.append({"role": "user", "content": user_message})
+        st.session_state.pending_message = user_message
         
         # Clear input field
         st.session_state.user_input = ""
-        
-        # Prepare data for API call
-        data = {
-            "message": user_message,
-            "thread_id": st.session_state.thread_id
-        }
-        
-        try:
-            # Show spinner while waiting for response
-            # with st.spinner("Thinking..."):
-            response = requests.post(API_ENDPOINT, json=data, headers=HEADERS)
-            
-            if response.status_code == 200:
-                assistant_response = response.json()
-                # Add assistant response to chat
-                st.session_state.messages.append({
-                    "role": "assistant",
-                    "content": assistant_response["content"]
-                })
-            else:
-                st.error(f"Error: {response.status_code} - {response.text}")
-        except Exception as e:
-            st.error(f"Failed to communicate with the server: {str(e)}")
 
 # Create a form for user input
 with st.form(key="chat_form", clear_on_submit=True):
@@ -0,0 +1,186 @@
+"""
+Rolling summaries that keep the history sent to the agents bounded.
+
+A thread's stored history is an optional summary message followed by the
+recent turns verbatim. Once more than keep_turns + compact_every turns are
+stored, the older ones are folded into the summary in the background after
+the reply has been sent, and the stored history is rewritten. Tool calls and
+tool outputs (the large search_result blobs) are dropped from every turn but
+the latest, they are not needed to follow the conversation.
+
+Per-turn input therefore stays around max_summary_tokens plus
+keep_turns + compact_every turns, however long the conversation gets.
+"""
+import asyncio
+import os
+from typing import Awaitable, Callable, Optional
+
+from embeddings import count_tokens
+from resources import resources
+
+SUMMARY_PREFIX = "Tóm tắt cuộc trò chuyện trước đó: "
+
+SUMMARY_INSTRUCTION = (
+    "Bạn tóm tắt cuộc trò chuyện giữa khách hàng và trợ lý của một cửa hàng điện thoại. "
+    "Viết bằng tiếng Việt, ngắn gọn, tối đa {max_words} từ. Giữ lại tên sản phẩm, giá, "
+    "màu sắc, cấu hình và các yêu cầu khách đã nêu (ngân sách, hãng, dung lượng...)."
+)
+
+
+def is_summary(message: dict) -> bool:
+    return message.get("role") == "system" and str(message.get("content", "")).startswith(SUMMARY_PREFIX)
+
+
+def summary_message(summary: str) -> dict:
+    return {"role": "system", "content": SUMMARY_PREFIX + summary}
+
+
+def strip_tool_items(messages: list) -> list:
+    """Keep only user, assistant and system messages (no tool calls or outputs)."""
+    return [
+        m for m in messages
+        if m.get("type", "message") == "message" and m.get("role") in ("user", "assistant", "system")
+    ]
+
+
+def split_history(messages: list) -> tuple[str, list, list]:
+    """
+    Returns:
+        The current summary ("" if none), the messages it occupies and the
+        remaining messages grouped into turns (each starting at a user message)
+    """
+    head = []
+    while len(head) < len(messages) and is_summary(messages[len(head)]):
+        head.append(messages[len(head)])
+    summary = " ".join(m["content"][len(SUMMARY_PREFIX):] for m in head)
+
+    turns = []
+    for message in messages[len(head):]:
+        if message.get("role") == "user" or not turns:
+            turns.append([])
+        turns[-1].append(message)
+    return summary, head, turns
+
+
+def _text(message: dict) -> str:
+    content = message.get("content") or ""
+    if isinstance(content, list):
+        content = " ".join(part.get("text", "") for part in content if isinstance(part, dict))
+    return str(content)
+
+
+def extractive_summary(previous: str, messages: list, max_tokens: int) -> str:
+    """Summary without a model: the start of each question and answer, oldest dropped first."""
+    lines = [previous] if previous else []
+    for message in strip_tool_items(messages):
+        label = "Khách" if message.get("role") == "user" else "Trợ lý"
+        lines.append(f"{label}: {_text(message)[:150]}")
+    while len(lines) > 1 and count_tokens(" | ".join(lines)) > max_tokens:
+        lines.pop(0)
+    return " | ".join(lines)
+
+
+class LLMSummarizer:
+    def __init__(self, model: str = "gpt-4o-mini", max_tokens: int = 300):
+        self.model = model
+        self.max_tokens = max_tokens
+        resources.register("summary_client", self._create_client)
+
+    @staticmethod
+    def _create_client():
+        from openai import AsyncOpenAI
+        return AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+
+    async def __call__(self, previous: str, messages: list) -> str:
+        transcript = "\n".join(
+            f"{'Khách' if m.get('role') == 'user' else 'Trợ lý'}: {_text(m)}" for m in strip_tool_items(messages)
+        )
+        if previous:
+            transcript = f"Tóm tắt trước: {previous}\n{transcript}"
+        try:
+            response = await resources.get("summary_client").chat.completions.create(
+                model=self.model,
+                messages=[
+                    {"role": "system", "content": SUMMARY_INSTRUCTION.format(max_words=self.max_tokens // 2)},
+                    {"role": "user", "content": transcript},
+                ],
+                max_tokens=self.max_tokens,
+            )
+            return response.choices[0].message.content.strip()
+        except Exception as e:
+            print(f"[compaction] summary model failed ({e}), using an extractive summary")
+            return extractive_summary(previous, messages, self.max_tokens)
+
+
+class HistoryCompactor:
+    def __init__(self, store, summarize: Callable[[str, list], Awaitable[str]],
+                 keep_turns: int = 4, compact_every: int = 2):
+        """
+        Args:
+            store: ConversationStore holding the threads
+            summarize: async (previous summary, messages to fold in) -> new summary
+            keep_turns: Recent turns always kept verbatim
+            compact_every: Extra turns allowed before a compaction runs
+        """
+        self.store = store
+        self.summarize = summarize
+        self.keep_turns = keep_turns
+        self.compact_every = compact_every
+        self._running = set()
+        self._tasks = set()
+
+    def schedule(self, thread_id: str, history: list) -> None:
+        """Compact `thread_id` in the background if `history` has grown enough (call on the event loop)."""
+        _, _, turns = split_history(history)
+        if len(turns) <= self.keep_turns + self.compact_every or thread_id in self._running:
+            return
+        self._running.add(thread_id)
+        task = asyncio.get_running_loop().create_task(self.compact(thread_id))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def compact(self, thread_id: str) -> None:
+        try:
+            # The store may block (SQLite), so it is only used from worker threads
+            messages = await asyncio.to_thread(self.store.get, thread_id)
+            summary, head, turns = split_history(messages)
+            if len(turns) <= self.keep_turns:
+                return
+            old = [m for turn in turns[:-self.keep_turns] for m in turn]
+            new_summary = await self.summarize(summary, old)
+            if await asyncio.to_thread(self._replace, thread_id, head + old, new_summary):
+                print(f"[compaction] {thread_id}: folded {len(turns) - self.keep_turns} turns into the summary")
+        except Exception as e:
+            print(f"[compaction] {thread_id} failed: {e}")
+        finally:
+            self._running.discard(thread_id)
+
+
+    def _replace(self, thread_id: str, consumed: list, new_summary: str) -> bool:
+        """Replace the summarized messages by the new summary, unless the thread changed under them."""
+        # A turn may have been stored meanwhile, only replace what was summarized
+        current = self.store.get(thread_id)
+        if current[:len(consumed)] != consumed:
+            return False
+        _, _, recent = split_history(current[len(consumed):])
+        recent = [strip_tool_items(turn) for turn in recent[:-1]] + recent[-1:]
+        self.store.set(thread_id, [summary_message(new_summary)] + [m for turn in recent for m in turn])
+        return True
+
+
+def create_compactor(store) -> Optional[HistoryCompactor]:
+    """Build the compactor configured by the COMPACTION_* environment variables, or None if disabled."""
+    if os.getenv("COMPACTION_ENABLED", "1") == "0":
+        return None
+    max_tokens = int(os.getenv("COMPACTION_SUMMARY_TOKENS", "300"))
+    if os.getenv("COMPACTION_SUMMARIZER", "llm") == "extractive":
+        async def summarize(previous, messages):
+            return extractive_summary(previous, messages, max_tokens)
+    else:
+        summarize = LLMSummarizer(os.getenv("COMPACTION_MODEL", "gpt-4o-mini"), max_tokens)
+    return HistoryCompactor(
+        store,
+        summarize,
+        keep_turns=int(os.getenv("COMPACTION_KEEP_TURNS", "4")),
+        compact_every=int(os.getenv("COMPACTION_EVERY", "2")),
+    )
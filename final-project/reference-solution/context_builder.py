@@ -0,0 +1,198 @@
+"""
+Compact product context for the product agent.
+
+Pasting each hit's whole "information" text (see catalog.join_string) gives
+the agent the title, every promotion line, every spec and the price and
+colors of every product, most of it unrelated to the question, and the same
+bank and installment promotions repeat in almost every hit. build_context()
+splits each hit back into its fields, puts the fields the question asks
+about first (a price question gets the price, a color question the colors)
+and leaves out the other specs and promotions, lists the promotions shared
+by several hits once and adds fields, most relevant first, until the token
+budget is spent. A question naming only a product gets all its fields, in
+the order of DEFAULT_SCORES, as far as the budget allows.
+"""
+import re
+from collections import Counter
+
+from embeddings import count_tokens
+from text_utils import tokenize
+
+PROMOTION = "Khuyến mãi"
+PRICE = "Giá"
+COLORS = "Màu sắc"
+
+SPEC_LABELS = (
+    "Công nghệ màn hình", "Độ phân giải", "Kích thước màn hình", "Hệ điều hành", "Vi xử lý", "CPU",
+    "Bộ nhớ trong", "RAM", "Mạng di động", "Số khe SIM", "Dung lượng pin", "Trọng lượng",
+    "Cổng kết nối", "Kích thước",
+)
+# Longest first, so "Kích thước màn hình" is not read as "Kích thước"
+_SPEC_PATTERN = re.compile(
+    r"(?<!\S)(" + "|".join(re.escape(label) for label in sorted(SPEC_LABELS, key=len, reverse=True)) + r"):\s"
+)
+# Promotion lines that only number the offers
+_PROMOTION_NOISE = re.compile(r"KM\s*\d+")
+# Written by catalog.join_string with a trailing space, which is all that is left when the value is empty
+_TAIL_MARKS = ((re.compile(r"\s+có màu sắc:(?:\s+|$)"), COLORS), (re.compile(r"\s+có giá:(?:\s+|$)"), PRICE))
+
+# Words (diacritics folded) showing which fields a question is about. Folding
+# merges words ("màu"/"mẫu", "sắc"/"sạc", "ảnh"/"anh"), and a wrongly detected
+# field drops the others, so ambiguous words are only matched inside phrases
+FIELD_KEYWORDS = {
+    PRICE: ("gia", "bao nhieu", "gia tien", "trieu", "re", "ngan sach"),
+    COLORS: ("mau sac", "mau gi", "may mau"),
+    PROMOTION: ("khuyen mai", "km", "uu dai", "qua tang", "tang kem", "giam gia", "tra gop", "voucher", "sale",
+                "the tin dung"),
+    "Độ phân giải": ("camera", "chup anh", "chup hinh", "selfie", "phan giai", "quay phim"),
+    "Dung lượng pin": ("pin", "mah", "sac nhanh"),
+    "RAM": ("ram",),
+    "Bộ nhớ trong": ("bo nho", "rom", "luu tru", "dung luong"),
+    "Hệ điều hành": ("he dieu hanh", "hdh", "android", "ios"),
+    "Vi xử lý": ("chip", "cpu", "vi xu ly", "snapdragon", "helio", "dimensity", "unisoc", "exynos",
+                 "choi game", "hieu nang"),
+    "Công nghệ màn hình": ("man hinh", "amoled", "oled", "lcd", "ips"),
+    "Kích thước màn hình": ("man hinh", "inch"),
+    "Kích thước": ("kich thuoc",),
+    "Số khe SIM": ("sim",),
+    # Not "4g"/"5g": they are part of product names
+    "Mạng di động": ("mang di dong",),
+    "Trọng lượng": ("trong luong", "gram"),
+    "Cổng kết nối": ("cong ket noi", "usb", "type c", "jack"),
+}
+FIELD_KEYWORDS["CPU"] = FIELD_KEYWORDS["Vi xử lý"]
+# Questions about the whole configuration
+SPEC_KEYWORDS = ("cau hinh", "thong so")
+
+# Order of the fields the question does not mention
+DEFAULT_SCORES = {PRICE: 3, COLORS: 2, PROMOTION: 0}
+SPEC_SCORE = 1
+ASKED_SCORE = 10
+# Kept next to the asked fields, short and often needed by the next question
+ALWAYS_KEPT = (PRICE, COLORS)
+
+
+def _present(value: str) -> bool:
+    # catalog.join_string writes missing CSV cells as "nan"
+    return value is not None and value.strip() not in ("", "nan", "None")
+
+
+def _split_head(head: str) -> tuple[str, list[str]]:
+    """Title and promotion lines ("- ..." after the title)."""
+    words = head.split()
+    while words and words[-1] == "nan":
+        words.pop()
+    segments = re.split(r"\s-\s", " ".join(words))
+
+    title, promotions = segments[0], []
+    for segment in segments[1:]:
+        # Titles are lowercase and contain dashes too: "samsung galaxy a05s - 6gb/128gb"
+        if segment[:1].isupper() or (promotions and segment[:1].isdigit()):
+            promotions.append(segment)
+        elif promotions:
+            promotions[-1] += " - " + segment
+        else:
+            title += " - " + segment
+    promotions = [line.strip() for line in promotions if not _PROMOTION_NOISE.fullmatch(line.strip())]
+    return title.strip(), promotions
+
+
+def split_fields(information: str) -> tuple[str, list[str], list[tuple[str, str]]]:
+    """
+    Split an "information" text back into its parts
+
+    Returns:
+        The title, the promotion lines and the (label, value) fields: the
+        specs, then the price and the colors
+    """
+    text = information
+    tail = []
+    for mark, label in _TAIL_MARKS:
+        matches = list(mark.finditer(text))
+        if matches:
+            text, value = text[:matches[-1].start()], text[matches[-1].end():]
+            value = re.sub(rf"^{label}:\s*", "", value.strip())
+            if _present(value):
+                tail.insert(0, (label, value))
+
+    parts = _SPEC_PATTERN.split(text)
+    specs = [(parts[i], parts[i + 1].strip(" |")) for i in range(1, len(parts) - 1, 2)]
+    title, promotions = _split_head(parts[0])
+    return title, promotions, [(label, value) for label, value in specs if _present(value)] + tail
+
+
+def asked_fields(query: str) -> set:
+    """Labels of the fields `query` asks about."""
+    text = f" {' '.join(tokenize(query))} "
+    asked = {label for label, keywords in FIELD_KEYWORDS.items()
+             if any(f" {keyword} " in text for keyword in keywords)}
+    if any(f" {keyword} " in text for keyword in SPEC_KEYWORDS):
+        asked.update(SPEC_LABELS)
+    return asked
+
+
+def field_score(label: str, asked: set):
+    """Rank of a field for the question, None when it should be left out."""
+    if label in asked:
+        return DEFAULT_SCORES.get(label, SPEC_SCORE) + ASKED_SCORE
+    if asked and label not in ALWAYS_KEPT:
+        return None
+    return DEFAULT_SCORES.get(label, SPEC_SCORE)
+
+
+def build_context(query: str, documents: list[str], max_tokens: int = 500) -> str:
+    """
+    Context for the product agent from the retrieved `documents`, best first
+
+    Args:
+        query: The search query, decides which fields come first
+        documents: The "information" texts of the hits
+        max_tokens: Token budget (0 for none); the titles are always kept
+
+    Returns:
+        One "i). title" block per hit with its fields as "- label: value"
+        lines, followed by the promotions shared by several hits
+    """
+    hits = [split_fields(document) for document in documents]
+    asked = asked_fields(query)
+
+    # Promotion lines found in several hits are listed once, by the set of hits they apply to
+    counts = Counter(line for _, promotions, _ in hits for line in dict.fromkeys(promotions))
+    shared = {}
+    for rank, (_, promotions, _) in enumerate(hits):
+        for line in promotions:
+            if counts[line] > 1:
+                shared.setdefault(line, []).append(rank)
+    groups = {}
+    for line, ranks in shared.items():
+        groups.setdefault(tuple(dict.fromkeys(ranks)), []).append(line)
+
+    # (score, rank, order, hit or None for a shared group, line)
+    candidates = []
+    for rank, (_, promotions, fields) in enumerate(hits):
+        own = [line for line in dict.fromkeys(promotions) if line not in shared]
+        if own:
+            fields = fields + [(PROMOTION, "; ".join(own))]
+        for order, (label, value) in enumerate(fields):
+            candidates.append((field_score(label, asked), rank, order, rank, f"- {label}: {value}"))
+    for order, (ranks, lines) in enumerate(groups.items()):
+        products = ", ".join(str(rank) for rank in ranks)
+        candidates.append((field_score(PROMOTION, asked), ranks[0], len(SPEC_LABELS) + order, None,
+                           f"{PROMOTION} chung của sản phẩm {products}: {'; '.join(lines)}"))
+    candidates = [candidate for candidate in candidates if candidate[0] is not None]
+
+    titles = [f"{rank}). {title}" for rank, (title, _, _) in enumerate(hits)]
+    remaining = max_tokens - sum(count_tokens(title) + 1 for title in titles)
+    chosen = []
+    for candidate in sorted(candidates, key=lambda c: (-c[0], c[1], c[2])):
+        tokens = count_tokens(candidate[4]) + 1
+        if max_tokens <= 0 or tokens <= remaining:
+            chosen.append(candidate)
+            remaining -= tokens
+
+    blocks = []
+    for rank, title in enumerate(titles):
+        lines = [line for _, _, _, hit, line in chosen if hit == rank]
+        blocks.append("\n".join([title] + lines))
+    blocks += [line for _, _, _, hit, line in chosen if hit is None]
+    return "\n\n".join(blocks) + "\n" if blocks else ""
@@ -0,0 +1,181 @@
+"""
+Conversation history storage for the chat servers.
+
+Two backends share the same interface:
+- InMemoryConversationStore: per-process LRU with a TTL
+- SQLiteConversationStore: a file shared by every worker process
+
+Both trim each thread to the last MAX_HISTORY_TURNS user turns and
+MAX_HISTORY_TOKENS tokens, so memory stays flat on a long-running server.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+
+from embeddings import count_tokens
+
+
+def _message_tokens(message: dict) -> int:
+    content = message.get("content")
+    if not isinstance(content, str):
+        content = json.dumps(message, ensure_ascii=False, default=str)
+    return count_tokens(content) + 4
+
+
+def trim_history(messages: list, max_turns: int = None, max_tokens: int = None) -> list:
+    """
+    Keep the most recent turns of a conversation
+
+    A turn starts at a user message and includes everything up to the next
+    one. Whole turns are dropped from the front until both limits hold, but
+    the latest turn is always kept. System messages before the first turn
+    (the rolling summary, see compaction.py) are kept as well.
+    """
+    starts = [i for i, m in enumerate(messages) if m.get("role") == "user"]
+    if not starts:
+        return list(messages)
+    head = [m for m in messages[:starts[0]] if m.get("role") == "system"]
+
+    if max_turns is not None and len(starts) > max_turns:
+        starts = starts[-max_turns:]
+
+    if max_tokens is not None:
+        while len(starts) > 1 and sum(_message_tokens(m) for m in messages[starts[0]:]) > max_tokens:
+            starts = starts[1:]
+
+    return head + list(messages[starts[0]:])
+
+
+class ConversationStore(ABC):
+    def __init__(self, ttl: float = 24 * 3600, max_turns: int = 20, max_tokens: int = 4000):
+        """
+        Args:
+            ttl: Seconds of inactivity after which a thread is forgotten
+            max_turns: User turns kept per thread
+            max_tokens: Tokens kept per thread
+        """
+        self.ttl = ttl
+        self.max_turns = max_turns
+        self.max_tokens = max_tokens
+
+    @abstractmethod
+    def get(self, thread_id: str) -> list:
+        ...
+
+    @abstractmethod
+    def set(self, thread_id: str, messages: list) -> None:
+        ...
+
+    @abstractmethod
+    def delete(self, thread_id: str) -> None:
+        ...
+
+    def trim(self, messages: list) -> list:
+        return trim_history(messages, self.max_turns, self.max_tokens)
+
+
+class InMemoryConversationStore(ConversationStore):
+    def __init__(self, max_threads: int = 10_000, **kwargs):
+        super().__init__(**kwargs)
+        self.max_threads = max_threads
+        self._threads = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, thread_id: str) -> list:
+        with self._lock:
+            entry = self._threads.get(thread_id)
+            if entry is None:
+                return []
+            messages, updated_at = entry
+            if time.time() - updated_at > self.ttl:
+                del self._threads[thread_id]
+                return []
+            self._threads.move_to_end(thread_id)
+            return list(messages)
+
+    def set(self, thread_id: str, messages: list) -> None:
+        messages = self.trim(messages)
+        with self._lock:
+            self._threads[thread_id] = (messages, time.time())
+            self._threads.move_to_end(thread_id)
+            while len(self._threads) > self.max_threads:
+                self._threads.popitem(last=False)
+
+    def delete(self, thread_id: str) -> None:
+        with self._lock:
+            self._threads.pop(thread_id, None)
+
+    def __len__(self) -> int:
+        return len(self._threads)
+
+
+class SQLiteConversationStore(ConversationStore):
+    def __init__(self, path: str = "db/conversations.sqlite", purge_every: int = 500, **kwargs):
+        super().__init__(**kwargs)
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.path = path
+        self.purge_every = purge_every
+        self._writes = 0
+        self._lock = threading.Lock()
+
+        # WAL lets gunicorn workers read while another one writes
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS conversations (
+                thread_id TEXT PRIMARY KEY,
+                messages TEXT NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_updated_at ON conversations(updated_at)")
+        self._conn.commit()
+
+    def get(self, thread_id: str) -> list:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT messages, updated_at FROM conversations WHERE thread_id = ?", (thread_id,)
+            ).fetchone()
+        if row is None or time.time() - row[1] > self.ttl:
+            return []
+        return json.loads(row[0])
+
+    def set(self, thread_id: str, messages: list) -> None:
+        data = json.dumps(self.trim(messages), ensure_ascii=False, default=str)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO conversations (thread_id, messages, updated_at) VALUES (?, ?, ?)",
+                (thread_id, data, time.time())
+            )
+            self._writes += 1
+            if self._writes % self.purge_every == 0:
+                self._conn.execute("DELETE FROM conversations WHERE updated_at < ?", (time.time() - self.ttl,))
+            self._conn.commit()
+
+    def delete(self, thread_id: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM conversations WHERE thread_id = ?", (thread_id,))
+            self._conn.commit()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM conversations").fetchone()[0]
+
+
+def create_conversation_store() -> ConversationStore:
+    """Build the store configured by the CONVERSATION_* / MAX_HISTORY_* environment variables."""
+    limits = {
+        "ttl": float(os.getenv("CONVERSATION_TTL", str(24 * 3600))),
+        "max_turns": int(os.getenv("MAX_HISTORY_TURNS", "20")),
+        "max_tokens": int(os.getenv("MAX_HISTORY_TOKENS", "4000")),
+    }
+    if os.getenv("CONVERSATION_STORE", "memory") == "sqlite":
+        return SQLiteConversationStore(os.getenv("CONVERSATION_DB", "db/conversations.sqlite"), **limits)
+    return InMemoryConversationStore(max_threads=int(os.getenv("MAX_CONVERSATIONS", "10000")), **limits)
@@ -0,0 +1,172 @@
+"""
+Persistent embedding cache shared by ingestion (setup.py) and queries (rag.py).
+
+Vectors are stored as float32 blobs in SQLite, keyed by a hash of the model
+name and the normalized text. Least recently used entries are evicted once
+the cache grows past its entry or size limit.
+
+Reads do not write: the access times of hits are kept in memory and written
+in one transaction every ACCESS_FLUSH_SIZE hits (or with the next put), and
+the size limits are checked once every EVICT_INTERVAL stored vectors, so
+eviction order and limits are approximate.
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+from text_utils import normalize_text
+
+ACCESS_FLUSH_SIZE = 256
+EVICT_INTERVAL = 1000
+
+
+def cache_key(model: str, text: str) -> str:
+    # Case is kept, the embedding of a text depends on it
+    return hashlib.sha256(f"{model}\n{normalize_text(text, lower=False)}".encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    def __init__(self, path: str, max_entries: int = 100_000, max_bytes: int = 256 * 1024 * 1024):
+        """
+        Open (or create) the cache database
+
+        Args:
+            path: SQLite file path
+            max_entries: Evict least recently used entries above this count
+            max_bytes: Evict least recently used entries above this total vector size
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        # Access times not written yet, and vectors stored since the last size check
+        self._accessed = {}
+        self._since_evict = EVICT_INTERVAL
+
+        # WAL lets several worker processes read while one writes
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS embeddings (
+                key TEXT PRIMARY KEY,
+                model TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                last_access REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_last_access ON embeddings(last_access)")
+        self._conn.commit()
+
+    def get_many(self, model: str, texts: list[str]) -> list:
+        """Return cached vectors for `texts`, with None for every miss."""
+        keys = [cache_key(model, text) for text in texts]
+        found = {}
+
+        with self._lock:
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", chunk
+                ).fetchall()
+                found.update(rows)
+
+            now = time.time()
+            self._accessed.update((key, now) for key in found)
+            if len(self._accessed) >= ACCESS_FLUSH_SIZE:
+                self._flush_access()
+                self._conn.commit()
+
+            results = [
+                np.frombuffer(found[key], dtype=np.float32) if key in found else None
+                for key in keys
+            ]
+            hits = sum(1 for r in results if r is not None)
+            self.hits += hits
+            self.misses += len(keys) - hits
+
+        return results
+
+    def get(self, model: str, text: str):
+        return self.get_many(model, [text])[0]
+
+    def put_many(self, model: str, texts: list[str], vectors: list) -> None:
+        now = time.time()
+        rows = [
+            (cache_key(model, text), model, np.asarray(vector, dtype=np.float32).tobytes(), now)
+            for text, vector in zip(texts, vectors)
+        ]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, model, vector, last_access) VALUES (?, ?, ?, ?)",
+                rows
+            )
+            self._flush_access()
+            self._since_evict += len(rows)
+            if self._since_evict >= min(EVICT_INTERVAL, max(1, self.max_entries // 10)):
+                self._evict()
+                self._since_evict = 0
+            self._conn.commit()
+
+    def put(self, model: str, text: str, vector) -> None:
+        self.put_many(model, [text], [vector])
+
+    def _flush_access(self) -> None:
+        if self._accessed:
+            self._conn.executemany(
+                "UPDATE embeddings SET last_access = ? WHERE key = ?",
+                [(accessed, key) for key, accessed in self._accessed.items()]
+            )
+            self._accessed.clear()
+
+    def _evict(self) -> None:
+        count, total_bytes = self._conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings"
+        ).fetchone()
+        if count <= self.max_entries and total_bytes <= self.max_bytes:
+            return
+
+        # Drop the oldest entries down to 90% of the tighter limit
+        avg_bytes = total_bytes / count
+        keep = int(min(self.max_entries, self.max_bytes / avg_bytes) * 0.9)
+        self._conn.execute(
+            "DELETE FROM embeddings WHERE key IN "
+            "(SELECT key FROM embeddings ORDER BY last_access ASC LIMIT ?)",
+            (count - keep,)
+        )
+
+    def stats(self) -> dict:
+        with self._lock:
+            count, total_bytes = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings"
+            ).fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": count,
+            "bytes": total_bytes,
+        }
+
+    def clear(self) -> None:
+        with self._lock:
+            self._accessed.clear()
+            self._conn.execute("DELETE FROM embeddings")
+            self._conn.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            self._flush_access()
+            self._conn.commit()
+            self._conn.close()
@@ -0,0 +1,241 @@
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from dotenv import load_dotenv
+from openai import OpenAI, APIConnectionError, APITimeoutError, InternalServerError, RateLimitError
+
+import metrics
+from embedding_cache import EmbeddingCache
+from resources import resources
+from local_embeddings import LocalEmbeddingClient, RecordedEmbeddingClient
+
+load_dotenv()
+
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "text-embedding-3-small")
+
+# Shorter vectors for text-embedding-3 models (e.g. 256/512/1024), unset for
+# the full size. "api" passes `dimensions` to the API, "truncate" requests the
+# full vector and keeps the leading dimensions, re-normalized (both give the
+# same vectors for these models, truncation reuses cached full-size ones).
+# setup.py records the value in the collection metadata and rag.py embeds
+# queries to match.
+EMBEDDING_DIMENSIONS = int(os.getenv("EMBEDDING_DIMENSIONS") or 0) or None
+EMBEDDING_DIMENSIONS_MODE = os.getenv("EMBEDDING_DIMENSIONS_MODE", "api")
+
+# Batching limits for embeddings.create
+# (the API accepts up to 2048 inputs and ~300k tokens per request)
+EMBED_BATCH_TOKENS = int(os.getenv("EMBED_BATCH_TOKENS", "50000"))
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "512"))
+EMBED_CONCURRENCY = int(os.getenv("EMBED_CONCURRENCY", "4"))
+EMBED_MAX_RETRIES = int(os.getenv("EMBED_MAX_RETRIES", "5"))
+
+# OPENAI_BASE_URL is honoured by the client, so the same code runs against
+# fake_openai_server.py for local testing. EMBEDDING_BACKEND=local computes
+# deterministic stand-in vectors in process, EMBEDDING_BACKEND=recorded replays
+# real ones saved in the EMBEDDING_RECORDED_PATH cache file (both offline).
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "openai")
+
+
+def _embedding_source() -> str:
+    """Where the vectors come from: "openai", "local" or the base URL of another server."""
+    if EMBEDDING_BACKEND == "local":
+        return "local"
+    base_url = (os.getenv("OPENAI_BASE_URL") or "").rstrip("/")
+    if EMBEDDING_BACKEND == "openai" and base_url and base_url != "https://api.openai.com/v1":
+        return base_url
+    # Recorded vectors are real OpenAI ones
+    return "openai"
+
+
+# Part of the cache namespace and the collection metadata, so vectors of a
+# fake server or the local backend never mix with real ones
+EMBEDDING_SOURCE = _embedding_source()
+
+
+def _create_embedding_client():
+    if EMBEDDING_BACKEND == "local":
+        return LocalEmbeddingClient()
+    if EMBEDDING_BACKEND == "recorded":
+        return RecordedEmbeddingClient(EmbeddingCache(os.getenv("EMBEDDING_RECORDED_PATH", "db/embedding_cache.sqlite")))
+    return OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+
+
+# One client (and HTTP connection pool) for every embedding request of the process
+resources.register("embedding_client", _create_embedding_client,
+                   close=lambda client: getattr(client, "close", lambda: None)())
+
+
+def embedding_client():
+    return resources.get("embedding_client")
+
+# Embedding requests sent and texts embedded by this process
+embedding_stats = {"requests": 0, "texts": 0}
+_stats_lock = threading.Lock()
+
+# Set EMBEDDING_CACHE=0 to always call the API
+if os.getenv("EMBEDDING_CACHE", "1") != "0":
+    embedding_cache = EmbeddingCache(
+        os.getenv("EMBEDDING_CACHE_PATH", "db/embedding_cache.sqlite"),
+        max_entries=int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "100000")),
+        max_bytes=int(os.getenv("EMBEDDING_CACHE_MAX_MB", "256")) * 1024 * 1024
+    )
+else:
+    embedding_cache = None
+
+RETRYABLE_ERRORS = (RateLimitError, APIConnectionError, APITimeoutError, InternalServerError)
+
+try:
+    import tiktoken
+    _encoding = tiktoken.get_encoding("cl100k_base")
+except Exception:
+    _encoding = None
+
+
+def count_tokens(text: str) -> int:
+    """Count tokens with tiktoken, or estimate them when it is not available."""
+    if _encoding is not None:
+        return len(_encoding.encode(text, disallowed_special=()))
+    return len(text) // 3 + 1
+
+
+def _count_request(texts: int) -> None:
+    with _stats_lock:
+        embedding_stats["requests"] += 1
+        embedding_stats["texts"] += texts
+
+
+def truncate_embedding(embedding, dimensions: int = None) -> list[float]:
+    """Keep the first `dimensions` values and re-normalize to unit length."""
+    if not dimensions or len(embedding) <= dimensions:
+        return list(embedding)
+    vector = np.asarray(embedding[:dimensions], dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return (vector / norm if norm else vector).tolist()
+
+
+def _request_options(dimensions: int = None) -> tuple[str, dict]:
+    """Cache namespace and extra embeddings.create arguments for `dimensions`."""
+    # Real OpenAI vectors keep the bare model name (also what the recorded backend looks up)
+    namespace = EMBEDDING_MODEL if EMBEDDING_SOURCE == "openai" else f"{EMBEDDING_SOURCE}|{EMBEDDING_MODEL}"
+    if dimensions and EMBEDDING_DIMENSIONS_MODE == "api":
+        return f"{namespace}@{dimensions}", {"dimensions": dimensions}
+    # Truncation shares the cached full-size vectors
+    return namespace, {}
+
+
+def embedding_space(dimensions: int = EMBEDDING_DIMENSIONS) -> dict:
+    """Collection metadata describing the vectors produced with these settings."""
+    return {"embedding_model": EMBEDDING_MODEL, "embedding_dimensions": dimensions or 0,
+            "embedding_source": EMBEDDING_SOURCE}
+
+
+def get_embedding(text: str, dimensions: int = EMBEDDING_DIMENSIONS) -> list[float]:
+    """Generates an embedding for a single text using OpenAI, served from the cache when possible."""
+    cache_model, options = _request_options(dimensions)
+    if embedding_cache is not None:
+        cached = embedding_cache.get(cache_model, text)
+        if cached is not None:
+            return truncate_embedding(cached.tolist(), dimensions)
+
+    _count_request(1)
+    with metrics.span("embedding", kind="query"):
+        response = embedding_client().embeddings.create(
+            input=text,
+            model=EMBEDDING_MODEL,
+            **options
+        )
+    embedding = response.data[0].embedding
+
+    if embedding_cache is not None:
+        embedding_cache.put(cache_model, text, embedding)
+    return truncate_embedding(embedding, dimensions)
+
+
+def make_batches(texts: list[str], max_tokens: int = EMBED_BATCH_TOKENS,
+                 max_size: int = EMBED_BATCH_SIZE) -> list[list[int]]:
+    """
+    Group text indices into batches that fit the per-request token budget.
+
+    A text larger than the budget on its own still gets a batch of its own,
+    the API is left to reject it if it exceeds the model limit.
+    """
+    batches = []
+    current, current_tokens = [], 0
+
+    for i, text in enumerate(texts):
+        tokens = count_tokens(text)
+        if current and (current_tokens + tokens > max_tokens or len(current) >= max_size):
+            batches.append(current)
+            current, current_tokens = [], 0
+        current.append(i)
+        current_tokens += tokens
+
+    if current:
+        batches.append(current)
+    return batches
+
+
+def _embed_batch(batch: list[str], max_retries: int, options: dict = None) -> list[list[float]]:
+    """Embed one batch, retrying transient errors with exponential backoff."""
+    client = embedding_client().with_options(max_retries=0)
+
+    for attempt in range(max_retries + 1):
+        try:
+            _count_request(len(batch))
+            with metrics.span("embedding", kind="batch"):
+                response = client.embeddings.create(input=batch, model=EMBEDDING_MODEL, **(options or {}))
+            data = sorted(response.data, key=lambda d: d.index)
+            return [d.embedding for d in data]
+        except RETRYABLE_ERRORS as e:
+            if attempt == max_retries:
+                raise
+            delay = min(30.0, 0.5 * 2 ** attempt) * (0.5 + random.random())
+            print(f"Embedding batch of {len(batch)} failed ({type(e).__name__}), retrying in {delay:.1f}s")
+            time.sleep(delay)
+
+
+def embed_texts(texts: list[str], max_tokens: int = EMBED_BATCH_TOKENS,
+                max_size: int = EMBED_BATCH_SIZE, concurrency: int = EMBED_CONCURRENCY,
+                max_retries: int = EMBED_MAX_RETRIES, dimensions: int = EMBEDDING_DIMENSIONS) -> list[list[float]]:
+    """
+    Embed many texts with as few requests as possible.
+
+    Cached texts are skipped, the rest are packed into token-budgeted batches
+    with at most `concurrency` batches in flight at once. Embeddings are
+    returned in input order.
+    """
+    texts = list(texts)
+    embeddings = [None] * len(texts)
+    cache_model, options = _request_options(dimensions)
+
+    if embedding_cache is not None:
+        for i, cached in enumerate(embedding_cache.get_many(cache_model, texts)):
+            if cached is not None:
+                embeddings[i] = cached.tolist()
+
+    missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+    if not missing:
+        return [truncate_embedding(embedding, dimensions) for embedding in embeddings]
+
+    batches = [
+        [missing[j] for j in batch]
+        for batch in make_batches([texts[i] for i in missing], max_tokens=max_tokens, max_size=max_size)
+    ]
+
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+        futures = [
+            (batch, executor.submit(_embed_batch, [texts[i] for i in batch], max_retries, options))
+            for batch in batches
+        ]
+        for batch, future in futures:
+            batch_embeddings = future.result()
+            for i, embedding in zip(batch, batch_embeddings):
+                embeddings[i] = embedding
+            if embedding_cache is not None:
+                embedding_cache.put_many(cache_model, [texts[i] for i in batch], batch_embeddings)
+
+    return [truncate_embedding(embedding, dimensions) for embedding in embeddings]
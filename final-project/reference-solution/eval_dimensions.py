@@ -0,0 +1,82 @@
+"""
+Latency, memory and recall of shorter embedding dimensions.
+
+Embeds the indexed product documents and the labeled questions at each
+dimension, searches them exactly with NumPy and compares against the full
+size. The Chroma collection is only read (for the documents), not changed.
+Run after setup.py, from the directory holding the db folder:
+    python eval_dimensions.py --dims 256 512 1024 1536 --mode api
+"""
+import argparse
+import json
+import os
+import time
+
+import chromadb
+import numpy as np
+
+import embeddings
+from embeddings import EMBEDDING_MODEL, embed_texts, embedding_client, truncate_embedding
+from vector_index import NumpyVectorIndex
+
+
+def query_latency(texts: list[str], dimensions: int, mode: str) -> list[float]:
+    """Uncached round trip of one query embedding."""
+    options = {"dimensions": dimensions} if mode == "api" else {}
+    latencies = []
+    for text in texts:
+        start = time.perf_counter()
+        response = embedding_client().embeddings.create(input=text, model=EMBEDDING_MODEL, **options)
+        if mode == "truncate":
+            truncate_embedding(response.data[0].embedding, dimensions)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def main():
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    parser = argparse.ArgumentParser(description="Embedding dimension trade-offs")
+    parser.add_argument("--dims", type=int, nargs="+", default=[256, 512, 1024, 1536])
+    parser.add_argument("--mode", choices=["api", "truncate"], default="api")
+    parser.add_argument("--labeled", default=os.path.join(base_dir, "eval_queries.json"))
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--latency-samples", type=int, default=20)
+    args = parser.parse_args()
+
+    embeddings.EMBEDDING_DIMENSIONS_MODE = args.mode
+    collection = chromadb.PersistentClient("db").get_collection("products")
+    data = collection.get(include=["metadatas"])
+    documents = [metadata["information"] for metadata in data["metadatas"]]
+    with open(args.labeled, encoding="utf-8") as f:
+        labeled = json.load(f)
+    questions = [item["query"] for item in labeled]
+
+    results = {}
+    for dims in args.dims:
+        index = NumpyVectorIndex(data["ids"], np.asarray(embed_texts(documents, dimensions=dims), dtype=np.float32))
+        query_vectors = np.asarray(embed_texts(questions, dimensions=dims), dtype=np.float32)
+
+        start = time.perf_counter()
+        found = index.query(query_vectors, n_results=args.k)["ids"]
+        search_ms = (time.perf_counter() - start) * 1000 / len(questions)
+        latencies = query_latency(questions[:args.latency_samples], dims, args.mode)
+        results[dims] = {
+            "found": found,
+            "bytes": index.vectors.shape[1] * 4,
+            "recall": np.mean([any(id_ in item["relevant"] for id_ in ids) for ids, item in zip(found, labeled)]),
+            "embed_p50": np.percentile(latencies, 50) * 1000,
+            "search_ms": search_ms,
+        }
+
+    reference = results[max(args.dims)]["found"]
+    print(f"{len(documents)} products, {len(questions)} labeled queries, mode={args.mode}, k={args.k}")
+    print(f"{'dims':>6}{'B/item':>9}{'catalog KiB':>13}{'recall@k':>10}{'overlap':>9}{'embed p50 ms':>14}{'search ms':>11}")
+    for dims, row in results.items():
+        overlap = np.mean([len(set(a) & set(b)) / max(len(b), 1) for a, b in zip(row["found"], reference)])
+        print(f"{dims:>6}{row['bytes']:>9}{row['bytes'] * len(documents) / 1024:>13.0f}{row['recall']:>10.3f}"
+              f"{overlap:>9.3f}{row['embed_p50']:>14.2f}{row['search_ms']:>11.3f}")
+    print(f"overlap: share of the top {args.k} also found at {max(args.dims)} dims")
+
+
+if __name__ == "__main__":
+    main()
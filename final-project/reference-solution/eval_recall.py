@@ -0,0 +1,41 @@
+"""
+Compare recall@k of dense, keyword (BM25) and hybrid product retrieval.
+
+Run after setup.py, from the directory holding the db folder:
+    python eval_recall.py --k 1 3 5
+"""
+import argparse
+import json
+import os
+
+from rag import retrieve_products
+
+MODES = ["dense", "keyword", "hybrid"]
+
+
+def recall_at_k(queries: list[dict], mode: str, k: int) -> float:
+    hits = 0
+    for item in queries:
+        ids, _ = retrieve_products(item["query"], n_results=k, mode=mode)
+        hits += any(id_ in item["relevant"] for id_ in ids)
+    return hits / len(queries)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recall@k of the product retrieval modes")
+    parser.add_argument("--queries", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "eval_queries.json"))
+    parser.add_argument("--k", type=int, nargs="+", default=[1, 3, 5])
+    args = parser.parse_args()
+
+    with open(args.queries, encoding="utf-8") as f:
+        queries = json.load(f)
+
+    print(f"{len(queries)} labeled queries")
+    print(f"{'mode':<10}" + "".join(f"{f'recall@{k}':>12}" for k in args.k))
+    for mode in MODES:
+        row = "".join(f"{recall_at_k(queries, mode, k):>12.3f}" for k in args.k)
+        print(f"{mode:<10}{row}")
+
+
+if __name__ == "__main__":
+    main()
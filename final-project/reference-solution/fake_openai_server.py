@@ -0,0 +1,247 @@
+"""
+Local stand-in for the OpenAI embeddings and chat completions APIs.
+
+Embeddings are deterministic hashed n-gram vectors, so similar texts still
+get similar embeddings and retrieval can be exercised offline. Chat
+completions follow a fixed script that mimics our agents: hand off from the
+manager, call the specialist's tool once, then answer from its output. Their
+usage reports cached prompt tokens like OpenAI's prompt cache would: the
+longest run of leading messages (with the same tools) seen before, counted
+from 1024 tokens on in steps of 128.
+
+Usage:
+    python fake_openai_server.py --port 8001 --latency 0.05 --fail-rate 0.1
+    python fake_openai_server.py --port 8002 --chat-latency 0.3 --stall-rate 0.05 --stall-latency 30
+    OPENAI_BASE_URL=http://localhost:8001/v1 OPENAI_API_KEY=fake python setup.py
+    OPENAI_BASE_URL=http://localhost:8001/v1 OPENAI_API_KEY=fake AGENTS_API=chat_completions \
+        hypercorn asgi_serve:app --bind 0.0.0.0:5001
+"""
+import argparse
+import base64
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+
+from flask import Flask, Response, request, jsonify
+
+from local_embeddings import local_embedding
+
+app = Flask(__name__)
+
+config = {"latency": 0.0, "fail_rate": 0.0, "chat_latency": 0.0, "token_latency": 0.0,
+          "stall_rate": 0.0, "stall_latency": 0.0}
+stats = {"requests": 0, "inputs": 0, "failures": 0, "chat_requests": 0, "prompt_tokens": 0, "cached_tokens": 0}
+stats_lock = threading.Lock()
+
+# Hashes of the prompt prefixes seen so far
+prefix_cache = set()
+PREFIX_CACHE_LIMIT = 100_000
+
+SHOP_KEYWORDS = ("địa chỉ", "mở cửa", "giờ", "cửa hàng", "liên hệ", "chính sách", "bảo hành")
+
+
+@app.route("/v1/embeddings", methods=["POST"])
+def embeddings():
+    data = request.json
+    inputs = data.get("input", [])
+    if isinstance(inputs, str):
+        inputs = [inputs]
+    dimensions = int(data.get("dimensions") or 1536)
+
+    with stats_lock:
+        stats["requests"] += 1
+        stats["inputs"] += len(inputs)
+
+    if config["latency"]:
+        time.sleep(config["latency"])
+
+    if random.random() < config["fail_rate"]:
+        with stats_lock:
+            stats["failures"] += 1
+        return jsonify({"error": {"message": "Injected failure", "type": "rate_limit_error"}}), 429
+
+    items = []
+    for i, text in enumerate(inputs):
+        vector = local_embedding(text, dimensions)
+        if data.get("encoding_format") == "base64":
+            embedding = base64.b64encode(vector.astype("<f4").tobytes()).decode("ascii")
+        else:
+            embedding = vector.tolist()
+        items.append({"object": "embedding", "index": i, "embedding": embedding})
+
+    tokens = sum(len(text) // 3 + 1 for text in inputs)
+    return jsonify({
+        "object": "list",
+        "data": items,
+        "model": data.get("model", "text-embedding-3-small"),
+        "usage": {"prompt_tokens": tokens, "total_tokens": tokens}
+    })
+
+
+def _message_text(message: dict) -> str:
+    content = message.get("content") or ""
+    if isinstance(content, list):
+        content = " ".join(part.get("text", "") for part in content if isinstance(part, dict))
+    return content
+
+
+def scripted_reply(messages: list, tools: list) -> dict:
+    """Decide the next assistant message the way our agents would behave."""
+    tool_names = {}
+    for message in messages:
+        for call in message.get("tool_calls") or []:
+            tool_names[call["id"]] = call["function"]["name"]
+
+    last = messages[-1] if messages else {}
+    user_text = next((_message_text(m) for m in reversed(messages) if m.get("role") == "user"), "")
+    functions = [t["function"] for t in tools or [] if t.get("type") == "function"]
+
+    # A specialist tool already answered: reply from its output
+    if last.get("role") == "tool" and not tool_names.get(last.get("tool_call_id"), "").startswith("transfer_to_"):
+        return {"role": "assistant", "content": f"Dựa trên thông tin tìm được: {_message_text(last)[:300]}"}
+
+    handoffs = [f["name"] for f in functions if f["name"].startswith("transfer_to_")]
+    if handoffs:
+        wants_shop = any(keyword in user_text.lower() for keyword in SHOP_KEYWORDS)
+        name = next((h for h in handoffs if ("shop" in h) == wants_shop), handoffs[0])
+        arguments = "{}"
+    elif functions:
+        name = functions[0]["name"]
+        properties = functions[0].get("parameters", {}).get("properties", {})
+        arguments = json.dumps({"query": user_text} if "query" in properties else {}, ensure_ascii=False)
+    else:
+        return {"role": "assistant", "content": f"Trả lời: {user_text}"}
+
+    return {
+        "role": "assistant",
+        "content": None,
+        "tool_calls": [{
+            "id": f"call_{random.getrandbits(48):012x}",
+            "type": "function",
+            "function": {"name": name, "arguments": arguments}
+        }]
+    }
+
+
+def cached_prompt_tokens(messages: list, tools: list) -> int:
+    """Tokens of the longest cached prefix of the prompt, and remember its prefixes."""
+    digest = hashlib.sha256(json.dumps(tools or [], sort_keys=True).encode("utf-8"))
+    tokens = 0
+    prefixes = []
+    for message in messages:
+        digest.update(json.dumps(message, sort_keys=True, ensure_ascii=False).encode("utf-8"))
+        tokens += len(_message_text(message)) // 3 + 1
+        prefixes.append((digest.hexdigest(), tokens))
+
+    with stats_lock:
+        cached = max((tokens for key, tokens in prefixes if key in prefix_cache), default=0)
+        if len(prefix_cache) > PREFIX_CACHE_LIMIT:
+            prefix_cache.clear()
+        prefix_cache.update(key for key, _ in prefixes)
+    return cached // 128 * 128 if cached >= 1024 else 0
+
+
+@app.route("/v1/chat/completions", methods=["POST"])
+def chat_completions():
+    data = request.json
+
+    with stats_lock:
+        stats["chat_requests"] += 1
+
+    if config["chat_latency"]:
+        time.sleep(config["chat_latency"])
+    # A provider having a bad moment: the odd request takes much longer
+    if random.random() < config["stall_rate"]:
+        time.sleep(config["stall_latency"])
+
+    if random.random() < config["fail_rate"]:
+        with stats_lock:
+            stats["failures"] += 1
+        return jsonify({"error": {"message": "Injected failure", "type": "server_error"}}), 500
+
+    message = scripted_reply(data.get("messages", []), data.get("tools"))
+    prompt_tokens = sum(len(_message_text(m)) // 3 + 1 for m in data.get("messages", []))
+    cached_tokens = cached_prompt_tokens(data.get("messages", []), data.get("tools"))
+    completion_tokens = len(message.get("content") or "") // 3 + 1
+    usage = {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+        "prompt_tokens_details": {"cached_tokens": cached_tokens}
+    }
+    with stats_lock:
+        stats["prompt_tokens"] += prompt_tokens
+        stats["cached_tokens"] += cached_tokens
+    finish_reason = "tool_calls" if message.get("tool_calls") else "stop"
+
+    if data.get("stream"):
+        include_usage = (data.get("stream_options") or {}).get("include_usage", False)
+        return Response(stream_chunks(message, finish_reason, usage if include_usage else None, data.get("model", "fake")),
+                        mimetype="text/event-stream")
+
+    return jsonify({
+        "id": f"chatcmpl-{random.getrandbits(48):012x}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": data.get("model", "fake"),
+        "choices": [{
+            "index": 0,
+            "message": message,
+            "finish_reason": finish_reason
+        }],
+        "usage": usage
+    })
+
+
+def stream_chunks(message: dict, finish_reason: str, usage: dict, model: str):
+    """Yield a reply as chat.completion.chunk SSE messages, one word at a time."""
+    base = {"id": f"chatcmpl-{random.getrandbits(48):012x}", "object": "chat.completion.chunk",
+            "created": int(time.time()), "model": model}
+
+    def chunk(delta, finish=None, **extra):
+        body = {**base, "choices": [{"index": 0, "delta": delta, "finish_reason": finish}], **extra}
+        return f"data: {json.dumps(body, ensure_ascii=False)}\n\n"
+
+    if message.get("tool_calls"):
+        calls = [{**call, "index": i} for i, call in enumerate(message["tool_calls"])]
+        yield chunk({"role": "assistant", "tool_calls": calls})
+    else:
+        yield chunk({"role": "assistant", "content": ""})
+        for word in re.findall(r"\S+\s*", message["content"]):
+            if config["token_latency"]:
+                time.sleep(config["token_latency"])
+            yield chunk({"content": word})
+
+    yield chunk({}, finish_reason)
+    if usage:
+        yield f"data: {json.dumps({**base, 'choices': [], 'usage': usage})}\n\n"
+    yield "data: [DONE]\n\n"
+
+
+@app.route("/stats", methods=["GET"])
+def get_stats():
+    with stats_lock:
+        return jsonify(dict(stats))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fake OpenAI API server for local testing")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to every request")
+    parser.add_argument("--chat-latency", type=float, default=0.0, help="Seconds added to every chat completion")
+    parser.add_argument("--token-latency", type=float, default=0.0, help="Seconds between streamed words")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="Fraction of requests answered with an error")
+    parser.add_argument("--stall-rate", type=float, default=0.0, help="Fraction of chat completions delayed by --stall-latency")
+    parser.add_argument("--stall-latency", type=float, default=30.0, help="Seconds a stalled chat completion takes")
+    args = parser.parse_args()
+
+    config["latency"] = args.latency
+    config["chat_latency"] = args.chat_latency
+    config["token_latency"] = args.token_latency
+    config["fail_rate"] = args.fail_rate
+    config["stall_rate"] = args.stall_rate
+    config["stall_latency"] = args.stall_latency
+    app.run(host="0.0.0.0", port=args.port, threaded=True)
@@ -0,0 +1,106 @@
+"""
+Incremental indexing of documents into a Chroma collection.
+
+Each document is stored under a stable id with a hash of its text and
+metadata. A sync only embeds and upserts documents whose hash changed and
+deletes ids that are no longer present in the source.
+"""
+import hashlib
+import json
+
+from embeddings import embed_texts
+
+# Stay below Chroma's maximum batch size for upsert/delete
+WRITE_BATCH_SIZE = 1000
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _chunks(items: list, size: int):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def open_collection(client, name: str, space: dict):
+    """
+    Get or create collection `name` for vectors described by `space`
+
+    `space` (see embeddings.embedding_space) is stored as collection metadata.
+    A collection built with another model, dimension or embedding source is
+    dropped and recreated, so the next sync re-embeds every document.
+    """
+    collection = client.get_or_create_collection(name=name, metadata=space)
+    # Collections from before the source was recorded hold real OpenAI vectors
+    metadata = {"embedding_source": "openai", **(collection.metadata or {})}
+    current = {key: metadata.get(key) for key in space}
+    if current != space:
+        print(f"Collection '{name}' was built for {current}, rebuilding for {space}")
+        client.delete_collection(name=name)
+        collection = client.create_collection(name=name, metadata=space)
+    return collection
+
+
+def sync_collection(collection, ids: list[str], documents: list[str],
+                    metadatas: list[dict] = None, text_key: str = "information") -> dict:
+    """
+    Bring `collection` in line with the given documents
+
+    Args:
+        collection: Chroma collection to update
+        ids: Stable primary keys, one per document
+        documents: Text to embed for each id
+        metadatas: Extra metadata per document (optional)
+        text_key: Metadata field the document text is stored under
+
+    Returns:
+        Counts of added, updated, unchanged and deleted documents
+    """
+    if len(set(ids)) != len(ids):
+        raise ValueError("Document ids must be unique")
+    if metadatas is None:
+        metadatas = [{} for _ in ids]
+
+    existing = collection.get(include=["metadatas"])
+    existing_hashes = {
+        id_: (metadata or {}).get("content_hash")
+        for id_, metadata in zip(existing["ids"], existing["metadatas"])
+    }
+
+    changed = []
+    added = updated = 0
+    for i, (id_, text) in enumerate(zip(ids, documents)):
+        # Metadata is hashed too, so new or re-parsed fields get written
+        digest = content_hash(text + json.dumps(metadatas[i], sort_keys=True, ensure_ascii=False))
+        if existing_hashes.get(id_) == digest:
+            continue
+        if id_ in existing_hashes:
+            updated += 1
+        else:
+            added += 1
+        changed.append((i, digest))
+
+    if changed:
+        embeddings = embed_texts([documents[i] for i, _ in changed])
+        rows = [
+            (ids[i], embedding, {**metadatas[i], text_key: documents[i], "content_hash": digest})
+            for (i, digest), embedding in zip(changed, embeddings)
+        ]
+        for chunk in _chunks(rows, WRITE_BATCH_SIZE):
+            collection.upsert(
+                ids=[row[0] for row in chunk],
+                embeddings=[row[1] for row in chunk],
+                metadatas=[row[2] for row in chunk]
+            )
+
+    removed = sorted(set(existing_hashes) - set(ids))
+    for chunk in _chunks(removed, WRITE_BATCH_SIZE):
+        collection.delete(ids=chunk)
+
+    return {
+        "added": added,
+        "updated": updated,
+        "unchanged": len(ids) - len(changed),
+        "deleted": len(removed),
+    }
@@ -0,0 +1,157 @@
+"""
+Handoff input filters that trim what a specialist agent receives.
+
+Without a filter a specialist gets the whole pre-handoff history: every
+earlier turn, tool calls and their large outputs, previous transfer_to_*
+calls and whatever the manager said before handing off. Each filter below
+takes and returns a HandoffInputData, chain() combines them and
+create_input_filter() builds the chain configured by the HANDOFF_*
+environment variables:
+
+    HANDOFF_FILTER=0            pass everything through
+    HANDOFF_KEEP_TURNS=3        user turns kept from the history (0 keeps all)
+    HANDOFF_REMOVE_TOOLS=1      drop tool calls and outputs of earlier turns
+    HANDOFF_REMOVE_HANDOFFS=1   drop earlier handoffs and the manager's own messages
+    HANDOFF_MAX_TOKENS=2000     token budget for the history (0 for none)
+"""
+import dataclasses
+import json
+import os
+from typing import Callable
+
+from agents.handoffs import HandoffInputData
+from agents.items import ToolCallItem, ToolCallOutputItem
+
+from conversation_store import trim_history
+from embeddings import count_tokens
+
+InputFilter = Callable[[HandoffInputData], HandoffInputData]
+
+TOOL_ITEM_TYPES = ("function_call", "function_call_output", "file_search_call", "web_search_call",
+                   "computer_call", "computer_call_output", "reasoning")
+
+
+def _replace(data: HandoffInputData, **changes) -> HandoffInputData:
+    return dataclasses.replace(data, **changes)
+
+
+def item_tokens(item) -> int:
+    if hasattr(item, "to_input_item"):
+        item = item.to_input_item()
+    content = item.get("content") if isinstance(item, dict) else None
+    if not isinstance(content, str):
+        content = json.dumps(item, ensure_ascii=False, default=str)
+    return count_tokens(content) + 4
+
+
+def input_tokens(data: HandoffInputData) -> int:
+    """Tokens the specialist receives from the history and the run items."""
+    history = data.input_history
+    if isinstance(history, str):
+        total = count_tokens(history)
+    else:
+        total = sum(item_tokens(item) for item in history)
+    return total + sum(item_tokens(item) for item in data.pre_handoff_items + data.new_items)
+
+
+def keep_last_user_turns(k: int) -> InputFilter:
+    """Keep the last `k` user turns of the history (and the rolling summary)."""
+    def apply(data: HandoffInputData) -> HandoffInputData:
+        if isinstance(data.input_history, str):
+            return data
+        return _replace(data, input_history=tuple(trim_history(list(data.input_history), max_turns=k)))
+    return apply
+
+
+def remove_tool_items(data: HandoffInputData) -> HandoffInputData:
+    """Drop tool calls and outputs from the history and from the items before the handoff."""
+    history = data.input_history
+    if not isinstance(history, str):
+        history = tuple(item for item in history if not (isinstance(item, dict) and item.get("type") in TOOL_ITEM_TYPES))
+    pre_handoff_items = tuple(
+        item for item in data.pre_handoff_items if not isinstance(item, (ToolCallItem, ToolCallOutputItem))
+    )
+    return _replace(data, input_history=history, pre_handoff_items=pre_handoff_items)
+
+
+def remove_handoff_messages(data: HandoffInputData) -> HandoffInputData:
+    """
+    Drop earlier transfer_to_* calls and everything the handing-off agent did this turn
+
+    The handoff being made (in new_items) is kept so the specialist sees
+    where it came from.
+    """
+    history = data.input_history
+    if not isinstance(history, str):
+        handoff_calls = {
+            item.get("call_id") for item in history
+            if isinstance(item, dict) and item.get("type") == "function_call"
+            and str(item.get("name", "")).startswith("transfer_to_")
+        }
+        history = tuple(
+            item for item in history
+            if not (isinstance(item, dict) and item.get("type") in ("function_call", "function_call_output")
+                    and item.get("call_id") in handoff_calls)
+        )
+    return _replace(data, input_history=history, pre_handoff_items=())
+
+
+def cap_tokens(max_tokens: int) -> InputFilter:
+    """
+    Drop the oldest turns of the history until the input fits `max_tokens`
+
+    The history is only cut where a user turn starts, so a tool call and its
+    output are kept or dropped together. The rolling summary at the front
+    and the last user turn always stay.
+    """
+    def apply(data: HandoffInputData) -> HandoffInputData:
+        if isinstance(data.input_history, str):
+            return data
+        history = list(data.input_history)
+        head = 0
+        while head < len(history) and isinstance(history[head], dict) and history[head].get("role") == "system":
+            head += 1
+        starts = [i for i, item in enumerate(history)
+                  if i >= head and isinstance(item, dict) and item.get("role") == "user"]
+        if not starts:
+            return data
+
+        budget = max_tokens - sum(item_tokens(item) for item in data.pre_handoff_items + data.new_items)
+        tokens = [item_tokens(item) for item in history]
+        budget -= sum(tokens[:head])
+        for start in [head] + starts:
+            if sum(tokens[start:]) <= budget:
+                break
+        return _replace(data, input_history=tuple(history[:head] + history[start:]))
+    return apply
+
+
+def chain(*filters: InputFilter) -> InputFilter:
+    def apply(data: HandoffInputData) -> HandoffInputData:
+        for input_filter in filters:
+            data = input_filter(data)
+        return data
+    return apply
+
+
+def pass_through(data: HandoffInputData) -> HandoffInputData:
+    return data
+
+
+def create_input_filter() -> InputFilter:
+    """Build the filter chain configured by the HANDOFF_* environment variables."""
+    if os.getenv("HANDOFF_FILTER", "1") == "0":
+        return pass_through
+
+    filters = []
+    if os.getenv("HANDOFF_REMOVE_HANDOFFS", "1") != "0":
+        filters.append(remove_handoff_messages)
+    if os.getenv("HANDOFF_REMOVE_TOOLS", "1") != "0":
+        filters.append(remove_tool_items)
+    keep_turns = int(os.getenv("HANDOFF_KEEP_TURNS", "3"))
+    if keep_turns > 0:
+        filters.append(keep_last_user_turns(keep_turns))
+    max_tokens = int(os.getenv("HANDOFF_MAX_TOKENS", "2000"))
+    if max_tokens > 0:
+        filters.append(cap_tokens(max_tokens))
+    return chain(*filters)
@@ -0,0 +1,212 @@
+"""
+Concurrent shopper load test for the /chat API.
+
+Each shopper thread plays multi-turn conversations from SCRIPTS through its
+own ChatAPIClient (one thread_id per conversation, think time between
+turns) until the run's duration is over. Concurrency levels are run one
+after the other. For each level the report shows throughput, error rate and
+latency percentiles of every stage of a turn. It also shows the highest
+level that stayed within the latency and error targets, i.e. how many
+concurrent shoppers one server process handles.
+
+Run the server against fake_openai_server.py so model latency is controlled:
+
+    python fake_openai_server.py --port 8001 --chat-latency 0.5 --token-latency 0.02
+    OPENAI_BASE_URL=http://localhost:8001/v1 OPENAI_API_KEY=fake AGENTS_API=chat_completions \\
+        OPENAI_AGENTS_DISABLE_TRACING=1 hypercorn asgi_serve:app --bind 0.0.0.0:5001
+    python load_test.py --concurrency 10 50 100 200 --duration 60 --mock-url http://localhost:8001
+
+Questions are filled in with random products (from --catalog when given),
+budgets and battery sizes, so turns rarely hit the server's answer and
+search caches; --fixed-queries sends the same five conversations to measure
+the cached path instead.
+
+serve.py and oss_serve.py (with OSS_BASE_URL=http://localhost:8001/v1) are
+driven the same way. Stages of a streamed turn (--no-stream only times the
+whole turn):
+    first_event  first SSE event received
+    agent        first agent switch (manager or routed specialist)
+    tool_call    first tool call
+    first_token  first answer text
+    total        "done" event
+"""
+import argparse
+import csv
+import random
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import requests
+
+from api_call import ChatAPIClient
+
+# Conversation templates, {product} and {other} are distinct products
+SCRIPTS = [
+    ["{product} có những màu nào?", "Giá bao nhiêu?", "Cửa hàng mở cửa lúc mấy giờ?"],
+    ["Tôi muốn mua điện thoại dưới {budget} triệu", "Có máy nào pin {battery}mAh không?", "Địa chỉ cửa hàng ở đâu?"],
+    ["{product} giá bao nhiêu?", "Có ưu đãi gì khi mua trả góp không?"],
+    ["{product} dùng hệ điều hành gì?", "Chính sách bảo hành thế nào?"],
+    ["{product} có những màu nào?", "So với {other} thì sao?", "Cửa hàng có giao hàng không?"],
+]
+
+PRODUCTS = [
+    "Samsung Galaxy A05s", "Samsung Galaxy A15", "Samsung Galaxy S24 Ultra", "iPhone 15 Pro 512GB",
+    "iPhone 13 128GB", "Nokia 3210 4G", "Nokia 8210 4G", "Xiaomi Redmi Note 13 8GB/128GB", "Xiaomi Redmi 13C",
+    "OPPO A58", "OPPO Reno11 F", "vivo Y17s", "realme C67", "Tecno Spark 20", "Infinix Hot 40i", "Honor X7b",
+]
+
+
+def load_catalog_products(path: str) -> list[str]:
+    """Product names of the catalog CSV ("nokia 3210 4g - chính hãng" -> "nokia 3210 4g")."""
+    with open(path, encoding="utf-8", newline="") as f:
+        titles = {row["title"].split(" - ")[0].strip() for row in csv.DictReader(f) if row.get("title")}
+    return sorted(titles)
+
+
+def fill_script(script: list[str], rng: random.Random, products: list[str]) -> list[str]:
+    product, other = rng.sample(products, 2)
+    values = {"product": product, "other": other, "budget": rng.randint(2, 30),
+              "battery": rng.choice([4000, 4500, 5000, 5500, 6000])}
+    return [message.format(**values) for message in script]
+
+
+STAGES = ["first_event", "agent", "tool_call", "first_token", "total"]
+
+
+def run_turn(client: ChatAPIClient, message: str, thread_id: str, stream: bool) -> dict:
+    """Send one message and return whether it succeeded and when each stage was reached."""
+    start = time.perf_counter()
+    if not stream:
+        result = client.send_message(message, thread_id)
+        return {"ok": result["success"], "error": result.get("error"),
+                "stages": {"total": time.perf_counter() - start}}
+
+    stages = {}
+    stage_of_event = {"agent": "agent", "tool_call": "tool_call", "delta": "first_token", "done": "total"}
+    for event in client.stream_message(message, thread_id):
+        elapsed = time.perf_counter() - start
+        stages.setdefault("first_event", elapsed)
+        if event["type"] == "error":
+            return {"ok": False, "error": event["error"], "stages": stages}
+        if event["type"] in stage_of_event:
+            stages.setdefault(stage_of_event[event["type"]], elapsed)
+    if "total" not in stages:
+        return {"ok": False, "error": "Stream ended without a done event", "stages": stages}
+    return {"ok": True, "error": None, "stages": stages}
+
+
+def shopper(base_url: str, deadline: float, think_time: float, stream: bool, seed: int,
+            products: list[str], fixed_queries: bool = False) -> list[dict]:
+    """Play conversations until `deadline`, returning one record per turn."""
+    rng = random.Random(seed)
+    client = ChatAPIClient(base_url)
+    turns = []
+    while time.perf_counter() < deadline:
+        thread_id = str(uuid.uuid4())
+        script = rng.choice(SCRIPTS)
+        # The same products and numbers for every conversation of a template with fixed_queries
+        for message in fill_script(script, random.Random(0) if fixed_queries else rng, products):
+            if time.perf_counter() >= deadline:
+                break
+            turns.append(run_turn(client, message, thread_id, stream))
+            if think_time:
+                time.sleep(rng.uniform(0.5, 1.5) * think_time)
+    return turns
+
+
+def mock_stats(mock_url: str) -> dict:
+    if not mock_url:
+        return {}
+    try:
+        return requests.get(f"{mock_url.rstrip('/')}/stats", timeout=5).json()
+    except requests.exceptions.RequestException:
+        return {}
+
+
+def run_level(args, concurrency: int) -> dict:
+    stats_before = mock_stats(args.mock_url)
+    start = time.perf_counter()
+    deadline = start + args.duration
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = [
+            executor.submit(shopper, args.url, deadline, args.think_time, not args.no_stream, concurrency * 1000 + i,
+                            args.products, args.fixed_queries)
+            for i in range(concurrency)
+        ]
+        turns = [turn for future in futures for turn in future.result()]
+    elapsed = time.perf_counter() - start
+    stats_after = mock_stats(args.mock_url)
+
+    ok = [turn for turn in turns if turn["ok"]]
+    errors = {}
+    for turn in turns:
+        if not turn["ok"]:
+            errors[turn["error"]] = errors.get(turn["error"], 0) + 1
+
+    stages = {}
+    for stage in STAGES:
+        values = [turn["stages"][stage] for turn in ok if stage in turn["stages"]]
+        if values:
+            stages[stage] = dict(zip(["p50", "p95", "p99"], np.percentile(values, [50, 95, 99])))
+
+    return {
+        "concurrency": concurrency,
+        "turns": len(turns),
+        "throughput": len(ok) / elapsed,
+        "error_rate": (len(turns) - len(ok)) / len(turns) if turns else 1.0,
+        "errors": errors,
+        "stages": stages,
+        "model_calls": (stats_after.get("chat_requests", 0) - stats_before.get("chat_requests", 0)) / max(len(turns), 1)
+                       if stats_after else None,
+        # Share of the prompt tokens served from the (simulated) prompt cache
+        "cached_ratio": (stats_after.get("cached_tokens", 0) - stats_before.get("cached_tokens", 0))
+                        / max(stats_after.get("prompt_tokens", 0) - stats_before.get("prompt_tokens", 0), 1)
+                        if stats_after else None,
+    }
+
+
+def print_level(result: dict) -> None:
+    print(f"\n== {result['concurrency']} shoppers: {result['turns']} turns, "
+          f"{result['throughput']:.1f} turns/s, {result['error_rate']:.1%} errors")
+    if result["model_calls"] is not None:
+        print(f"model calls per turn: {result['model_calls']:.2f}, "
+              f"cached prompt tokens: {result['cached_ratio']:.0%}")
+    print(f"{'stage':<12}{'p50 s':>9}{'p95 s':>9}{'p99 s':>9}")
+    for stage, row in result["stages"].items():
+        print(f"{stage:<12}{row['p50']:>9.3f}{row['p95']:>9.3f}{row['p99']:>9.3f}")
+    for error, count in sorted(result["errors"].items(), key=lambda item: -item[1])[:3]:
+        print(f"  {count} x {error[:100]}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the /chat API with concurrent shoppers")
+    parser.add_argument("--url", default="http://localhost:5001", help="Base URL of the chat server")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[10, 50, 100])
+    parser.add_argument("--duration", type=float, default=30, help="Seconds per concurrency level")
+    parser.add_argument("--think-time", type=float, default=1.0, help="Mean seconds a shopper waits between turns")
+    parser.add_argument("--no-stream", action="store_true", help="Use /chat instead of /chat/stream")
+    parser.add_argument("--slo", type=float, default=5.0, help="Target p95 seconds for a whole turn")
+    parser.add_argument("--max-error-rate", type=float, default=0.01)
+    parser.add_argument("--mock-url", help="fake_openai_server.py URL, to count model calls and cached prompt tokens per turn")
+    parser.add_argument("--catalog", help="Catalog CSV to draw the products of the questions from")
+    parser.add_argument("--fixed-queries", action="store_true",
+                        help="Fill every template with the same values, so the server's caches answer")
+    args = parser.parse_args()
+    args.products = load_catalog_products(args.catalog) if args.catalog else PRODUCTS
+
+    capacity = 0
+    for concurrency in args.concurrency:
+        result = run_level(args, concurrency)
+        print_level(result)
+        p95 = result["stages"].get("total", {}).get("p95", float("inf"))
+        if result["error_rate"] <= args.max_error_rate and p95 <= args.slo:
+            capacity = max(capacity, concurrency)
+
+    print(f"\nCapacity: {capacity} concurrent shoppers within p95 <= {args.slo:.1f}s "
+          f"and <= {args.max_error_rate:.1%} errors")
+
+
+if __name__ == "__main__":
+    main()
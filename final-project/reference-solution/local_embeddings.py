@@ -0,0 +1,78 @@
+"""
+Offline stand-ins for the OpenAI embeddings endpoint.
+
+LocalEmbeddingClient computes deterministic hashed n-gram vectors in
+process, so similar texts still get similar embeddings without network
+access or an API key. RecordedEmbeddingClient replays real embeddings
+previously stored in an EmbeddingCache file and fails on anything that was
+never recorded.
+
+Both expose the small part of the OpenAI client used by embeddings.py:
+client.with_options(...).embeddings.create(input=..., model=..., dimensions=...).
+"""
+import re
+import unicodedata
+import zlib
+from types import SimpleNamespace
+
+import numpy as np
+
+
+def local_embedding(text: str, dimensions: int = 1536) -> np.ndarray:
+    """Hash word and character trigram features of `text` into a unit vector."""
+    text = unicodedata.normalize("NFD", text.lower())
+    text = "".join(c for c in text if unicodedata.category(c) != "Mn").replace("đ", "d")
+    words = re.findall(r"\w+", text)
+
+    vector = np.zeros(dimensions, dtype=np.float32)
+    features = words + [w[i:i + 3] for w in words for i in range(max(1, len(w) - 2))]
+    for feature in features:
+        h = zlib.crc32(feature.encode("utf-8"))
+        vector[h % dimensions] += 1.0 if (h >> 16) & 1 else -1.0
+
+    norm = np.linalg.norm(vector)
+    if norm == 0:
+        vector[0] = 1.0
+        return vector
+    return vector / norm
+
+
+def _response(vectors: list) -> SimpleNamespace:
+    return SimpleNamespace(data=[
+        SimpleNamespace(index=i, embedding=[float(x) for x in vector]) for i, vector in enumerate(vectors)
+    ])
+
+
+class LocalEmbeddingClient:
+    def __init__(self, dimensions: int = 1536):
+        self.dimensions = dimensions
+        self.embeddings = self
+
+    def with_options(self, **kwargs) -> "LocalEmbeddingClient":
+        return self
+
+    def create(self, input, model: str = None, dimensions: int = None, **kwargs) -> SimpleNamespace:
+        texts = [input] if isinstance(input, str) else list(input)
+        return _response([local_embedding(text, dimensions or self.dimensions) for text in texts])
+
+
+class RecordedEmbeddingClient:
+    def __init__(self, cache):
+        """
+        Args:
+            cache: EmbeddingCache holding the recorded vectors
+        """
+        self.cache = cache
+        self.embeddings = self
+
+    def with_options(self, **kwargs) -> "RecordedEmbeddingClient":
+        return self
+
+    def create(self, input, model: str = None, dimensions: int = None, **kwargs) -> SimpleNamespace:
+        texts = [input] if isinstance(input, str) else list(input)
+        cache_model = f"{model}@{dimensions}" if dimensions else model
+        vectors = self.cache.get_many(cache_model, texts)
+        missing = [text for text, vector in zip(texts, vectors) if vector is None]
+        if missing:
+            raise KeyError(f"{len(missing)} texts have no recorded embedding, e.g. {missing[0][:60]!r}")
+        return _response(vectors)
@@ -0,0 +1,133 @@
+"""
+Per-stage latency histograms exposed in the Prometheus text format.
+
+Code wraps the stages of a turn in spans, e.g.
+
+    with metrics.span("vector_search", backend="chroma"):
+        collection.query(...)
+
+and every span is added to the chat_stage_seconds histogram with its
+labels. increment() adds to a counter, e.g. answer cache hits. serve.py,
+oss_serve.py and asgi_serve.py serve both on /metrics. Stages recorded:
+turn, route, model_call, model_first_event, handoff, tool, embedding, vector_search,
+keyword_search and sheets_fetch.
+
+Set METRICS_ENABLED=1 to turn it on. When it is off, span() returns one
+shared no-op context manager and observe() and increment() return at once,
+so the instrumented code does no extra work. Values are kept per process.
+"""
+import bisect
+import contextlib
+import os
+import threading
+import time
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "0") == "1"
+
+# Upper bounds in seconds, from a cache hit to a slow model call
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_NO_SPAN = contextlib.nullcontext()
+
+
+class Histogram:
+    def __init__(self, buckets: tuple = BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Registry:
+    def __init__(self, name: str = "chat_stage_seconds"):
+        self.name = name
+        self._histograms = {}
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def observe(self, stage: str, seconds: float, **labels) -> None:
+        key = (stage, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(seconds)
+
+    def increment(self, name: str, value: float = 1.0, **labels) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0.0) + value
+
+    def render(self) -> str:
+        """Histograms and counters in the Prometheus text exposition format."""
+        lines = [
+            f"# HELP {self.name} Time spent in each stage of a chat turn",
+            f"# TYPE {self.name} histogram",
+        ]
+        with self._lock:
+            items = sorted(self._histograms.items())
+            for (stage, labels), histogram in items:
+                label_text = ",".join(f'{k}="{_escape(v)}"' for k, v in (("stage", stage),) + labels)
+                cumulative = 0
+                for bound, count in zip(histogram.buckets + (float("inf"),), histogram.counts):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append(f'{self.name}_bucket{{{label_text},le="{le}"}} {cumulative}')
+                lines.append(f"{self.name}_sum{{{label_text}}} {histogram.sum}")
+                lines.append(f"{self.name}_count{{{label_text}}} {histogram.count}")
+
+            counters = sorted(self._counters.items())
+        typed = set()
+        for (name, labels), value in counters:
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# TYPE {name} counter")
+            label_text = ",".join(f'{k}="{_escape(v)}"' for k, v in labels)
+            lines.append(f"{name}{{{label_text}}} {value}" if label_text else f"{name} {value}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+registry = Registry()
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def observe(stage: str, seconds: float, **labels) -> None:
+    """Record a duration measured by the caller."""
+    if METRICS_ENABLED:
+        registry.observe(stage, seconds, **labels)
+
+
+@contextlib.contextmanager
+def _timed_span(stage: str, labels: dict):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        registry.observe(stage, time.perf_counter() - start, **labels)
+
+
+def span(stage: str, **labels):
+    """Context manager timing the enclosed block as `stage` (a no-op when disabled)."""
+    if not METRICS_ENABLED:
+        return _NO_SPAN
+    return _timed_span(stage, labels)
+
+
+def increment(name: str, value: float = 1.0, **labels) -> None:
+    """Add `value` to counter `name` (a Prometheus counter, so end it in _total)."""
+    if METRICS_ENABLED:
+        registry.increment(name, value, **labels)
+
+
+def render() -> str:
+    return registry.render()
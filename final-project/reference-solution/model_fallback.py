@@ -0,0 +1,233 @@
+"""
+Deadlines, ordered fallbacks and hedged requests across model providers.
+
+oss_serve.py runs every agent on a LiteLLM model of a single provider, so
+when that provider stalls the turn hangs until the client gives up.
+FallbackModel wraps an ordered list of models, preferably from different
+providers, and is used like any other agents Model:
+
+- every attempt has a deadline; after it expires or the call fails, the next
+  model is tried
+- with hedging, when the current attempt has not answered within the p95
+  latency of that model, the next model is started as well and the first
+  answer wins, the other call is cancelled (counted in model_hedges_total)
+
+Streamed calls count until the first event instead of the whole response,
+and the deadline also applies between events. Once the first event has been
+passed on, a stream can no longer switch to another model.
+
+TimedModel records the latency of every model call (model_call, and
+model_first_event for streams) whatever the model. TimedModelProvider wraps
+the models the Runner looks up by name, the agents in serve.py; Model
+instances such as the FallbackModels of oss_serve.py are wrapped by
+create_fallback_model().
+
+    MODEL_FALLBACK=1        0 to use only the first model (the deadline still applies)
+    MODEL_DEADLINE=20       seconds per attempt
+    MODEL_HEDGING=0         1 to hedge
+    MODEL_HEDGE_DELAY=3     hedge delay until MIN_SAMPLES latencies are known
+"""
+import asyncio
+import os
+import time
+from collections import deque
+
+from agents.models.interface import Model, ModelProvider
+from agents.models.multi_provider import MultiProvider
+
+import metrics
+
+MODEL_FALLBACK = os.getenv("MODEL_FALLBACK", "1") != "0"
+MODEL_DEADLINE = float(os.getenv("MODEL_DEADLINE", "20"))
+MODEL_HEDGING = os.getenv("MODEL_HEDGING", "0") == "1"
+MODEL_HEDGE_DELAY = float(os.getenv("MODEL_HEDGE_DELAY", "3"))
+
+
+class LatencyTracker:
+    """Recent latencies of one model and their p95, the hedge delay."""
+
+    MIN_SAMPLES = 20
+
+    def __init__(self, default: float, window: int = 200, quantile: float = 0.95):
+        self.default = default
+        self.quantile = quantile
+        self._samples = deque(maxlen=window)
+
+    def observe(self, seconds: float) -> None:
+        self._samples.append(seconds)
+
+    def percentile(self) -> float:
+        if len(self._samples) < self.MIN_SAMPLES:
+            return self.default
+        samples = sorted(self._samples)
+        return samples[int(self.quantile * (len(samples) - 1))]
+
+
+class FallbackModel(Model):
+    def __init__(self, models: list, deadline: float = MODEL_DEADLINE, hedging: bool = MODEL_HEDGING,
+                 hedge_delay: float = MODEL_HEDGE_DELAY, names: list[str] = None):
+        """
+        Args:
+            models: Models to try, in order
+            deadline: Seconds an attempt may take (streaming: until the first event and between events)
+            hedging: Start the next model when an attempt is slower than its p95
+            hedge_delay: Hedge delay used until enough latencies are known
+            names: Labels of the models in logs and metrics (default: their model names)
+        """
+        self.models = list(models)
+        self.deadline = deadline
+        self.hedging = hedging
+        self.names = names or [str(getattr(model, "model", type(model).__name__)) for model in self.models]
+        # Whole responses and time to the first streamed event are tracked apart
+        self.latency = {streamed: [LatencyTracker(hedge_delay) for _ in self.models] for streamed in (False, True)}
+
+    async def _attempt(self, index: int, call, streamed: bool):
+        start = time.perf_counter()
+        outcome = "error"
+        try:
+            result = await call()
+            outcome = "ok"
+            self.latency[streamed][index].observe(time.perf_counter() - start)
+            return result
+        except asyncio.CancelledError:
+            outcome = "cancelled"
+            raise
+        except asyncio.TimeoutError:
+            outcome = "timeout"
+            raise TimeoutError(f"{self.names[index]} did not answer within {self.deadline:g}s") from None
+        finally:
+            metrics.observe("model_attempt", time.perf_counter() - start, model=self.names[index], outcome=outcome)
+
+    async def _race(self, open_attempt, streamed: bool):
+        """
+        Run open_attempt(index) for the models in order until one succeeds
+
+        Returns:
+            The result of the first successful attempt
+        """
+        loop = asyncio.get_running_loop()
+        tasks = {}
+        errors = []
+        next_index = 0
+        hedge_at = None
+
+        def start():
+            nonlocal next_index, hedge_at
+            index = next_index
+            next_index += 1
+            tasks[asyncio.create_task(self._attempt(index, lambda: open_attempt(index), streamed))] = index
+            hedge_at = loop.time() + self.latency[streamed][index].percentile()
+
+        start()
+        try:
+            while tasks:
+                can_hedge = self.hedging and next_index < len(self.models)
+                timeout = max(0.0, hedge_at - loop.time()) if can_hedge else None
+                done, _ = await asyncio.wait(tasks, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    metrics.increment("model_hedges_total", model=self.names[next_index])
+                    start()
+                    continue
+
+                results = []
+                for task in sorted(done, key=tasks.get):
+                    index = tasks.pop(task)
+                    if task.exception() is None:
+                        results.append(task.result())
+                    else:
+                        errors.append(task.exception())
+                        print(f"[models] {self.names[index]} failed: {task.exception()}")
+                if results:
+                    # Attempts finishing together: keep the first model's answer, close the other streams
+                    await self._discard(results[1:], streamed)
+                    return results[0]
+
+                if not tasks and next_index < len(self.models):
+                    metrics.increment("model_fallbacks_total", model=self.names[next_index])
+                    start()
+            raise errors[-1]
+        finally:
+            for task in tasks:
+                task.cancel()
+            # Let the cancelled attempts close their streams; one may have succeeded meanwhile
+            outcomes = await asyncio.gather(*tasks, return_exceptions=True)
+            await self._discard([outcome for outcome in outcomes if not isinstance(outcome, BaseException)], streamed)
+
+    @staticmethod
+    async def _discard(results: list, streamed: bool) -> None:
+        """Close the streams of successful attempts that lost the race."""
+        if streamed:
+            for stream, _ in results:
+                await stream.aclose()
+
+    async def get_response(self, *args, **kwargs):
+        async def open_attempt(index):
+            return await asyncio.wait_for(self.models[index].get_response(*args, **kwargs), self.deadline)
+        return await self._race(open_attempt, streamed=False)
+
+    async def stream_response(self, *args, **kwargs):
+        async def open_attempt(index):
+            stream = self.models[index].stream_response(*args, **kwargs)
+            try:
+                return stream, await asyncio.wait_for(stream.__anext__(), self.deadline)
+            except StopAsyncIteration:
+                await stream.aclose()
+                raise RuntimeError(f"{self.names[index]} returned an empty stream") from None
+            except BaseException:
+                await stream.aclose()
+                raise
+
+        stream, event = await self._race(open_attempt, streamed=True)
+        try:
+            while True:
+                yield event
+                try:
+                    event = await asyncio.wait_for(stream.__anext__(), self.deadline)
+                except StopAsyncIteration:
+                    return
+        finally:
+            await stream.aclose()
+
+
+class TimedModel(Model):
+    def __init__(self, model: Model, name: str):
+        self.model = model
+        self.name = name
+
+    async def get_response(self, *args, **kwargs):
+        with metrics.span("model_call", model=self.name):
+            return await self.model.get_response(*args, **kwargs)
+
+    async def stream_response(self, *args, **kwargs):
+        start = time.perf_counter()
+        first = True
+        async for event in self.model.stream_response(*args, **kwargs):
+            if first:
+                metrics.observe("model_first_event", time.perf_counter() - start, model=self.name)
+                first = False
+            yield event
+        metrics.observe("model_call", time.perf_counter() - start, model=self.name)
+
+
+class TimedModelProvider(ModelProvider):
+    """Looks models up like the Runner's default provider and times them."""
+
+    def __init__(self, provider: ModelProvider = None):
+        self.provider = provider
+
+    def get_model(self, model_name: str = None) -> Model:
+        # Built on first use: the OpenAI provider reads the default API (set_default_openai_api) when created
+        if self.provider is None:
+            self.provider = MultiProvider()
+        return TimedModel(self.provider.get_model(model_name), model_name or "default")
+
+
+def create_fallback_model(models: list, names: list[str] = None) -> Model:
+    """
+    FallbackModel over `models` configured by the MODEL_* environment
+    variables, timed with METRICS_ENABLED
+    """
+    if not MODEL_FALLBACK:
+        models, names = models[:1], names[:1] if names else None
+    model = FallbackModel(models, names=names)
+    return TimedModel(model, model.names[0]) if metrics.METRICS_ENABLED else model
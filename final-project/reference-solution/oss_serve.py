@@ -1,30 +1,36 @@
+import atexit
 import os
 from dotenv import load_dotenv
 load_dotenv()
 
 
-from agents import Agent, Runner, handoff, trace, ModelSettings
+from agents import Agent, handoff, ModelSettings
 from agents.extensions.models.litellm_model import LitellmModel
-from agents.handoffs import HandoffInputData
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
-import asyncio
 
 from prompt import MANAGER_INSTRUCTION, PRODUCT_INSTRUCTION, SHOP_INFORMATION_INSTRUCTION
-from rag import rag, shop_information_rag
+from rag import rag, rag_batch, shop_information_rag, start_shop_info_refresh
+from chat_service import run_chat_turn, run_sync, stream_chat_turn, iterate_sync, sse_event
+import metrics
+from resources import resources
+from input_filters import create_input_filter
+from model_fallback import create_fallback_model
 
 
 
 app = Flask(__name__)
 CORS(app)
 
-def custom_input_filter(input_data: HandoffInputData) -> HandoffInputData:
-        # modified_data = HandoffInputData(
-        #     input_history=input_data.input_history,  # Keep history as it is
-        #     pre_handoff_items=(),
-        #     new_items=()
-        # )
-    return input_data
+# Release pooled clients when the process exits
+atexit.register(resources.close)
+
+# Keep the shop information current without waiting for a request to find it stale
+start_shop_info_refresh()
+
+# Trims the history passed to the specialists on handoff (HANDOFF_* settings, see input_filters.py)
+custom_input_filter = create_input_filter()
+
 
 def require_env_key(key_name: str) -> str:
     value = os.getenv(key_name)
@@ -37,27 +43,42 @@ def require_env_key(key_name: str) -> str:
 
 togetherai_key = require_env_key("TOGETHER_API_KEY")
 groq_key = require_env_key("GROQ_API_KEY")
+# Send every model call to one OpenAI-compatible server instead, e.g.
+# fake_openai_server.py for load tests: OSS_BASE_URL=http://localhost:8001/v1
+OSS_BASE_URL = os.getenv("OSS_BASE_URL")
+# Or one per provider, e.g. two fake servers with different latency and failures
+TOGETHER_BASE_URL = os.getenv("TOGETHER_BASE_URL", OSS_BASE_URL)
+GROQ_BASE_URL = os.getenv("GROQ_BASE_URL", OSS_BASE_URL)
 
 # Tạo agents với LiteLLM và Kimi model
 print("Creating agents with LiteLLM...")
 try:
     kimi = LitellmModel(
                 model="together_ai/moonshotai/Kimi-K2-Instruct",
-                api_key=togetherai_key
+                api_key=togetherai_key,
+                base_url=TOGETHER_BASE_URL
             )
     gpt_oss_20b = LitellmModel(
                 model="groq/openai/gpt-oss-20b",
-                api_key=groq_key
+                api_key=groq_key,
+                base_url=GROQ_BASE_URL
             )
     gpt_oss_120b = LitellmModel(
                 model="groq/openai/gpt-oss-120b",
-                api_key=groq_key
+                api_key=groq_key,
+                base_url=GROQ_BASE_URL
             )
+    # Each agent falls back to (or, with MODEL_HEDGING=1, races) a model of the
+    # other provider when its own stalls or fails, see model_fallback.py
+    manager_model = create_fallback_model([kimi, gpt_oss_120b])
+    product_model = create_fallback_model([gpt_oss_120b, kimi])
+    shop_information_model = create_fallback_model([gpt_oss_20b, kimi])
+
     product_agent = Agent(
         name="product",
         instructions=PRODUCT_INSTRUCTION,
-        tools=[rag],
-        model=gpt_oss_120b,
+        tools=[rag, rag_batch],
+        model=product_model,
         model_settings=ModelSettings(tool_choice="required")
     )
 
@@ -65,7 +86,7 @@ try:
         name="shop_information",
         instructions=SHOP_INFORMATION_INSTRUCTION,
         tools=[shop_information_rag],
-        model=gpt_oss_20b,
+        model=shop_information_model,
         model_settings=ModelSettings(tool_choice="required")
     )
 
@@ -73,19 +94,22 @@ try:
         name="manager",
         instructions=MANAGER_INSTRUCTION,
         handoffs=[
-            product_agent,
-            shop_information_agent
+            handoff(product_agent, input_filter=custom_input_filter),
+            handoff(shop_information_agent, input_filter=custom_input_filter)
         ],
-        model=kimi
+        model=manager_model
     )
+    # Agents the local router may start a turn with, skipping the manager
+    specialists = {
+        "product": product_agent,
+        "shop_information": shop_information_agent,
+    }
     print("✓ Agents created successfully with LiteLLM")
 
 except Exception as e:
     print(f"✗ Error creating agents: {e}")
     exit(1)
 
-conversation_history = {}
-
 @app.route("/chat", methods=["POST"])
 def chat():
     data = request.json
@@ -95,19 +119,13 @@ def chat():
     if not query:
         return jsonify({"error": "Missing query parameter"}), 400
     
-    if thread_id not in conversation_history:
-        conversation_history[thread_id] = []
-    
     try:
-        with trace(workflow_name="Conversation", group_id=thread_id):
-            new_input = conversation_history[thread_id] + [{"role": "user", "content": query}]
-            # print(f"đoạn thoại: {new_input}")
-            result = asyncio.run(Runner.run(manager_agent, new_input))
-            conversation_history[thread_id] = new_input + [{"role": "assistant", "content": str(result.final_output)}]
-        
+        # Runs on the shared background event loop (see chat_service.py)
+        content = run_sync(run_chat_turn(manager_agent, thread_id, query, specialists))
+
         return jsonify({
             "role": "assistant",
-            "content": str(result.final_output)
+            "content": content
         })
     
     except Exception as e:
@@ -117,6 +135,37 @@ def chat():
         }), 500
 
 
+@app.route("/chat/stream", methods=["POST"])
+def chat_stream():
+    data = request.json
+    query = data.get("message", "")
+    thread_id = data.get("thread_id", "1")
+
+    if not query:
+        return jsonify({"error": "Missing query parameter"}), 400
+
+    # Server-Sent Events: agent switches, tool calls and answer tokens as they arrive
+    events = iterate_sync(stream_chat_turn(manager_agent, thread_id, query, specialists))
+    return Response(
+        (sse_event(event) for event in events),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache"}
+    )
+
+
+@app.route("/health", methods=["GET"])
+def health():
+    # Checks of the shared clients built so far, see resources.py
+    status = resources.health()
+    healthy = all(not value.startswith("error") for value in status.values())
+    return jsonify(status), 200 if healthy else 503
+
+
+@app.route("/metrics", methods=["GET"])
+def metrics_endpoint():
+    # Stage latency histograms, see metrics.py (empty unless METRICS_ENABLED=1)
+    return Response(metrics.render(), mimetype=metrics.CONTENT_TYPE)
+
 
 if __name__ == "__main__":
     app.run(host="0.0.0.0", port=5001, debug=True)
\ No newline at end of file
@@ -0,0 +1,206 @@
+"""
+Structured product fields for Chroma metadata filtering.
+
+parse_product() turns a catalog row (title, product_specs blob, price,
+colors) into typed metadata fields. parse_query_filters() reads constraints
+such as "dưới 5 triệu" or "8GB RAM" from a question and builds the matching
+Chroma `where` filter.
+"""
+import ast
+import re
+
+from text_utils import fold_diacritics, normalize_text
+
+# Title token -> brand
+BRANDS = {
+    "iphone": "apple", "apple": "apple", "samsung": "samsung", "nokia": "nokia",
+    "xiaomi": "xiaomi", "redmi": "xiaomi", "poco": "xiaomi", "oppo": "oppo", "vivo": "vivo",
+    "realme": "realme", "tecno": "tecno", "infinix": "infinix", "honor": "honor",
+    "nubia": "nubia", "zte": "zte", "tcl": "tcl", "mobell": "mobell", "masstel": "masstel",
+    "itel": "itel", "inoi": "inoi", "oscal": "oscal", "htc": "htc", "nothing": "nothing",
+    "motorola": "motorola", "benco": "benco",
+}
+
+SPEC_KEYS = {
+    "RAM": "ram_gb",
+    "Bộ nhớ trong": "storage_gb",
+    "Kích thước màn hình": "screen_inches",
+    "Vi xử lý": "chipset",
+    "CPU": "chipset",
+    "Dung lượng pin": "battery_mah",
+}
+
+UNIT_GB = {"tb": 1024.0, "gb": 1.0, "g": 1.0, "mb": 1 / 1024}
+
+
+def _is_missing(value) -> bool:
+    return value is None or (isinstance(value, float) and value != value) or str(value).strip() in ("", "nan")
+
+
+def parse_capacity_gb(value: str):
+    """'8GB + 8GB (RAM ảo)' -> 8.0, '1TB' -> 1024.0, '512 MB' -> 0.5"""
+    match = re.search(r"(\d+(?:[.,]\d+)?)\s*(tb|gb|g|mb)\b", value.lower())
+    if not match:
+        return None
+    return round(float(match.group(1).replace(",", ".")) * UNIT_GB[match.group(2)], 3)
+
+
+def parse_screen_inches(value: str):
+    match = re.search(r"(\d+(?:[.,]\d+)?)\s*(?:inch|in\b|’’|''|\")", value.lower())
+    return float(match.group(1).replace(",", ".")) if match else None
+
+
+def parse_battery_mah(value: str):
+    match = re.search(r"(\d+(?:[.,]\d+)?)\s*mah", value.lower())
+    return int(float(match.group(1).replace(",", "."))) if match else None
+
+
+def parse_price_vnd(value: str):
+    """'1,590,000 ₫' -> 1590000; 'Giá: Liên hệ' or a missing price -> None"""
+    if _is_missing(value):
+        return None
+    digits = re.sub(r"[^\d]", "", str(value))
+    return int(digits) if digits else None
+
+
+def parse_specs(product_specs: str) -> dict:
+    """Split the 'Key:\\nValue<br> ...' blob into typed fields."""
+    fields = {}
+    if _is_missing(product_specs):
+        return fields
+
+    for part in str(product_specs).split("<br>"):
+        if ":" not in part:
+            continue
+        key, value = part.split(":", 1)
+        field = SPEC_KEYS.get(key.strip())
+        value = value.strip()
+        if field is None or not value or field in fields:
+            continue
+
+        if field in ("ram_gb", "storage_gb"):
+            parsed = parse_capacity_gb(value)
+        elif field == "screen_inches":
+            parsed = parse_screen_inches(value)
+        elif field == "battery_mah":
+            parsed = parse_battery_mah(value)
+        else:
+            parsed = value[:80]
+        if parsed is not None:
+            fields[field] = parsed
+
+    return fields
+
+
+def parse_brands(text: str) -> list[str]:
+    """Brands named in `text`, in order of first mention."""
+    brands = []
+    for token in re.findall(r"[a-z0-9]+", fold_diacritics(normalize_text(text))):
+        if token in BRANDS and BRANDS[token] not in brands:
+            brands.append(BRANDS[token])
+    return brands
+
+
+def parse_brand(title: str):
+    brands = parse_brands(title)
+    return brands[0] if brands else None
+
+
+def parse_product(title, product_specs, current_price, color_options) -> dict:
+    """
+    Build typed metadata for one catalog row
+
+    Missing values are left out, Chroma metadata cannot hold None.
+    """
+    metadata = parse_specs(product_specs)
+
+    # Titles like "redmi 12 8gb/128gb" fill in RAM/storage missing from the specs
+    if not _is_missing(title):
+        match = re.search(r"(\d+)(?:\s*\+\s*\d+)?\s*(?:gb)?\s*/\s*(\d+)\s*(gb|tb)", str(title).lower())
+        if match:
+            metadata.setdefault("ram_gb", float(match.group(1)))
+            metadata.setdefault("storage_gb", float(match.group(2)) * UNIT_GB[match.group(3)])
+        brand = parse_brand(str(title))
+        if brand:
+            metadata["brand"] = brand
+
+    price = parse_price_vnd(current_price)
+    if price is not None:
+        metadata["price_vnd"] = price
+    metadata["price_contact"] = price is None
+
+    if not _is_missing(color_options):
+        try:
+            metadata["colors"] = ", ".join(ast.literal_eval(str(color_options)))
+        except (ValueError, SyntaxError):
+            pass
+
+    return metadata
+
+
+def _amount_vnd(number: str, unit: str) -> int:
+    value = float(number.replace(",", "."))
+    if unit in ("trieu", "tr", "cu"):
+        return int(value * 1_000_000)
+    if unit in ("k", "nghin", "ngan"):
+        return int(value * 1_000)
+    return int(value)
+
+
+AMOUNT = r"(\d+(?:[.,]\d+)?)\s*(trieu|tr|cu|k|nghin|ngan)\b"
+
+
+def parse_query_filters(query: str):
+    """
+    Derive a Chroma `where` filter from constraints stated in the query
+
+    Returns None when the query has no recognizable constraint.
+    """
+    text = fold_diacritics(normalize_text(query))
+    conditions = []
+
+    # Price
+    match = re.search(r"\b(?:tu|trong khoang)\s*(\d+(?:[.,]\d+)?)\s*(?:trieu|tr|cu)?\s*(?:den|toi|-)\s*" + AMOUNT, text)
+    if match:
+        unit = match.group(3)
+        conditions.append({"price_vnd": {"$gte": _amount_vnd(match.group(1), unit)}})
+        conditions.append({"price_vnd": {"$lte": _amount_vnd(match.group(2), unit)}})
+    elif match := re.search(r"(?:\b(?:duoi|nho hon|it hon|khong qua|toi da|re hon)|<)\s*" + AMOUNT, text):
+        conditions.append({"price_vnd": {"$lte": _amount_vnd(match.group(1), match.group(2))}})
+    elif match := re.search(r"(?:\b(?:tren|lon hon|hon|tu)|>)\s*" + AMOUNT, text):
+        conditions.append({"price_vnd": {"$gte": _amount_vnd(match.group(1), match.group(2))}})
+    elif match := re.search(r"\b(?:khoang|tam|chung)\s*" + AMOUNT, text):
+        amount = _amount_vnd(match.group(1), match.group(2))
+        conditions.append({"price_vnd": {"$gte": int(amount * 0.85)}})
+        conditions.append({"price_vnd": {"$lte": int(amount * 1.15)}})
+
+    # RAM / storage
+    ram = storage = None
+    if match := re.search(r"(\d+)\s*(?:gb)?\s*/\s*(\d+)\s*(gb|tb)\b", text):
+        ram = float(match.group(1))
+        storage = float(match.group(2)) * UNIT_GB[match.group(3)]
+    if match := re.search(r"(\d+)\s*gb\s*ram\b|\bram\s*(\d+)\s*(?:gb)?\b", text):
+        ram = float(match.group(1) or match.group(2))
+    if match := re.search(r"(?:bo nho(?: trong)?|rom)\s*(\d+)\s*(gb|tb)\b|(\d+)\s*(gb|tb)\s*(?:bo nho|rom)\b", text):
+        storage = float(match.group(1) or match.group(3)) * UNIT_GB[match.group(2) or match.group(4)]
+    if ram is not None:
+        conditions.append({"ram_gb": {"$eq": ram}})
+    if storage is not None:
+        conditions.append({"storage_gb": {"$eq": storage}})
+
+    # Battery
+    if match := re.search(r"(\d{4,5})\s*mah", text):
+        conditions.append({"battery_mah": {"$gte": int(match.group(1))}})
+
+    # Brand, any of them when the query compares several
+    brands = parse_brands(query)
+    if len(brands) == 1:
+        conditions.append({"brand": {"$eq": brands[0]}})
+    elif brands:
+        conditions.append({"brand": {"$in": brands}})
+
+    if not conditions:
+        return None
+    if len(conditions) == 1:
+        return conditions[0]
+    return {"$and": conditions}
@@ -64,7 +64,8 @@ Your workflow:
 1. ALWAYS call the rag tool first with relevant search terms from the user's query
 2. Use the retrieved information to provide accurate, up-to-date responses
 3. Keep the query content as unchanged as possible
-4. Format your response based on the retrieved information
+4. To compare several products, call rag_batch once with one query per product instead of calling rag for each
+5. Format your response based on the retrieved information
 
 Examples:
 
@@ -84,5 +85,8 @@ Question: Nokia 3210 4G dùng hệ điều hành gì?
 Workflow: First call rag("Nokia 3210 4G hệ điều hành"), then respond
 Answer: Nokia 3210 4G sử dụng hệ điều hành S30+.
 
+Question: So sánh Samsung Galaxy A05s và Nokia 3210 4G
+Workflow: First call rag_batch(["Samsung Galaxy A05s", "Nokia 3210 4G"]), then respond
+
 Remember: ALWAYS search first using the rag tool, then provide the answer based on the retrieved information.
 """.format(RECOMMENDED_PROMPT_PREFIX=RECOMMENDED_PROMPT_PREFIX)
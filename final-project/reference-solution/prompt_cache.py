@@ -0,0 +1,62 @@
+"""
+Provider-side prompt caching: cache routing and cached-token accounting.
+
+OpenAI (and some Groq/Together models) reuse the longest prompt prefix they
+have seen recently, from 1024 tokens on: the cached part is prefilled faster
+and billed at a discount. The prefix is the tool schemas, the instructions
+(the constant strings of prompt.py) and the start of the input, so an
+agent's requests share everything up to the first message that differs.
+
+model_settings() adds a prompt_cache_key per agent so its requests are
+routed to the same cache. record_run() reads the cached tokens from the
+usage the provider returned with each model call of a finished run and
+counts them next to the input tokens (model_input_tokens_total,
+model_cached_tokens_total), the cached ratio per agent is their quotient.
+
+    PROMPT_CACHE_KEY=phone-shop   prefix of the cache keys ("" to send none)
+"""
+import os
+
+from agents import ModelSettings
+
+import metrics
+
+PROMPT_CACHE_KEY = os.getenv("PROMPT_CACHE_KEY", "phone-shop")
+
+
+def model_settings(agent_name: str, **settings) -> ModelSettings:
+    """ModelSettings carrying the agent's prompt_cache_key (OpenAI models only)."""
+    if PROMPT_CACHE_KEY:
+        # In the request body: the key is not a named argument of every openai client version
+        settings["extra_body"] = {"prompt_cache_key": f"{PROMPT_CACHE_KEY}-{agent_name}",
+                                  **(settings.get("extra_body") or {})}
+    return ModelSettings(**settings)
+
+
+def usage_tokens(usage) -> tuple[int, int]:
+    """
+    Input and cached input tokens of a model call
+
+    Reads the Responses API fields (input_tokens_details.cached_tokens) and
+    the Chat Completions ones (prompt_tokens_details.cached_tokens).
+    """
+    if usage is None:
+        return 0, 0
+    input_tokens = getattr(usage, "input_tokens", None) or getattr(usage, "prompt_tokens", 0) or 0
+    details = getattr(usage, "input_tokens_details", None) or getattr(usage, "prompt_tokens_details", None)
+    return input_tokens, getattr(details, "cached_tokens", 0) or 0
+
+
+def record_usage(agent_name: str, usage) -> None:
+    input_tokens, cached_tokens = usage_tokens(usage)
+    metrics.increment("model_input_tokens_total", input_tokens, agent=agent_name)
+    metrics.increment("model_cached_tokens_total", cached_tokens, agent=agent_name)
+
+
+def record_run(result) -> None:
+    """Count the usage of every model call of a finished (or fully streamed) run."""
+    # The run items keep the output objects of the responses, and the agent that produced them
+    agents = {id(item.raw_item): item.agent.name for item in getattr(result, "new_items", [])}
+    for response in getattr(result, "raw_responses", []):
+        agent_name = next((agents[id(output)] for output in response.output if id(output) in agents), "unknown")
+        record_usage(agent_name, response.usage)
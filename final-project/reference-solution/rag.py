@@ -1,43 +1,286 @@
 import pandas as pd
-from openai import OpenAI
 from dotenv import load_dotenv
 import requests
 import os
 import numpy as np
 import chromadb
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from agents import Agent, Runner, function_tool
 
-chroma_client = chromadb.PersistentClient("db")
 collection_name='products'
 
 load_dotenv()
-openai_key = os.getenv("OPENAI_API_KEY")
-client = OpenAI(api_key=openai_key)
 
-def get_embedding(text: str) -> list[float]:
-    response = client.embeddings.create(
-        input=text,
-        model="text-embedding-3-small"
-    )
+import metrics
+from bm25 import BM25Index, reciprocal_rank_fusion
+from context_builder import build_context
+from embeddings import EMBEDDING_MODEL, EMBEDDING_SOURCE, embed_texts, get_embedding
+from product_specs import parse_query_filters
+from resources import resources
+from result_cache import ResultCache
+from text_utils import fold_diacritics, normalize_text
+from vector_index import NumpyVectorIndex, QuantizedVectorIndex
 
-    return response.data[0].embedding
+N_RESULTS = int(os.getenv("RAG_N_RESULTS", "3"))
+# hybrid: vector + BM25 fused with reciprocal-rank fusion, or "dense" / "keyword" only
+SEARCH_MODE = os.getenv("SEARCH_MODE", "hybrid")
+# Written by setup.py at ingestion time
+BM25_INDEX_PATH = os.getenv("BM25_INDEX_PATH", "db/bm25_products")
+# "chroma", "numpy" for exact search over the in-memory copy written by setup.py,
+# or "quantized" for int8/binary codes re-ranked with the float vectors
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "chroma")
+VECTOR_INDEX_PATH = os.getenv("VECTOR_INDEX_PATH", "db/vectors_products")
+QUANTIZED_INDEX_PATH = os.getenv("QUANTIZED_INDEX_PATH", "db/vectors_products_q")
+# Turn constraints such as "dưới 5 triệu" or "8GB RAM" into metadata filters
+QUERY_FILTERS = os.getenv("QUERY_FILTERS", "1") != "0"
+# Searches run at once by rag_batch
+RAG_BATCH_CONCURRENCY = int(os.getenv("RAG_BATCH_CONCURRENCY", "8"))
+CHROMA_PATH = os.getenv("CHROMA_PATH", "db")
+# "compact": only the fields of each product relevant to the query, within
+# RAG_CONTEXT_TOKENS (see context_builder.py); "full": each product's whole text
+RAG_CONTEXT_FORMAT = os.getenv("RAG_CONTEXT_FORMAT", "compact")
+RAG_CONTEXT_TOKENS = int(os.getenv("RAG_CONTEXT_TOKENS", "500"))
+from shop_info import GoogleSheetProvider, ShopInfoIndex, ShopInfoSnapshot
 
-@function_tool
-def rag(query: str) -> str:
+# Clients reused by every tool call instead of being set up per call (see resources.py)
+resources.register("chroma", lambda: chromadb.PersistentClient(CHROMA_PATH),
+                   check=lambda client: client.heartbeat())
+resources.register("search_pool", lambda: ThreadPoolExecutor(max_workers=RAG_BATCH_CONCURRENCY),
+                   close=lambda pool: pool.shutdown(wait=False))
+
+sheet_provider = GoogleSheetProvider(
+    sheet_url=os.getenv("SHOP_SHEET_URL", "https://docs.google.com/spreadsheets/d/1mOkgLyo1oedOG1nlvoSHpqK9-fTFzE9ysLuKob9TXlg"),
+    credentials_file=os.getenv("GOOGLE_CREDENTIALS_FILE", "mles-class-12c1216b7303.json"),
+    # Authorize once and keep the worksheet, re-open it after a failed fetch
+    worksheet=lambda: resources.get("sheets"),
+    on_error=lambda: resources.invalidate("sheets")
+)
+resources.register("sheets", sheet_provider.open_worksheet)
+
+# Shop information rarely changes: serve it from a snapshot refreshed in the
+# background, with a local copy for when the sheet is unreachable
+shop_snapshot = ShopInfoSnapshot(
+    sheet_provider,
+    ttl=float(os.getenv("SHOP_INFO_TTL", "3600")),
+    fallback_path=os.getenv("SHOP_INFO_FALLBACK", "db/shop_information.json")
+)
+
+
+def start_shop_info_refresh() -> None:
+    """Refresh the shop information every SHOP_INFO_TTL seconds (SHOP_INFO_AUTO_REFRESH=0 disables it)."""
+    if os.getenv("SHOP_INFO_AUTO_REFRESH", "1") != "0":
+        shop_snapshot.start_auto_refresh()
+
+
+# Only the rows relevant to the question are passed to the agent
+shop_index = ShopInfoIndex(shop_snapshot, embed_texts, top_k=int(os.getenv("SHOP_INFO_TOP_K", "5")))
+
+_keyword_index = {"index": None, "ids": None, "mtime": None}
+
+
+def get_keyword_index():
+    """Return the memory-mapped BM25 index and its product ids, reloading after a re-index."""
+    try:
+        mtime = os.stat(os.path.join(BM25_INDEX_PATH, "meta.json")).st_mtime
+        if mtime != _keyword_index["mtime"]:
+            index, ids = BM25Index.load(BM25_INDEX_PATH)
+            _keyword_index.update(index=index, ids=ids, mtime=mtime)
+    except FileNotFoundError:
+        # Not built yet, or caught between the renames of a re-index: keep the last one
+        pass
+    return _keyword_index["index"], _keyword_index["ids"]
+
+
+_vector_index = {"index": None, "mtime": None}
+
+
+def get_vector_index():
+    """Return the NumPy vector index of VECTOR_BACKEND, reloading after a re-index."""
+    if VECTOR_BACKEND == "quantized":
+        index_class, path = QuantizedVectorIndex, QUANTIZED_INDEX_PATH
+    else:
+        index_class, path = NumpyVectorIndex, VECTOR_INDEX_PATH
+    try:
+        mtime = os.stat(os.path.join(path, "meta.json")).st_mtime
+        if mtime != _vector_index["mtime"]:
+            _vector_index.update(index=index_class.load(path), mtime=mtime)
+    except FileNotFoundError:
+        # Not built yet, or caught between the renames of a re-index: keep the last one
+        pass
+    return _vector_index["index"]
+
+
+def product_index_version() -> tuple:
+    """Changes whenever setup.py re-indexes the products."""
+    mtimes = []
+    for path in (BM25_INDEX_PATH, VECTOR_INDEX_PATH):
+        try:
+            mtimes.append(os.stat(os.path.join(path, "meta.json")).st_mtime)
+        except FileNotFoundError:
+            mtimes.append(None)
+    return tuple(mtimes)
+
+
+def data_version(agent_name: str = None) -> tuple:
+    """
+    Version of the data an agent answers from
+
+    The product agent only reads the product indexes and the shop_information
+    agent only the shop information; any other agent may have used both.
+    """
+    if agent_name == "product":
+        return product_index_version()
+    try:
+        # Loads the snapshot on first use, so the version is not read before the rows exist
+        shop_snapshot.get()
+    except RuntimeError:
+        pass  # Unavailable, shop_information_rag reports it
+    if agent_name == "shop_information":
+        return (shop_snapshot.version,)
+    return (*product_index_version(), shop_snapshot.version)
+
+
+# rag() results by normalized query, so a repeated query skips both the
+# embedding and the search (RAG_CACHE_SIZE=0 disables it)
+RAG_CACHE_SIZE = int(os.getenv("RAG_CACHE_SIZE", "1000"))
+# Also treat queries typed without accents as repeats ("gia" == "giá")
+RAG_CACHE_FOLD_DIACRITICS = os.getenv("RAG_CACHE_FOLD_DIACRITICS", "0") == "1"
+product_results = ResultCache(
+    product_index_version,
+    max_entries=RAG_CACHE_SIZE,
+    ttl=float(os.getenv("RAG_CACHE_TTL", "600"))
+) if RAG_CACHE_SIZE > 0 else None
+
+
+# Collection handle, fetched again after setup.py re-indexes (it may re-create the collection)
+resources.register("products", lambda: resources.get("chroma").get_collection(name=collection_name),
+                   check=lambda collection: collection.count(), version=product_index_version)
+
+
+def query_cache_key(query: str) -> tuple:
+    text = normalize_text(query)
+    if RAG_CACHE_FOLD_DIACRITICS:
+        text = fold_diacritics(text)
+    return text, N_RESULTS, SEARCH_MODE, VECTOR_BACKEND
+
+
+def retrieve_products(query: str, n_results: int = N_RESULTS, mode: str = SEARCH_MODE,
+                      where: dict = None, query_embedding: list = None) -> tuple[list, list]:
+    """
+    Find the products most relevant to `query`
+
+    Args:
+        query: The user question
+        n_results: Number of products to return
+        mode: "hybrid", "dense" or "keyword"
+        where: Chroma metadata filter; derived from the query when not given
+        query_embedding: Embedding of `query` when already computed
+
+    Returns:
+        The product ids and their metadata dicts, best first
+    """
+    if where is None and QUERY_FILTERS:
+        where = parse_query_filters(query)
+        if where:
+            print('----Filters', where)
+
+    ids, metadatas = _retrieve(query, n_results, mode, where, query_embedding)
+    if not ids and where:
+        # Nothing satisfies the filters, answer from the closest products instead
+        ids, metadatas = _retrieve(query, n_results, mode, None, query_embedding)
+    return ids, metadatas
+
+
+def collection_dimensions(collection):
+    """Embedding dimension the collection was indexed with (None for the model's full size)."""
+    space = collection.metadata or {}
+    model = space.get("embedding_model", EMBEDDING_MODEL)
+    source = space.get("embedding_source", "openai")
+    if (model, source) != (EMBEDDING_MODEL, EMBEDDING_SOURCE):
+        raise RuntimeError(f"Collection '{collection.name}' was indexed with {model} from {source}, "
+                           f"not {EMBEDDING_MODEL} from {EMBEDDING_SOURCE}; re-run setup.py")
+    return space.get("embedding_dimensions") or None
+
+
+def _retrieve(query: str, n_results: int, mode: str, where: dict, query_embedding: list = None) -> tuple[list, list]:
+    collection = resources.get("products")
+    keyword_index, keyword_ids = get_keyword_index() if mode != "dense" else (None, None)
+    if keyword_index is None:
+        mode = "dense"
+
+    candidates = n_results if mode == "dense" else n_results * 4
+    rankings = []
+    metadata_by_id = {}
+
+    if mode != "keyword":
+        if query_embedding is None:
+            query_embedding = get_embedding(query, dimensions=collection_dimensions(collection))
+        query_embedding = query_embedding / np.linalg.norm(query_embedding)
+
+        # Perform vector search over the products matching the filters
+        # (the NumPy index answers with the same shape as Chroma)
+        vector_index = get_vector_index() if VECTOR_BACKEND in ("numpy", "quantized") else None
+        searcher = vector_index if vector_index is not None else collection
+        with metrics.span("vector_search", backend=VECTOR_BACKEND if vector_index is not None else "chroma"):
+            search_results = searcher.query(
+                query_embeddings=query_embedding, 
+                n_results=candidates,
+                where=where or None
+            )
+        rankings.append(search_results['ids'][0])
+        metadata_by_id.update(zip(search_results['ids'][0], search_results['metadatas'][0]))
+
+    if mode != "dense":
+        with metrics.span("keyword_search"):
+            keyword_ranking = [keyword_ids[doc_id] for doc_id, _ in keyword_index.search(query, len(keyword_index) if where else candidates)]
+        if where:
+            # The BM25 index has no metadata, keep the keyword hits passing the filters
+            allowed = collection.get(ids=keyword_ranking, where=where, include=["metadatas"]) if keyword_ranking else {"ids": [], "metadatas": []}
+            metadata_by_id.update(zip(allowed['ids'], allowed['metadatas']))
+            allowed_ids = set(allowed['ids'])
+            keyword_ranking = [id_ for id_ in keyword_ranking if id_ in allowed_ids]
+        rankings.append(keyword_ranking[:candidates])
+
+    ids = reciprocal_rank_fusion(rankings)[:n_results] if len(rankings) > 1 else rankings[0][:n_results]
+
+    missing = [id_ for id_ in ids if id_ not in metadata_by_id]
+    if missing:
+        fetched = collection.get(ids=missing, include=["metadatas"])
+        metadata_by_id.update(zip(fetched['ids'], fetched['metadatas']))
+
+    ids = [id_ for id_ in ids if id_ in metadata_by_id]
+    return ids, [metadata_by_id[id_] for id_ in ids]
+
+
+def search_products(query: str) -> str:
 
     print('----Product', query)
 
-    collection = chroma_client.get_collection(name=collection_name)
-    query_embedding = get_embedding(query)
-    query_embedding = query_embedding / np.linalg.norm(query_embedding)
+    key = query_cache_key(query)
+    if product_results is not None:
+        cached = product_results.get(key)
+        metrics.increment("rag_cache_lookups_total", result="miss" if cached is None else "hit")
+        if cached is not None:
+            print('----> (cached)')
+            return cached
+
+    _, metadata_list = retrieve_products(query)
+    search_result = format_products(metadata_list, query)
+
+    print('---->', search_result)
+
+    if product_results is not None:
+        product_results.put(key, search_result)
+    return search_result
+
 
-    # Perform vector search
-    search_results = collection.query(
-        query_embeddings=query_embedding, 
-        n_results=3 
-    )
+def format_products(metadata_list: list, query: str = None) -> str:
+    if RAG_CONTEXT_FORMAT == "compact" and query is not None:
+        documents = [metadata.get('information', '') for metadata in metadata_list if isinstance(metadata, dict)]
+        return build_context(query, documents, RAG_CONTEXT_TOKENS)
 
-    metadatas = search_results.get('metadatas', [])
+    metadatas = [metadata_list]
 
     search_result = ""
     i = 0
@@ -51,35 +294,71 @@ def rag(query: str) -> str:
                     search_result += f"{i}). \n{combined_text}\n\n"
                     i += 1
 
+    return search_result
+
+
+def search_products_batch(queries: list[str]) -> str:
+    """
+    Search several products at once, e.g. for a comparison
+
+    The uncached queries are embedded in one request and searched
+    concurrently. Results are grouped under their query.
+    """
+    queries = [query for query in dict.fromkeys(query.strip() for query in queries) if query]
+    print('----Products', queries)
+
+    results = {}
+    for query in queries:
+        cached = product_results.get(query_cache_key(query)) if product_results is not None else None
+        metrics.increment("rag_cache_lookups_total", result="miss" if cached is None else "hit")
+        if cached is not None:
+            results[query] = cached
+
+    pending = [query for query in queries if query not in results]
+    if pending:
+        if SEARCH_MODE == "keyword":
+            query_embeddings = [None] * len(pending)
+        else:
+            query_embeddings = embed_texts(pending, dimensions=collection_dimensions(resources.get("products")))
+
+        searches = resources.get("search_pool").map(
+            lambda item: format_products(retrieve_products(item[0], query_embedding=item[1])[1], item[0]),
+            zip(pending, query_embeddings)
+        )
+        for query, search_result in zip(pending, searches):
+            results[query] = search_result
+            if product_results is not None:
+                product_results.put(query_cache_key(query), search_result)
+
+    search_result = "".join(f"### {query}\n{results[query]}" for query in queries)
     print('---->', search_result)
-    
     return search_result
 
 
 @function_tool
-def shop_information_rag():
+async def rag(query: str) -> str:
+    # Embedding and Chroma calls block, keep them off the event loop
+    return await asyncio.to_thread(search_products, query)
 
-    print('----Information')
 
-    import gspread
-    from oauth2client.service_account import ServiceAccountCredentials
+@function_tool
+async def rag_batch(queries: list[str]) -> str:
+    """
+    Search several products in one call, e.g. to compare them.
+
+    Args:
+        queries: One search query per product, e.g. ["Samsung Galaxy A05s giá", "Nokia 3210 4G giá"]
+    """
+    return await asyncio.to_thread(search_products_batch, queries)
 
-    # Define the scope
-    scope = ['https://spreadsheets.google.com/feeds',
-            'https://www.googleapis.com/auth/drive']
 
-    # Add credentials to the account
-    credentials = ServiceAccountCredentials.from_json_keyfile_name('mles-class-12c1216b7303.json', scope)
+def search_shop_information(query: str):
 
-    # Authorize the clientsheet
-    client = gspread.authorize(credentials)
+    print('----Information', query)
 
-    # Get the sheet (by name or by URL)
-    # sheet = client.open('Your Sheet Name').sheet1  # For first sheet
-    sheet = client.open_by_url('https://docs.google.com/spreadsheets/d/1mOkgLyo1oedOG1nlvoSHpqK9-fTFzE9ysLuKob9TXlg').sheet1
+    return shop_index.search(query)
 
-    # Example operations
-    # Get all values
-    data = sheet.get_all_records()
-    return data
 
+@function_tool
+async def shop_information_rag(query: str):
+    return await asyncio.to_thread(search_shop_information, query)
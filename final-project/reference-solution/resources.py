@@ -0,0 +1,91 @@
+"""
+Registry of long-lived clients shared by every request of a process.
+
+Each resource (embedding HTTP client, Chroma client and collection handles,
+Google Sheets worksheet) is registered with a factory and built on first
+use, then reused. A resource registered with a `version` callable is
+rebuilt when the version changes, e.g. a collection handle after setup.py
+re-created the collection. invalidate() drops one resource so the next use
+builds a fresh one (after an auth or connection error), health() runs the
+registered checks and close() releases everything on server shutdown.
+"""
+import threading
+from typing import Callable
+
+
+class ResourceRegistry:
+    def __init__(self):
+        self._specs = {}
+        self._instances = {}
+        self._lock = threading.RLock()
+
+    def register(self, name: str, factory: Callable[[], object], check: Callable[[object], object] = None,
+                 close: Callable[[object], None] = None, version: Callable[[], object] = None) -> None:
+        """
+        Declare a resource, replacing (and closing) any previous one of that name
+
+        Args:
+            factory: Builds the resource
+            check: Raises when the resource is unusable (used by health())
+            close: Releases the resource
+            version: The resource is rebuilt when this returns something new
+        """
+        with self._lock:
+            self.invalidate(name)
+            self._specs[name] = {"factory": factory, "check": check, "close": close, "version": version}
+
+    def get(self, name: str):
+        spec = self._specs[name]
+        current = spec["version"]() if spec["version"] else None
+        instance = self._instances.get(name)
+        if instance is not None and instance[1] == current:
+            return instance[0]
+
+        with self._lock:
+            instance = self._instances.get(name)
+            if instance is not None and instance[1] == current:
+                return instance[0]
+            if instance is not None:
+                self._close(name, instance[0])
+            resource = spec["factory"]()
+            self._instances[name] = (resource, current)
+            return resource
+
+    def invalidate(self, name: str) -> None:
+        with self._lock:
+            instance = self._instances.pop(name, None)
+            if instance is not None:
+                self._close(name, instance[0])
+
+    def health(self) -> dict:
+        """Run the check of every resource built so far ("idle" for the others)."""
+        status = {}
+        for name, spec in list(self._specs.items()):
+            if name not in self._instances:
+                status[name] = "idle"
+                continue
+            try:
+                resource = self.get(name)
+                if spec["check"]:
+                    spec["check"](resource)
+                status[name] = "ok"
+            except Exception as e:
+                status[name] = f"error: {e}"
+        return status
+
+    def close(self) -> None:
+        with self._lock:
+            for name in list(self._instances):
+                self.invalidate(name)
+
+    def _close(self, name: str, resource) -> None:
+        close = self._specs.get(name, {}).get("close")
+        if close is None:
+            return
+        try:
+            close(resource)
+        except Exception as e:
+            print(f"Closing {name} failed: {e}")
+
+
+resources = ResourceRegistry()
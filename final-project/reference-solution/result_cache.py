@@ -0,0 +1,64 @@
+"""
+In-process LRU + TTL cache for tool results.
+
+Entries are tied to a data version: when `version()` returns something new
+(e.g. after setup.py re-indexes the products) the cache is emptied before
+the lookup, so results computed from the old index are never served.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Optional
+
+
+class ResultCache:
+    def __init__(self, version: Callable[[], object], max_entries: int = 1000, ttl: float = 600):
+        """
+        Args:
+            version: Returns the current data version
+            max_entries: Least recently used entries are evicted above this count
+            ttl: Seconds a result is served
+        """
+        self.version = version
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._version = None
+        self._lock = threading.Lock()
+
+    def get(self, key) -> Optional[object]:
+        with self._lock:
+            self._check_version()
+            entry = self._entries.get(key)
+            if entry is None or time.time() - entry[0] > self.ttl:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, value) -> None:
+        with self._lock:
+            self._check_version()
+            self._entries[key] = (time.time(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> dict:
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+    def _check_version(self) -> None:
+        current = self.version()
+        if current != self._version:
+            self._entries.clear()
+            self._version = current
@@ -0,0 +1,174 @@
+"""
+Local intent router that can skip the manager agent's LLM hop.
+
+Two tiers, tried in order:
+1. keyword: regexes for obvious Vietnamese cues ("giá", "màu", "địa chỉ", ...)
+2. embedding: nearest centroid over embeddings of example prompts
+
+When neither tier is confident the query goes to the manager as before.
+"""
+import os
+import re
+import threading
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+
+from embeddings import embed_texts, get_embedding
+from text_utils import normalize_text
+
+PRODUCT = "product"
+SHOP_INFORMATION = "shop_information"
+
+KEYWORD_PATTERNS = {
+    PRODUCT: [
+        r"\bgiá\b", r"bao nhiêu tiền", r"\bmàu\b", r"cấu hình", r"thông số", r"\bram\b", r"\brom\b",
+        r"bộ nhớ", r"\bpin\b", r"camera", r"màn hình", r"chip", r"hệ điều hành", r"trả góp",
+        r"khuyến mãi", r"ưu đãi", r"so sánh", r"\d+\s*gb\b",
+        r"iphone", r"samsung", r"galaxy", r"nokia", r"xiaomi", r"redmi", r"oppo", r"vivo",
+        r"realme", r"tecno", r"infinix", r"honor", r"poco", r"mobell", r"nubia", r"zte",
+    ],
+    SHOP_INFORMATION: [
+        r"địa chỉ", r"ở đâu", r"mở cửa", r"đóng cửa", r"giờ làm việc", r"chi nhánh", r"hotline",
+        r"số điện thoại", r"liên hệ", r"chính sách", r"đổi trả", r"bảo hành", r"giao hàng",
+        r"bán những", r"cửa hàng",
+    ],
+}
+
+# Example prompts per route (from prompt.py) for the embedding tier
+ROUTE_EXAMPLES = {
+    PRODUCT: [
+        "Nokia 3210 4G có giá bao nhiêu?",
+        "Samsung Galaxy A05s có những màu nào?",
+        "Samsung Galaxy A05s có những ưu đãi nào khi mua trả góp?",
+        "Nokia 3210 4G dùng hệ điều hành gì?",
+        "Điện thoại này pin bao nhiêu mAh?",
+        "Máy này có mấy GB RAM?",
+        "Có điện thoại nào dưới 5 triệu không?",
+    ],
+    SHOP_INFORMATION: [
+        "Cửa hàng mở cửa lúc mấy giờ?",
+        "Địa chỉ cửa hàng ở đâu?",
+        "Bên bạn bán những điện thoại nào?",
+        "Số điện thoại liên hệ của shop là gì?",
+        "Chính sách bảo hành và đổi trả thế nào?",
+        "Shop có giao hàng tận nơi không?",
+    ],
+}
+
+
+@dataclass
+class RouteDecision:
+    route: Optional[str]  # None means: let the manager decide
+    tier: str
+    confidence: float
+    elapsed: float
+
+
+class IntentRouter:
+    def __init__(self, min_similarity: float = 0.3, min_margin: float = 0.05,
+                 manager_hop_estimate: float = 1.5):
+        """
+        Args:
+            min_similarity: Minimum cosine similarity to the winning centroid
+            min_margin: Minimum similarity gap between the two best routes
+            manager_hop_estimate: Initial guess (seconds) of the manager hop, refined
+                from observed handoffs and used to report latency saved
+        """
+        self.min_similarity = min_similarity
+        self.min_margin = min_margin
+        self.manager_hop_seconds = manager_hop_estimate
+        self.patterns = {
+            route: [re.compile(p) for p in patterns] for route, patterns in KEYWORD_PATTERNS.items()
+        }
+        self._centroids = None
+        self.stats = {"keyword": 0, "embedding": 0, "fallback": 0, "seconds_saved": 0.0}
+        # route() runs in worker threads: guards the centroids, the stats and the hop estimate
+        self._lock = threading.Lock()
+
+    def _keyword_route(self, text: str) -> Optional[str]:
+        matched = [route for route, patterns in self.patterns.items() if any(p.search(text) for p in patterns)]
+        return matched[0] if len(matched) == 1 else None
+
+    def _get_centroids(self):
+        if self._centroids is None:
+            with self._lock:
+                if self._centroids is None:
+                    self._centroids = self._build_centroids()
+        return self._centroids
+
+    @staticmethod
+    def _build_centroids():
+        routes = list(ROUTE_EXAMPLES)
+        texts = [text for route in routes for text in ROUTE_EXAMPLES[route]]
+        vectors = np.asarray(embed_texts(texts), dtype=np.float32)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+
+        centroids, start = [], 0
+        for route in routes:
+            end = start + len(ROUTE_EXAMPLES[route])
+            centroid = vectors[start:end].mean(axis=0)
+            centroids.append(centroid / np.linalg.norm(centroid))
+            start = end
+        return routes, np.stack(centroids)
+
+    def _embedding_route(self, text: str) -> tuple[Optional[str], float]:
+        routes, centroids = self._get_centroids()
+        query = np.asarray(get_embedding(text), dtype=np.float32)
+        similarities = centroids @ (query / np.linalg.norm(query))
+
+        order = np.argsort(similarities)[::-1]
+        best, second = similarities[order[0]], similarities[order[1]]
+        if best >= self.min_similarity and best - second >= self.min_margin:
+            return routes[order[0]], float(best)
+        return None, float(best)
+
+    def route(self, query: str) -> RouteDecision:
+        start = time.perf_counter()
+        text = normalize_text(query)
+
+        route = self._keyword_route(text)
+        if route is not None:
+            return self._decide(route, "keyword", 1.0, start)
+
+        try:
+            route, similarity = self._embedding_route(text)
+        except Exception as e:
+            print(f"[router] embedding tier failed: {e}")
+            route, similarity = None, 0.0
+
+        if route is not None:
+            return self._decide(route, "embedding", similarity, start)
+        return self._decide(None, "fallback", similarity, start)
+
+    def _decide(self, route: Optional[str], tier: str, confidence: float, start: float) -> RouteDecision:
+        decision = RouteDecision(route, tier, confidence, time.perf_counter() - start)
+        saved = max(0.0, self.manager_hop_seconds - decision.elapsed) if route is not None else 0.0
+        with self._lock:
+            self.stats[tier] += 1
+            self.stats["seconds_saved"] += saved
+
+        if route is not None:
+            print(f"[router] -> {route} via {tier} ({confidence:.2f}) in {decision.elapsed * 1000:.1f}ms, "
+                  f"saved ~{saved:.2f}s")
+        else:
+            print(f"[router] -> manager (best similarity {confidence:.2f}) in {decision.elapsed * 1000:.1f}ms")
+        return decision
+
+    def observe_manager_hop(self, seconds: float) -> None:
+        """Feed the measured time from run start to handoff into the running estimate."""
+        with self._lock:
+            self.manager_hop_seconds = 0.8 * self.manager_hop_seconds + 0.2 * seconds
+
+
+def create_router() -> Optional[IntentRouter]:
+    """Build the router configured by the ROUTER_* environment variables, or None if disabled."""
+    if os.getenv("ROUTER_ENABLED", "1") == "0":
+        return None
+    return IntentRouter(
+        min_similarity=float(os.getenv("ROUTER_MIN_SIMILARITY", "0.3")),
+        min_margin=float(os.getenv("ROUTER_MIN_MARGIN", "0.05")),
+        manager_hop_estimate=float(os.getenv("ROUTER_MANAGER_HOP_ESTIMATE", "1.5")),
+    )
@@ -1,27 +1,30 @@
-from agents import Agent, Runner, function_tool, handoff, RunContextWrapper, trace
-from agents.extensions import handoff_filters
-from agents.handoffs import HandoffInputData
-from flask import Flask, request, jsonify
+from agents import Agent, handoff
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
-import asyncio
-import os
+import atexit
 from dotenv import load_dotenv
 load_dotenv()
 
 from prompt import MANAGER_INSTRUCTION, PRODUCT_INSTRUCTION, SHOP_INFORMATION_INSTRUCTION
-from rag import rag, shop_information_rag
+from rag import rag, rag_batch, shop_information_rag, start_shop_info_refresh
+from chat_service import run_chat_turn, run_sync, stream_chat_turn, iterate_sync, sse_event
+import metrics
+import prompt_cache
+from resources import resources
+from input_filters import create_input_filter
 
 app = Flask(__name__)
 CORS(app)
 
+# Release pooled clients when the process exits
+atexit.register(resources.close)
 
-def custom_input_filter(input_data: HandoffInputData) -> HandoffInputData:
-    # modified_data = HandoffInputData(
-    #     input_history=input_data.input_history,  # Keep history as it is
-    #     pre_handoff_items=(),
-    #     new_items=()
-    # )
-    return input_data
+# Keep the shop information current without waiting for a request to find it stale
+start_shop_info_refresh()
+
+
+# Trims the history passed to the specialists on handoff (HANDOFF_* settings, see input_filters.py)
+custom_input_filter = create_input_filter()
 
 
 
@@ -30,7 +33,10 @@ product_agent = Agent(
     instructions=PRODUCT_INSTRUCTION,
     tools=[
         rag,
-    ]
+        rag_batch,
+    ],
+    # Routes the agent's requests to the same provider-side prompt cache (see prompt_cache.py)
+    model_settings=prompt_cache.model_settings("product")
 )
 
 shop_information_agent = Agent(
@@ -38,7 +44,8 @@ shop_information_agent = Agent(
     instructions=SHOP_INFORMATION_INSTRUCTION,
     tools=[
         shop_information_rag
-    ]
+    ],
+    model_settings=prompt_cache.model_settings("shop_information")
 )
 
 
@@ -50,13 +57,20 @@ manager_agent = Agent(
             product_agent,
             input_filter=custom_input_filter,
         ),
-        shop_information_agent
-    ]
-    
+        handoff(
+            shop_information_agent,
+            input_filter=custom_input_filter,
+        )
+    ],
+    model_settings=prompt_cache.model_settings("manager")
 )
 
+# Agents the local router may start a turn with, skipping the manager
+specialists = {
+    "product": product_agent,
+    "shop_information": shop_information_agent,
+}
 
-conversation_history = {}
 
 @app.route("/chat", methods=["POST"])
 def chat():
@@ -67,18 +81,46 @@ def chat():
     if not query:
         return jsonify({"error": "Missing query parameter"}), 400
 
-    if thread_id not in conversation_history:
-        conversation_history[thread_id] = []
-
-    with trace(workflow_name="Conversation", group_id=thread_id):
-        new_input = conversation_history[thread_id] + [{"role": "user", "content": query}]
-
-        result = asyncio.run(Runner.run(manager_agent, new_input))
-        conversation_history[thread_id] = new_input + [{"role": "assistant", "content": str(result.final_output)}]
+    # Runs on the shared background event loop (see chat_service.py)
+    content = run_sync(run_chat_turn(manager_agent, thread_id, query, specialists))
 
     return jsonify({
         "role": "assistant",
-        "content": str(result.final_output)
+        "content": content
     })
+
+
+@app.route("/chat/stream", methods=["POST"])
+def chat_stream():
+    data = request.json
+    query = data.get("message", "")
+    thread_id = data.get("thread_id", "1")
+
+    if not query:
+        return jsonify({"error": "Missing query parameter"}), 400
+
+    # Server-Sent Events: agent switches, tool calls and answer tokens as they arrive
+    events = iterate_sync(stream_chat_turn(manager_agent, thread_id, query, specialists))
+    return Response(
+        (sse_event(event) for event in events),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache"}
+    )
+
+
+@app.route("/health", methods=["GET"])
+def health():
+    # Checks of the shared clients built so far, see resources.py
+    status = resources.health()
+    healthy = all(not value.startswith("error") for value in status.values())
+    return jsonify(status), 200 if healthy else 503
+
+
+@app.route("/metrics", methods=["GET"])
+def metrics_endpoint():
+    # Stage latency histograms, see metrics.py (empty unless METRICS_ENABLED=1)
+    return Response(metrics.render(), mimetype=metrics.CONTENT_TYPE)
+
+
 if __name__ == "__main__":
     app.run(host="0.0.0.0", port=5001, debug=True)
@@ -1,13 +1,17 @@
 # Save data to Chroma DB
 import os
-import pandas as pd
 from flask import Flask, request, jsonify, Blueprint
 from werkzeug.utils import secure_filename
-from openai import OpenAI
 from dotenv import load_dotenv
 import re
 import chromadb
-import uuid
+import time
+
+from embeddings import embedding_cache, embedding_space
+from indexer import open_collection, sync_collection
+from bm25 import BM25Index
+from catalog import load_products, product_metadatas
+from vector_index import NumpyVectorIndex, QuantizedVectorIndex
 
 chroma_client = chromadb.PersistentClient("db")
 
@@ -17,19 +21,8 @@ load_dotenv()
 app = Flask(__name__)
 
 
-# OpenAI Client for embeddings
-openai_client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))  # Use correct OpenAI API key
-
 training_bp = Blueprint('training', __name__, url_prefix='/training')
 
-def get_embedding(text: str) -> list[float]:
-    """Generates an embedding for a given text using OpenAI."""
-    response = openai_client.embeddings.create(
-        input=text,
-        model="text-embedding-3-small"
-    )
-    return response.data[0].embedding
-
 def sanitize_collection_name(name: str) -> str:
     """Sanitize collection name to be MongoDB-compatible."""
     name = re.sub(r'[^a-zA-Z0-9_]', '_', name)  # Replace invalid characters with '_'
@@ -43,70 +36,73 @@ def sanitize_metadata(record):
     }
     return sanitized_record
 
-df = pd.read_csv("./hoanghamobile.csv")
-
-
-import ast
-def join_string(item):
-    for i in range(len(item)):
-        title, product_promotion, product_specs, current_price, color_options = item
-
-        final_string = ""
-        if title:
-            final_string += f"{title}"
-
-        if product_promotion:
-            product_promotion = product_promotion.replace("<br>", " ").replace("\n", " ")
-            final_string += f" {product_promotion}"
-
-        if product_specs:
-            product_specs = product_specs.replace("<br>", " ").replace("\n", " ")
-            final_string += f" {product_specs}"
-
-        if current_price:
-            final_string += f" có giá: {current_price}"
-
-        if color_options:
-            final_string += " có màu sắc: "
-            colors = ast.literal_eval(color_options)
-
-            final_string += ", ".join(colors)
-
-
-    return final_string
-
-df['information'] = df[
-    [
-     'title',
-     'product_promotion',
-     'product_specs',
-     'current_price',
-     'color_options']
-    ].astype(str).apply(join_string, axis=1)
+df = load_products("./hoanghamobile.csv")
 
 # Display the DataFrame to confirm
 print(df.head())
 
-df = df.head(2) 
-
-# Prepare data
-df = df[df['information'].notna()]
-df["embedding"] = df["information"].apply(get_embedding)
-
-# Metadata
-metadatas = [{"information": row["information"]} for _, row in df.iterrows()]
-ids = [str(uuid.uuid4()) for _ in range(len(df))]
+# Typed fields (RAM, storage, price, brand, ...) used by rag.py for `where` filters
+metadatas = product_metadatas(df)
 
 # ChromaDB setup
 chroma_client = chromadb.PersistentClient("db")
 collection_name = "products"
-collection = chroma_client.get_or_create_collection(name=collection_name)
-
-# Insert data
-collection.add(
-    ids=ids,
-    embeddings=df["embedding"].tolist(),
+# The embedding model and dimension are recorded on the collection, rag.py
+# embeds queries with the same settings
+collection = open_collection(chroma_client, collection_name, embedding_space())
+
+# Sync the collection using the CSV _id as a stable key: only new or changed
+# rows are embedded (batched, concurrent) and upserted, removed rows are deleted
+start_time = time.time()
+summary = sync_collection(
+    collection,
+    ids=df["_id"].astype(str).tolist(),
+    documents=df["information"].tolist(),
     metadatas=metadatas
 )
-
-print(f"Inserted {len(df)} documents into ChromaDB collection '{collection.name}'.")
+print(f"Synced {len(df)} documents in {time.time() - start_time:.2f}s: {summary}")
+if embedding_cache is not None:
+    print(f"Embedding cache: {embedding_cache.stats()}")
+
+print(f"Collection '{collection.name}' now holds {collection.count()} documents.")
+
+# The index files below are rewritten only when the sync changed something
+# (or a file is missing): rewriting them bumps rag.product_index_version and
+# with it drops every cached answer and search result
+changed = summary["added"] or summary["updated"] or summary["deleted"]
+
+
+def index_missing(path: str) -> bool:
+    return not os.path.exists(os.path.join(path, "meta.json"))
+
+
+# Keyword index for hybrid search, memory-mapped by rag.py at query time
+bm25_path = os.getenv("BM25_INDEX_PATH", "db/bm25_products")
+if changed or index_missing(bm25_path):
+    BM25Index.build(df["information"].tolist()).save(bm25_path, ids=df["_id"].astype(str).tolist())
+    print(f"Saved BM25 index to {bm25_path}")
+else:
+    print(f"BM25 index {bm25_path} is up to date")
+
+
+# Exact-search copy of the vectors for VECTOR_BACKEND=numpy
+vector_path = os.getenv("VECTOR_INDEX_PATH", "db/vectors_products")
+vector_index = None
+if changed or index_missing(vector_path):
+    vector_index = NumpyVectorIndex.from_collection(collection)
+    vector_index.save(vector_path)
+    print(f"Saved NumPy vector index to {vector_path}")
+else:
+    print(f"NumPy vector index {vector_path} is up to date")
+
+# int8 codes (plus sign bits with QUANTIZED_BINARY=1) for VECTOR_BACKEND=quantized
+quantized_path = os.getenv("QUANTIZED_INDEX_PATH", "db/vectors_products_q")
+binary = os.getenv("QUANTIZED_BINARY", "0") == "1"
+if (vector_index is not None or index_missing(quantized_path)
+        or binary != os.path.exists(os.path.join(quantized_path, "bits.npy"))):
+    if vector_index is None:
+        vector_index = NumpyVectorIndex.load(vector_path)
+    QuantizedVectorIndex.from_index(vector_index, binary=binary).save(quantized_path)
+    print(f"Saved quantized vector index to {quantized_path}")
+else:
+    print(f"Quantized vector index {quantized_path} is up to date")
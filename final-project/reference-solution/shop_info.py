@@ -0,0 +1,252 @@
+"""
+Cached snapshot of the shop information sheet.
+
+The Google Sheet changes rarely, so shop_information_rag serves rows from an
+in-memory snapshot. Once the snapshot is older than its TTL the stale rows
+are still returned while a background thread refreshes them
+(stale-while-revalidate). Every successful fetch is also written to a local
+JSON file, which is used when the sheet cannot be reached.
+
+Any callable returning a list of row dicts can act as the provider, e.g. a
+lambda returning fixed rows for local testing.
+
+ShopInfoIndex answers a query with only the most relevant rows, so the
+prompt does not grow with the sheet.
+"""
+import csv
+import hashlib
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+import metrics
+from bm25 import BM25Index, reciprocal_rank_fusion
+
+
+class GoogleSheetProvider:
+    def __init__(self, sheet_url: str, credentials_file: str, worksheet=None, on_error=None):
+        """
+        Args:
+            sheet_url: URL of the spreadsheet, rows are read from its first sheet
+            credentials_file: Service account key file
+            worksheet: Returns an opened worksheet to reuse (e.g. from the
+                resource registry); by default every fetch opens a new one
+            on_error: Called when a fetch fails, e.g. to drop the reused worksheet
+        """
+        self.sheet_url = sheet_url
+        self.credentials_file = credentials_file
+        self.worksheet = worksheet or self.open_worksheet
+        self.on_error = on_error
+
+    def __call__(self) -> list[dict]:
+        with metrics.span("sheets_fetch"):
+            try:
+                return self.worksheet().get_all_records()
+            except Exception:
+                if self.on_error is not None:
+                    self.on_error()
+                raise
+
+    def open_worksheet(self):
+        import gspread
+        from oauth2client.service_account import ServiceAccountCredentials
+
+        # Define the scope
+        scope = ['https://spreadsheets.google.com/feeds',
+                 'https://www.googleapis.com/auth/drive']
+
+        credentials = ServiceAccountCredentials.from_json_keyfile_name(self.credentials_file, scope)
+        client = gspread.authorize(credentials)
+        return client.open_by_url(self.sheet_url).sheet1
+
+
+class FileProvider:
+    """Reads rows from a local .json (list of objects) or .csv file."""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def __call__(self) -> list[dict]:
+        if self.path.endswith(".csv"):
+            with open(self.path, newline="", encoding="utf-8") as f:
+                return list(csv.DictReader(f))
+        with open(self.path, encoding="utf-8") as f:
+            return json.load(f)
+
+
+class ShopInfoSnapshot:
+    def __init__(self, provider, ttl: float = 3600, fallback_path: str = None):
+        """
+        Args:
+            provider: Callable returning the sheet rows
+            ttl: Seconds before the snapshot is refreshed in the background
+            fallback_path: Local .json/.csv copy used when the provider fails;
+                a .json path is also rewritten after every successful fetch
+        """
+        self.provider = provider
+        self.ttl = ttl
+        self.fallback_path = fallback_path
+        self.version = 0
+        self._rows = None
+        self._digest = None
+        self._fetched_at = 0.0
+        self._lock = threading.Lock()
+        self._refreshing = False
+        self._stop = threading.Event()
+        self._auto_refresh = None
+
+    def get(self) -> list[dict]:
+        """Return the current rows, fetching synchronously only the first time."""
+        if self._rows is None:
+            with self._lock:
+                if self._rows is None:
+                    self._load_initial()
+        elif time.time() - self._fetched_at > self.ttl:
+            self._refresh_in_background()
+        return self._rows
+
+    def refresh(self) -> bool:
+        """Fetch the rows from the provider now. Returns False (keeping the old rows) on failure."""
+        try:
+            rows = list(self.provider())
+        except Exception as e:
+            print(f"Shop information refresh failed: {e}")
+            return False
+
+        self._set_rows(rows)
+        self._save_fallback(rows)
+        return True
+
+    def _load_initial(self) -> None:
+        if self.refresh():
+            return
+        if self.fallback_path and os.path.exists(self.fallback_path):
+            print(f"Using shop information fallback file {self.fallback_path}")
+            self._set_rows(FileProvider(self.fallback_path)())
+            # Try the provider again once the TTL has passed
+            return
+        raise RuntimeError("Shop information is unavailable and no fallback file exists")
+
+    def _set_rows(self, rows: list[dict]) -> None:
+        self._rows = rows
+        self._fetched_at = time.time()
+        # Only a change of the rows is a new version, a refresh returning the same sheet keeps it
+        digest = hashlib.sha256(json.dumps(rows, sort_keys=True, ensure_ascii=False, default=str).encode()).hexdigest()
+        if digest != self._digest:
+            self._digest = digest
+            self.version += 1
+
+    def _save_fallback(self, rows: list[dict]) -> None:
+        if not self.fallback_path or not self.fallback_path.endswith(".json"):
+            return
+        try:
+            directory = os.path.dirname(self.fallback_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            tmp_path = self.fallback_path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(rows, f, ensure_ascii=False)
+            os.replace(tmp_path, self.fallback_path)
+        except OSError as e:
+            print(f"Could not write shop information fallback file: {e}")
+
+    def _refresh_in_background(self) -> None:
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+
+        def run():
+            try:
+                if not self.refresh():
+                    # Keep serving the stale rows and retry after another TTL
+                    self._fetched_at = time.time()
+            finally:
+                self._refreshing = False
+
+        threading.Thread(target=run, name="shop-info-refresh", daemon=True).start()
+
+    def start_auto_refresh(self, interval: float = None) -> None:
+        """Refresh periodically in a daemon thread, independently of requests (once per snapshot)."""
+        interval = interval or self.ttl
+
+        def run():
+            while not self._stop.wait(interval):
+                self.refresh()
+
+        with self._lock:
+            if self._auto_refresh is not None:
+                return
+            self._auto_refresh = threading.Thread(target=run, name="shop-info-auto-refresh", daemon=True)
+        self._auto_refresh.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def age(self) -> float:
+        return time.time() - self._fetched_at if self._rows is not None else float("inf")
+
+
+def row_text(row: dict) -> str:
+    return "; ".join(f"{key}: {value}" for key, value in row.items() if value not in ("", None))
+
+
+class ShopInfoIndex:
+    def __init__(self, snapshot: ShopInfoSnapshot, embed_texts, top_k: int = 5):
+        """
+        Hybrid (embedding + BM25) retrieval over the snapshot rows
+
+        Args:
+            snapshot: Source of the rows; the index is rebuilt when its version changes
+            embed_texts: Function embedding a list of texts
+            top_k: Rows returned per query
+        """
+        self.snapshot = snapshot
+        self.embed_texts = embed_texts
+        self.top_k = top_k
+        self._version = None
+        self._rows = []
+        self._vectors = None
+        self._keyword_index = None
+        self._lock = threading.Lock()
+
+    def _ensure_index(self) -> None:
+        self.snapshot.get()
+        if self._version == self.snapshot.version:
+            return
+
+        with self._lock:
+            rows, version = self.snapshot.get(), self.snapshot.version
+            if self._version == version:
+                return
+            texts = [row_text(row) for row in rows]
+            keyword_index = BM25Index.build(texts)
+            try:
+                vectors = np.asarray(self.embed_texts(texts), dtype=np.float32)
+                vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+            except Exception as e:
+                print(f"Shop information embeddings unavailable, using keywords only: {e}")
+                vectors = None
+
+            self._rows, self._vectors, self._keyword_index = rows, vectors, keyword_index
+            self._version = version
+
+    def search(self, query: str, k: int = None) -> list[dict]:
+        """Return the k rows most relevant to `query`."""
+        self._ensure_index()
+        k = k or self.top_k
+        if len(self._rows) <= k:
+            return list(self._rows)
+
+        candidates = k * 4
+        rankings = [[doc_id for doc_id, _ in self._keyword_index.search(query, candidates)]]
+
+        if self._vectors is not None:
+            query_vector = np.asarray(self.embed_texts([query])[0], dtype=np.float32)
+            similarities = self._vectors @ (query_vector / np.linalg.norm(query_vector))
+            rankings.append([int(i) for i in np.argsort(-similarities)[:candidates]])
+
+        return [self._rows[i] for i in reciprocal_rank_fusion(rankings)[:k]]
@@ -0,0 +1,39 @@
+from context_builder import COLORS, PRICE, PROMOTION, asked_fields, build_context, split_fields
+
+INFORMATION = (
+    "samsung galaxy a05s - 6gb/128gb - KM 1 - Ưu đãi trả góp 0% qua thẻ tín dụng "
+    "Độ phân giải: Full HD+, Camera chính 50MP  Hệ điều hành: Android 13  RAM: 6GB  "
+    "có giá: 3,990,000 ₫ có màu sắc: Màu Đen, Bạc"
+)
+
+
+def test_split_fields():
+    title, promotions, fields = split_fields(INFORMATION)
+    assert title == "samsung galaxy a05s - 6gb/128gb"
+    assert promotions == ["Ưu đãi trả góp 0% qua thẻ tín dụng"]
+    assert fields[-2:] == [(PRICE, "3,990,000 ₫"), (COLORS, "Màu Đen, Bạc")]
+
+
+def test_split_fields_without_price_and_colors():
+    # catalog.join_string leaves "có màu sắc: " with nothing after it
+    _, _, fields = split_fields("nokia 8000 4g nan RAM: 512MB  có giá: nan có màu sắc: ")
+    assert fields == [("RAM", "512MB")]
+
+
+def test_field_questions():
+    assert asked_fields("Samsung Galaxy A05s giá bao nhiêu") == {PRICE}
+    assert asked_fields("Samsung Galaxy A05s màu sắc") == {COLORS}
+    assert PROMOTION in asked_fields("Samsung Galaxy A05s ưu đãi trả góp")
+    assert "Độ phân giải" in asked_fields("camera chụp ảnh có đẹp không")
+
+
+def test_pronouns_and_common_words_are_not_field_questions():
+    assert asked_fields("anh muốn biết thông tin Samsung Galaxy A05s") == set()
+    assert asked_fields("em đặt qua mạng được không") == set()
+    assert asked_fields("những mẫu nào đang bán") == set()
+
+
+def test_question_without_fields_keeps_all_specs():
+    context = build_context("anh muốn biết thông tin Samsung Galaxy A05s", [INFORMATION], max_tokens=0)
+    assert "- Hệ điều hành: Android 13" in context
+    assert "- RAM: 6GB" in context
@@ -0,0 +1,34 @@
+from agents.handoffs import HandoffInputData
+
+from compaction import summary_message
+from input_filters import cap_tokens, item_tokens
+
+
+def turn(question: str, call_id: str = None) -> list:
+    items = [{"role": "user", "content": question}]
+    if call_id:
+        items += [
+            {"type": "function_call", "call_id": call_id, "name": "rag", "arguments": "{}"},
+            {"type": "function_call_output", "call_id": call_id, "output": "kết quả " * 200},
+        ]
+    return items + [{"role": "assistant", "content": "Dạ, " + question}]
+
+
+def capped(history: list, max_tokens: int) -> list:
+    data = HandoffInputData(input_history=tuple(history), pre_handoff_items=(), new_items=())
+    return list(cap_tokens(max_tokens)(data).input_history)
+
+
+def test_cap_tokens_keeps_tool_calls_with_their_outputs():
+    history = turn("Nokia 3210 giá bao nhiêu?", "call_1") + turn("Còn màu gì?", "call_2") + turn("Bảo hành thế nào?")
+    kept = capped(history, sum(item_tokens(item) for item in history) - 1)
+    assert kept == history[4:]
+    calls = {item["call_id"] for item in kept if item.get("type") == "function_call"}
+    outputs = {item["call_id"] for item in kept if item.get("type") == "function_call_output"}
+    assert calls == outputs == {"call_2"}
+
+
+def test_cap_tokens_keeps_the_summary():
+    summary = summary_message("Khách hỏi về Nokia 3210.")
+    history = [summary] + turn("Giá bao nhiêu?", "call_1") + turn("Có trả góp không?")
+    assert capped(history, 50) == [summary] + turn("Có trả góp không?")
@@ -0,0 +1,24 @@
+from product_specs import parse_brand, parse_query_filters
+
+
+def test_single_brand():
+    assert parse_query_filters("điện thoại Samsung") == {"brand": {"$eq": "samsung"}}
+
+
+def test_several_brands_keep_each_brand():
+    where = parse_query_filters("So sánh Samsung Galaxy A05s và Nokia 3210 dưới 5 triệu")
+    assert {"brand": {"$in": ["samsung", "nokia"]}} in where["$and"]
+    assert {"price_vnd": {"$lte": 5_000_000}} in where["$and"]
+
+
+def test_aliases_of_one_brand():
+    assert parse_query_filters("iPhone hay Apple Watch") == {"brand": {"$eq": "apple"}}
+    assert parse_brand("Redmi Note 13 Xiaomi") == "xiaomi"
+
+
+def test_price_words_inside_other_words():
+    # "chọn" ends in "hon" and "tuần" starts with "tu", neither states a price bound
+    assert parse_query_filters("Giúp tôi chọn 5 triệu thì mua máy nào") is None
+    assert parse_query_filters("Tuần 2 triệu được không") is None
+    assert parse_query_filters("Máy hơn 5 triệu") == {"price_vnd": {"$gte": 5_000_000}}
+    assert parse_query_filters("Máy <3tr") == {"price_vnd": {"$lte": 3_000_000}}
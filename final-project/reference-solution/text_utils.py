@@ -0,0 +1,33 @@
+"""
+Vietnamese-aware text normalization shared by the keyword indexes and caches.
+"""
+import re
+import unicodedata
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[.,][0-9]+)*")
+
+
+def normalize_text(text: str, lower: bool = True) -> str:
+    """Lowercase (unless `lower` is False), NFC-normalize and collapse whitespace."""
+    text = unicodedata.normalize("NFC", text)
+    if lower:
+        text = text.lower()
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def fold_diacritics(text: str) -> str:
+    """Strip Vietnamese tone and vowel marks: "điện thoại" -> "dien thoai"."""
+    text = unicodedata.normalize("NFD", text)
+    text = "".join(c for c in text if unicodedata.category(c) != "Mn")
+    return unicodedata.normalize("NFC", text).replace("đ", "d").replace("Đ", "D")
+
+
+def tokenize(text: str) -> list[str]:
+    """
+    Split text into diacritics-folded lowercase tokens.
+
+    Folding lets queries typed without accents ("gia bao nhieu") match the
+    catalog text. Numbers keep their separators ("6.78", "1,590,000").
+    """
+    text = fold_diacritics(normalize_text(text.replace("<br>", " ")))
+    return TOKEN_PATTERN.findall(text)
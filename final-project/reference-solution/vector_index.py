@@ -0,0 +1,295 @@
+"""
+Exact in-memory vector search with NumPy.
+
+The product catalog is small enough that a brute-force scan is faster than
+going through Chroma's HNSW index: all vectors are kept in one contiguous,
+L2-normalized float32 matrix, so the cosine similarity to every product is
+a single matrix-vector product and the top k come from argpartition.
+
+save() writes the matrix as a .npy file that load() can memory-map, the
+same layout as the BM25 index.
+
+QuantizedVectorIndex cuts the resident memory for larger catalogs: rows
+are scored on int8 codes (optionally pre-filtered by Hamming distance on
+1-bit sign codes) and only the best candidates are re-ranked with the full
+float vectors, which can stay memory-mapped on disk.
+"""
+import json
+import os
+import shutil
+
+import numpy as np
+
+from bm25 import swap_directory
+
+
+def normalize_rows(vectors) -> np.ndarray:
+    """Return `vectors` as a contiguous float32 matrix with unit-length rows."""
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    if vectors.ndim == 1:
+        vectors = vectors[None, :]
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def matches_where(metadata: dict, where: dict) -> bool:
+    """Evaluate a Chroma-style `where` filter against one metadata dict."""
+    if not where:
+        return True
+    if "$and" in where:
+        return all(matches_where(metadata, condition) for condition in where["$and"])
+    if "$or" in where:
+        return any(matches_where(metadata, condition) for condition in where["$or"])
+
+    for field, condition in where.items():
+        if not isinstance(condition, dict):
+            condition = {"$eq": condition}
+        value = metadata.get(field)
+        for op, expected in condition.items():
+            if op == "$eq":
+                ok = value == expected
+            elif op == "$ne":
+                ok = value != expected
+            elif op == "$in":
+                ok = value in expected
+            elif op == "$nin":
+                ok = value not in expected
+            elif value is None:
+                ok = False
+            elif op == "$gt":
+                ok = value > expected
+            elif op == "$gte":
+                ok = value >= expected
+            elif op == "$lt":
+                ok = value < expected
+            elif op == "$lte":
+                ok = value <= expected
+            else:
+                raise ValueError(f"Unsupported filter operator {op}")
+            if not ok:
+                return False
+    return True
+
+
+class NumpyVectorIndex:
+    def __init__(self, ids: list[str], vectors: np.ndarray, metadatas: list[dict] = None):
+        """
+        Args:
+            ids: Product id of each row
+            vectors: (n, dim) matrix, expected to be normalized already
+            metadatas: Metadata of each row, used for filtering and results
+        """
+        self.ids = list(ids)
+        self.vectors = vectors
+        self.metadatas = metadatas if metadatas is not None else [{} for _ in self.ids]
+
+    @classmethod
+    def from_collection(cls, collection) -> "NumpyVectorIndex":
+        """Copy every vector and its metadata out of a Chroma collection."""
+        data = collection.get(include=["embeddings", "metadatas"])
+        dim = len(data["embeddings"][0]) if len(data["ids"]) else 0
+        vectors = normalize_rows(data["embeddings"]) if len(data["ids"]) else np.zeros((0, dim), dtype=np.float32)
+        return cls(data["ids"], vectors, data["metadatas"])
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def dim(self) -> int:
+        return self.vectors.shape[1]
+
+    def save(self, directory: str) -> None:
+        """Write the index to `directory`, replacing any previous version."""
+        tmp_dir = directory.rstrip("/") + ".tmp"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+
+        np.save(os.path.join(tmp_dir, "vectors.npy"), self.vectors)
+        with open(os.path.join(tmp_dir, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump({"ids": self.ids, "metadatas": self.metadatas}, f, ensure_ascii=False)
+
+        swap_directory(tmp_dir, directory)
+
+    @classmethod
+    def load(cls, directory: str, mmap: bool = True) -> "NumpyVectorIndex":
+        """Load an index written by save(), memory-mapping the vectors by default."""
+        vectors = np.load(os.path.join(directory, "vectors.npy"), mmap_mode="r" if mmap else None)
+        with open(os.path.join(directory, "meta.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+        return cls(meta["ids"], vectors, meta["metadatas"])
+
+    def _mask(self, where: dict):
+        if not where:
+            return None
+        return np.fromiter((matches_where(m or {}, where) for m in self.metadatas), dtype=bool, count=len(self))
+
+    def search_batch(self, query_vectors, k: int = 10, where: dict = None) -> list[list[tuple[int, float]]]:
+        """
+        Top-k rows for several queries at once
+
+        Args:
+            query_vectors: (q, dim) matrix or a single vector
+            k: Results per query
+            where: Optional Chroma-style metadata filter
+
+        Returns:
+            For each query, up to k (row, cosine similarity) pairs, best first
+        """
+        queries = normalize_rows(query_vectors)
+        if not len(self):
+            return [[] for _ in range(len(queries))]
+
+        # (n, dim) @ (dim, q): one pass over the matrix for the whole batch
+        similarities = (self.vectors @ queries.T).T
+        mask = self._mask(where)
+        if mask is not None:
+            similarities[:, ~mask] = -np.inf
+            k = min(k, int(mask.sum()))
+        k = min(k, len(self))
+        if k == 0:
+            return [[] for _ in range(len(queries))]
+
+        top = np.argpartition(-similarities, k - 1, axis=1)[:, :k]
+        results = []
+        for row, candidates in zip(similarities, top):
+            candidates = candidates[np.argsort(-row[candidates])]
+            results.append([(int(i), float(row[i])) for i in candidates])
+        return results
+
+    def search(self, query_vector, k: int = 10, where: dict = None) -> list[tuple[int, float]]:
+        """Top-k (row, cosine similarity) pairs for one query vector."""
+        return self.search_batch(query_vector, k, where)[0]
+
+    def query(self, query_embeddings, n_results: int = 10, where: dict = None) -> dict:
+        """Same result shape as Chroma's collection.query (ids and metadatas per query)."""
+        results = self.search_batch(query_embeddings, n_results, where)
+        return {
+            "ids": [[self.ids[i] for i, _ in hits] for hits in results],
+            "metadatas": [[self.metadatas[i] for i, _ in hits] for hits in results],
+            "distances": [[1.0 - score for _, score in hits] for hits in results],
+        }
+
+
+class QuantizedVectorIndex(NumpyVectorIndex):
+    def __init__(self, ids: list[str], codes: np.ndarray, scales: np.ndarray, vectors: np.ndarray = None,
+                 bits: np.ndarray = None, metadatas: list[dict] = None, rerank: int = 10, prefilter: int = 100):
+        """
+        Compressed index: int8 codes for scoring, full vectors only for re-ranking
+
+        Args:
+            ids: Product id of each row
+            codes: (n, dim) int8 scalar-quantized rows
+            scales: (dim,) float32 scale of each dimension, value = code * scale
+            vectors: Normalized float32 rows (usually memory-mapped, only the
+                re-ranked rows are read); None to rank on the int8 scores alone
+            bits: (n, dim / 8) uint8 packed sign bits for a Hamming pre-filter
+            metadatas: Metadata of each row
+            rerank: Candidates per query re-scored with the float vectors
+            prefilter: Candidates per query kept by the Hamming pre-filter (at least k and rerank)
+        """
+        self.ids = list(ids)
+        self.codes = codes
+        self.scales = scales
+        self.vectors = vectors
+        self.bits = bits
+        self.metadatas = metadatas if metadatas is not None else [{} for _ in self.ids]
+        self.rerank = rerank
+        self.prefilter = prefilter
+
+    @classmethod
+    def from_vectors(cls, ids: list[str], vectors, metadatas: list[dict] = None,
+                     binary: bool = False, **kwargs) -> "QuantizedVectorIndex":
+        vectors = normalize_rows(vectors)
+        # Symmetric per-dimension scale: the largest magnitude maps to 127
+        scales = np.abs(vectors).max(axis=0) / 127.0
+        scales[scales == 0] = 1.0
+        codes = np.clip(np.rint(vectors / scales), -127, 127).astype(np.int8)
+        bits = np.packbits(vectors > 0, axis=1) if binary else None
+        return cls(ids, codes, scales.astype(np.float32), vectors, bits, metadatas, **kwargs)
+
+    @classmethod
+    def from_index(cls, index: NumpyVectorIndex, **kwargs) -> "QuantizedVectorIndex":
+        return cls.from_vectors(index.ids, index.vectors, index.metadatas, **kwargs)
+
+    @property
+    def dim(self) -> int:
+        return self.codes.shape[1]
+
+    def memory_per_item(self) -> dict:
+        """Bytes per row of each part, the float vectors are only touched when re-ranking."""
+        n = max(len(self), 1)
+        return {
+            "int8": self.codes.nbytes / n,
+            "binary": self.bits.nbytes / n if self.bits is not None else 0,
+            "float32": self.vectors.nbytes / n if self.vectors is not None else 0,
+        }
+
+    def save(self, directory: str) -> None:
+        """Write the index to `directory`, replacing any previous version."""
+        tmp_dir = directory.rstrip("/") + ".tmp"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+
+        np.save(os.path.join(tmp_dir, "codes.npy"), self.codes)
+        np.save(os.path.join(tmp_dir, "scales.npy"), self.scales)
+        if self.vectors is not None:
+            np.save(os.path.join(tmp_dir, "vectors.npy"), np.asarray(self.vectors))
+        if self.bits is not None:
+            np.save(os.path.join(tmp_dir, "bits.npy"), self.bits)
+        with open(os.path.join(tmp_dir, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump({"ids": self.ids, "metadatas": self.metadatas}, f, ensure_ascii=False)
+
+        swap_directory(tmp_dir, directory)
+
+    @classmethod
+    def load(cls, directory: str, **kwargs) -> "QuantizedVectorIndex":
+        """Load the codes into memory and memory-map the float vectors."""
+        def optional(name, mmap_mode=None):
+            path = os.path.join(directory, f"{name}.npy")
+            return np.load(path, mmap_mode=mmap_mode) if os.path.exists(path) else None
+
+        with open(os.path.join(directory, "meta.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+        return cls(meta["ids"], optional("codes"), optional("scales"), optional("vectors", "r"),
+                   optional("bits"), meta["metadatas"], **kwargs)
+
+    def _candidates(self, query: np.ndarray, allowed: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
+        rows = allowed
+        # Never fewer candidates than the results and the rows to re-rank
+        prefilter = max(self.prefilter, k, self.rerank)
+        if self.bits is not None and len(rows) > prefilter:
+            # Hamming distance between sign codes ranks by angle, cheaply
+            query_bits = np.packbits(query > 0)
+            distances = _POPCOUNT[np.bitwise_xor(self.bits[rows], query_bits)].sum(axis=1)
+            rows = rows[np.argpartition(distances, prefilter - 1)[:prefilter]]
+
+        # Approximate inner product on the int8 codes
+        codes = self.codes if len(rows) == len(self) else self.codes[rows]
+        scores = codes.astype(np.float32) @ (query * self.scales)
+        keep = min(max(k, self.rerank), len(rows))
+        top = np.argpartition(-scores, keep - 1)[:keep]
+        return rows[top], scores[top]
+
+    def search_batch(self, query_vectors, k: int = 10, where: dict = None) -> list[list[tuple[int, float]]]:
+        """Top-k (row, similarity) pairs per query; exact cosine when the float vectors are available."""
+        queries = normalize_rows(query_vectors)
+        mask = self._mask(where)
+        allowed = np.flatnonzero(mask) if mask is not None else np.arange(len(self))
+        if not len(allowed) or k <= 0:
+            return [[] for _ in range(len(queries))]
+
+        results = []
+        for query in queries:
+            rows, scores = self._candidates(query, allowed, k)
+            if self.vectors is not None:
+                order = np.sort(rows)
+                scores = np.asarray(self.vectors[order]) @ query
+                rows = order
+            best = np.argsort(-scores)[:k]
+            results.append([(int(rows[i]), float(scores[i])) for i in best])
+        return results
+
+
+# Number of set bits in every byte value
+_POPCOUNT = np.unpackbits(np.arange(256, dtype=np.uint8)[:, None], axis=1).sum(axis=1).astype(np.uint8)